@@ -1,3 +1,5 @@
+from functools import lru_cache
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from typing import List
 
@@ -6,20 +8,132 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_key: str
     supabase_service_key: str
+    supabase_timeout: float = 10.0
+    supabase_max_connections: int = 20
     
     # Gemini API  
     gemini_api_key: str
+    gemini_model: str = "gemini-1.5-flash"
+    gemini_timeout: float = 20.0
+    gemini_max_concurrency: int = 8
+    gemini_max_workers: int = 8
+    prompt_max_vendors: int = 20
+    llm_usage_window: int = 1000
+    rule_parser_min_confidence: float = 0.85
     
     # Circle API
     circle_api_key: str
     circle_base_url: str = "https://api-sandbox.circle.com"
+    circle_mock: bool = True
+    circle_mock_latency: float = 2.0
+    circle_wallet_id: str | None = None
+    circle_chain: str = "ETH"
+    circle_timeout: float = 10.0
+    circle_max_connections: int = 20
+    circle_max_concurrency: int = 16
+    circle_max_retries: int = 3
+    circle_backoff_base: float = 0.25
+    circle_backoff_max: float = 5.0
+    circle_breaker_threshold: int = 5
+    circle_breaker_reset: float = 30.0
+    circle_status_rate: float = 20.0
+    circle_status_max_pages: int = 20
+    
+    # Transfer execution
+    transfer_workers: int = 8
+    transfer_max_attempts: int = 3
+    transfer_retry_backoff: float = 1.0
+    transfer_timeout: int = 30
+    transfer_job_retention: float = 600.0
+    transfer_stale_after: float = 900.0
+    transfer_sweep_interval: float = 60.0
+    
+    # On-chain confirmation polling
+    confirmation_poll_interval: float = 15.0
+    confirmation_page_size: int = 500
+    confirmation_backoff_base: float = 15.0
+    confirmation_backoff_max: float = 600.0
+    confirmation_max_attempts: int = 50
+    confirmation_lease: float = 300.0
+    
+    # Spend ledger
+    spend_reconcile_interval: float = 3600.0
+    
+    # Activity event feed
+    event_buffer_size: int = 1000
+    event_subscriber_queue_size: int = 256
+    event_heartbeat: float = 15.0
+    
+    # Observability
+    metrics_loop_lag_interval: float = 0.5
+    otel_exporter_otlp_endpoint: str | None = None
+    otel_service_name: str = "aurralis-api"
+    
+    # Tenancy
+    supabase_jwt_secret: str | None = None
+    trust_user_id_header: bool = False
+    # Unset: required whenever supabase_jwt_secret is set
+    require_user_id: bool | None = None
+    
+    # Policy cache
+    policy_cache_ttl: float = 30.0
+    policy_cache_max_tenants: int = 10000
+    policy_cache_invalidation_file: str | None = None
+    
+    # Intent cache
+    intent_cache_backend: str = "memory"
+    intent_cache_ttl: float = 3600.0
+    intent_cache_max_entries: int = 10000
+    intent_cache_sqlite_path: str = "intent_cache.db"
+    intent_cache_redis_url: str | None = None
+    
+    # Idempotency keys
+    idempotency_backend: str = "memory"
+    idempotency_ttl: float = 86400.0
+    idempotency_max_entries: int = 10000
+    idempotency_redis_url: str | None = None
+    
+    # Batch intents
+    intent_batch_max_items: int = 500
+    intent_batch_concurrency: int = 16
+    
+    # Batch approvals
+    approve_batch_max_items: int = 500
+    approve_batch_concurrency: int = 16
+
+    # Policy simulation
+    simulation_workers: int | None = None  # defaults to the CPU count
+    simulation_chunk_size: int = 5000
+    simulation_max_in_flight: int = 8
     
     # App Config
     app_env: str = "development"
-    cors_origins: List[str] = ["http://localhost:3000"]
+    # A JSON list or comma-separated origins
+    cors_origins: List[str] | str = ["http://localhost:3000"]
+    
+    @field_validator('cors_origins')
+    @classmethod
+    def split_origins(cls, value):
+        if isinstance(value, str):
+            return [origin.strip() for origin in value.split(',') if origin.strip()]
+        return value
     
     class Config:
         env_file = ".env"
         case_sensitive = False
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Settings read from the environment and .env on first use
+    
+    Nothing reads the environment at import time, so importing the app
+    needs no credentials and costs no I/O.
+    """
+    return Settings()
+
+def __getattr__(name: str):
+    # `from app.config import settings` keeps working, but loads on first use
+    if name == 'settings':
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
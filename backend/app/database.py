@@ -1,7 +1,314 @@
-from supabase import create_client, Client
-from app.config import settings
+import httpx
+from postgrest import AsyncPostgrestClient
+from datetime import datetime
+from typing import List, Optional, Tuple
+from app.config import get_settings
 
-supabase: Client = create_client(settings.supabase_url, settings.supabase_service_key)
 
-def get_supabase() -> Client:
-    return supabase
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """
+    Async PostgREST client on a shared keep-alive HTTP/2 connection pool
+    """
+
+    def create_session(self, base_url: str, headers: dict, timeout, verify: bool = True) -> httpx.AsyncClient:
+        settings = get_settings()
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=settings.supabase_max_connections,
+                max_keepalive_connections=settings.supabase_max_connections
+            ),
+            follow_redirects=True
+        )
+
+
+class Repository:
+    """
+    Async data access for policies, activities and transactions
+
+    Every query awaits its PostgREST round-trip, so a request waiting on the
+    database yields the event loop to the others.
+    """
+
+    def __init__(self, url: str, key: str):
+        settings = get_settings()
+        self.client = PooledPostgrestClient(
+            f"{url}/rest/v1",
+            headers={
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+                "apikey": key,
+                "Authorization": f"Bearer {key}"
+            },
+            timeout=settings.supabase_timeout
+        )
+
+    def table(self, name: str):
+        return self.client.from_(name)
+
+    def scoped(self, query, user_id: Optional[str]):
+        """
+        Restrict a query to one tenant; rows without a user_id belong to the default tenant
+        """
+        return query.eq('user_id', user_id) if user_id else query.is_('user_id', 'null')
+
+    # Policies
+
+    async def get_current_policy(self, user_id: Optional[str] = None) -> Optional[dict]:
+        """
+        The tenant's active policy with `current_daily_spent` and
+        `current_monthly_spent` read from the spend buckets, in one round-trip
+        """
+        response = await self.client.rpc('current_policy', {'p_user_id': user_id}).execute()
+        return response.data or None
+
+    async def insert_policy(self, policy: dict, user_id: Optional[str] = None) -> Optional[dict]:
+        """
+        Make `policy` the tenant's active policy, retiring the previous one
+        """
+        await self.scoped(self.table('policies').update({'is_active': False}), user_id).eq('is_active', True).execute()
+        response = await self.table('policies').insert({**policy, 'user_id': user_id, 'is_active': True}).execute()
+        return response.data[0] if response.data else None
+
+    async def update_policy(self, policy_id: str, updates: dict) -> Optional[dict]:
+        response = await self.table('policies').update(updates).eq('id', policy_id).execute()
+        return response.data[0] if response.data else None
+
+    # Activities
+
+    async def get_activity(self, activity_id: str, user_id: Optional[str] = None, with_transactions: bool = False) -> Optional[dict]:
+        columns = '*, transactions (*)' if with_transactions else '*'
+        query = self.scoped(self.table('agent_activities').select(columns).eq('id', activity_id), user_id)
+        response = await query.limit(1).execute()
+        return response.data[0] if response.data else None
+
+    async def list_activities(
+        self,
+        limit: int = 50,
+        after: Optional[Tuple[str, str]] = None,
+        statuses: Optional[List[str]] = None,
+        user_id: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        columns: Optional[List[str]] = None,
+        with_transactions: bool = False,
+        oldest_first: bool = False
+    ) -> List[dict]:
+        """
+        List a tenant's activities newest first using keyset pagination on (created_at, id)
+
+        `after` is the (created_at, id) of the last row of the previous page.
+        With `oldest_first` pages run forward in time, for replays.
+        """
+        projection = ', '.join(columns) if columns else '*'
+        if with_transactions:
+            projection += ', transactions (*)'
+
+        query = self.scoped(self.table('agent_activities').select(projection), user_id)
+        if statuses:
+            query = query.in_('status', statuses)
+        if created_after:
+            query = query.gte('created_at', created_after.isoformat())
+        if created_before:
+            query = query.lt('created_at', created_before.isoformat())
+        if after:
+            created_at, last_id = after
+            op = 'gt' if oldest_first else 'lt'
+            query = query.or_(
+                f'created_at.{op}."{created_at}",and(created_at.eq."{created_at}",id.{op}.{last_id})'
+            )
+
+        descending = not oldest_first
+        response = await query.order('created_at', desc=descending).order('id', desc=descending).limit(limit).execute()
+        return response.data
+
+    async def get_activities(self, activity_ids: List[str], user_id: Optional[str] = None,
+                             columns: Optional[List[str]] = None) -> List[dict]:
+        """
+        A tenant's activities among `activity_ids`, in no particular order
+        """
+        projection = ', '.join(columns) if columns else '*'
+        query = self.scoped(self.table('agent_activities').select(projection).in_('id', activity_ids), user_id)
+        response = await query.execute()
+        return response.data
+
+    async def get_activity_stats(self, user_id: Optional[str] = None, days: int = 30, vendors: int = 10) -> dict:
+        """
+        Dashboard aggregates of a tenant from the trigger-maintained rollups
+
+        Returns {"by_status", "daily_spend", "spend", "vendors"}; see
+        activity_stats in schema.sql.
+        """
+        response = await self.client.rpc('activity_stats', {'p_user_id': user_id, 'p_days': days, 'p_vendors': vendors}).execute()
+        return response.data
+
+    async def insert_activity(self, activity: dict) -> Optional[dict]:
+        response = await self.table('agent_activities').insert(activity).execute()
+        return response.data[0] if response.data else None
+
+    async def insert_activities(self, activities: List[dict]) -> List[dict]:
+        """
+        Insert many activities in a single request, returned in input order
+        """
+        response = await self.table('agent_activities').insert(activities).execute()
+        return response.data
+
+    async def update_activity(self, activity_id: str, updates: dict) -> Optional[dict]:
+        response = await self.table('agent_activities').update(updates).eq('id', activity_id).execute()
+        return response.data[0] if response.data else None
+
+    async def claim_activity(self, activity_id: str, user_id: Optional[str] = None) -> dict:
+        """
+        Lock an approvable activity and reserve its spend in one round-trip
+
+        Returns {"outcome": "claimed" | "not_found" | "locked" |
+        "invalid_status" | "over_budget", "activity", "policy", "amount"},
+        where "policy" is the snapshot of the tenant's active policy before
+        the reservation. Another tenant's activity is "not_found".
+        """
+        response = await self.client.rpc('claim_activity', {'p_activity_id': activity_id, 'p_user_id': user_id}).execute()
+        return response.data
+
+    async def release_activity(self, activity_id: str, status: str, policy_id: Optional[str], refund: float):
+        """
+        Unlock a claimed activity with a final status and refund its reservation
+        """
+        await self.client.rpc('release_activity', {
+            'p_activity_id': activity_id,
+            'p_status': status,
+            'p_policy_id': policy_id,
+            'p_refund': refund
+        }).execute()
+
+    async def claim_activities(self, activity_ids: List[str], user_id: Optional[str] = None,
+                               rejected: Optional[List[str]] = None) -> dict:
+        """
+        Lock a batch of approvable activities and reserve their spend in one round-trip
+
+        Returns {"policy", "results"}: "policy" is the snapshot of the
+        tenant's active policy before the batch, "results" one
+        {"id", "outcome", "activity", "amount"} per requested id in request
+        order, with outcomes as in claim_activity. Ids in `rejected` are
+        flagged without reserving anything ("rejected"); budgets and the
+        velocity limit are checked cumulatively over the rest in that order.
+        """
+        response = await self.client.rpc('claim_activities', {
+            'p_activity_ids': activity_ids,
+            'p_user_id': user_id,
+            'p_rejected': rejected or []
+        }).execute()
+        return response.data
+
+    async def settle_activities(self, updates: List[dict]) -> int:
+        """
+        Unlock claimed activities with their final status in one call
+
+        Each update is {"id", "status", "refund"}; up to "refund" of the
+        activity's reservation goes back to the budget. Returns the number
+        of activities settled.
+        """
+        response = await self.client.rpc('settle_activities', {'p_updates': updates}).execute()
+        return response.data or 0
+
+    async def deny_activities(self, activity_ids: List[str], user_id: Optional[str] = None) -> List[dict]:
+        """
+        Reject the caller's unlocked, approvable activities among `activity_ids`
+
+        Returns one {"id", "outcome", "status"} per id in request order;
+        outcome is "rejected", "not_found", "locked" or "invalid_status".
+        """
+        response = await self.client.rpc('deny_activities', {'p_activity_ids': activity_ids, 'p_user_id': user_id}).execute()
+        return response.data or []
+
+    async def recover_stale_activities(self, stale_seconds: float, limit: int = 100) -> dict:
+        """
+        Settle or lease activities locked for longer than `stale_seconds`
+
+        Returns {"settled": [{"id", "user_id", "status"}], "requeued":
+        [{"id", "user_id", "structured_intent", "policy_id", "amount"}]};
+        the requeued activities are leased to the caller to transfer again.
+        """
+        response = await self.client.rpc('recover_stale_activities', {'p_stale_seconds': stale_seconds, 'p_limit': limit}).execute()
+        return response.data
+
+    async def renew_activity_locks(self, activity_ids: List[str]) -> int:
+        """
+        Set locked_at to now on the locked activities among `activity_ids`
+
+        Transfer workers call it for the jobs they still hold, so the stale
+        sweep never takes over a transfer that is only waiting its turn.
+        Returns the number of locks renewed.
+        """
+        response = await self.client.rpc('renew_activity_locks', {'p_activity_ids': activity_ids}).execute()
+        return response.data or 0
+
+    # Spend ledger
+
+    async def reconcile_spend(self, since: Optional[datetime] = None) -> dict:
+        """
+        Rebuild the spend buckets from the ledger and transactions, from the month of `since`
+
+        Returns counts of the ledger rows added ("reserved", "released"),
+        buckets rebuilt and policies whose spend mirror changed.
+        """
+        response = await self.client.rpc('reconcile_spend', {'p_since': since.isoformat() if since else None}).execute()
+        return response.data
+
+    # Transactions
+
+    async def insert_transaction(self, transaction: dict) -> Optional[dict]:
+        response = await self.table('transactions').insert(transaction).execute()
+        return response.data[0] if response.data else None
+
+    async def insert_transactions(self, transactions: List[dict]) -> List[dict]:
+        """
+        Insert many transactions in one request
+        """
+        response = await self.table('transactions').insert(transactions).execute()
+        return response.data or []
+
+    async def claim_pending_transactions(self, limit: int = 500, lease_seconds: float = 300) -> List[dict]:
+        """
+        Lease pending on-chain transactions due for a status check, oldest first
+
+        Leased rows are not due again for `lease_seconds`, so pollers on
+        other workers take different rows; writing the results back with
+        apply_transaction_updates sets their next check.
+        """
+        response = await self.client.rpc('claim_pending_transactions', {'p_limit': limit, 'p_lease_seconds': lease_seconds}).execute()
+        return response.data or []
+
+    async def apply_transaction_updates(self, updates: List[dict]) -> int:
+        """
+        Bulk-apply poller results and settle the parent activities
+
+        Each update is {"id", "status", "confirmations", "tx_hash",
+        "next_check_in_seconds"}, where status is "confirmed", "failed" or
+        "needs_review"; returns the number of rows changed.
+        """
+        response = await self.client.rpc('apply_transaction_updates', {'p_updates': updates}).execute()
+        return response.data or 0
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# Created on first use; load tools swap in a stand-in by assigning it
+repository: Optional[Repository] = None
+
+def get_repository() -> Repository:
+    global repository
+    if repository is None:
+        settings = get_settings()
+        repository = Repository(settings.supabase_url, settings.supabase_service_key)
+    return repository
+
+async def close_repository():
+    global repository
+    if repository is not None:
+        await repository.aclose()
+        repository = None
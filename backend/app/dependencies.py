@@ -0,0 +1,54 @@
+import uuid
+from typing import Optional
+from fastapi import Header, HTTPException
+from app.config import get_settings
+
+
+def get_user_id(
+    authorization: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None, alias="X-User-Id")
+) -> Optional[str]:
+    """
+    Tenant of the request
+
+    The `sub` of a Supabase access token in `Authorization: Bearer`,
+    verified with SUPABASE_JWT_SECRET. The X-User-Id header is taken as is
+    only when TRUST_USER_ID_HEADER is set, for deployments behind a proxy
+    that authenticates users and sets it. Requests naming no user act for
+    the default tenant (rows with no user_id) unless REQUIRE_USER_ID is
+    set, which it is by default once a JWT secret is configured.
+    """
+    settings = get_settings()
+
+    if authorization:
+        scheme, _, token = authorization.partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            raise HTTPException(status_code=401, detail="Authorization must be a Bearer token")
+        return _verified_user_id(token, settings.supabase_jwt_secret)
+
+    if x_user_id:
+        if not settings.trust_user_id_header:
+            raise HTTPException(status_code=401, detail="X-User-Id is only accepted from a trusted proxy; send a Bearer token")
+        try:
+            return str(uuid.UUID(x_user_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-User-Id must be a UUID")
+
+    require = settings.require_user_id if settings.require_user_id is not None else bool(settings.supabase_jwt_secret)
+    if require:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    return None
+
+
+def _verified_user_id(token: str, secret: Optional[str]) -> str:
+    if not secret:
+        raise HTTPException(status_code=401, detail="Bearer tokens are not accepted: SUPABASE_JWT_SECRET is not set")
+
+    # Imported on first use, so importing the app stays light
+    from jose import JWTError, jwt
+
+    try:
+        claims = jwt.decode(token, secret, algorithms=["HS256"], audience="authenticated")
+        return str(uuid.UUID(claims["sub"]))
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid or expired access token")
@@ -1,27 +1,146 @@
-from fastapi import FastAPI
+import asyncio
+import importlib
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.config import settings
-from app.routers import intent, activities, policies
+from fastapi.responses import JSONResponse
+from app.config import get_settings
+from app.database import close_repository, get_repository
+from app.routers import intent, activities, policies, transfers
+from app.services.llm_client import get_llm_client
+from app.services.intent_processor import get_intent_processor
+from app.services.idempotency import get_idempotency_store
+from app.services.intent_cache import get_intent_cache
+from app.services.transfer_queue import get_transfer_queue
+from app.services.circle_wrapper import get_circle_wrapper
+from app.services.confirmation_poller import get_confirmation_poller
+from app.services.event_bus import get_event_bus
+from app.services.policy_cache import get_policy_cache
+from app.services.policy_simulator import get_policy_simulator
+from app.services.spend_reconciler import get_spend_reconciler
+from app.services.telemetry import MetricsMiddleware, get_loop_lag_monitor, render_metrics, stats_collector, tracer
+
+# Components reported on /health and /metrics; each is built on first use
+COMPONENTS = (
+    ("llm", get_llm_client),
+    ("gemini", get_intent_processor),
+    ("policy_cache", get_policy_cache),
+    ("intent_cache", get_intent_cache),
+    ("idempotency", get_idempotency_store),
+    ("transfers", get_transfer_queue),
+    ("circle", get_circle_wrapper),
+    ("confirmations", get_confirmation_poller),
+    ("spend", get_spend_reconciler),
+    ("events", get_event_bus),
+    ("simulator", get_policy_simulator),
+)
+
+def built_stats() -> dict:
+    """
+    Stats of the components this worker has already built
+
+    Probes and scrapes must not build the rest: that would import the
+    Gemini SDK on the event loop and fail on a missing setting.
+    """
+    return {
+        name: get_component().stats()
+        for name, get_component in COMPONENTS
+        if get_component.cache_info().currsize
+    }
+
+# Built by warm_up so the first requests do not pay for them
+WARM_UP = (
+    get_repository,
+    get_intent_processor,
+    get_circle_wrapper,
+    get_intent_cache,
+    get_idempotency_store,
+)
+
+async def warm_up(app: FastAPI):
+    """
+    Build the clients the first requests would otherwise wait for
+
+    Runs in the background once the worker has started, so it accepts
+    connections and answers /health right away; /ready reports 503 until
+    this has finished.
+    """
+    started = time.monotonic()
+    try:
+        # Importing the Gemini SDK takes most of a second; keep it off the event loop
+        await asyncio.to_thread(importlib.import_module, 'google.generativeai')
+        for build in WARM_UP:
+            build()
+        app.state.ready = True
+    except Exception as e:
+        app.state.warm_up_error = str(e)
+        print(f"Warm-up failed: {e}")
+    app.state.warm_up_seconds = round(time.monotonic() - started, 3)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    app.state.ready = False
+    app.state.warm_up_error = None
+    app.state.warm_up_seconds = None
+    tracer.configure(settings.otel_exporter_otlp_endpoint, settings.otel_service_name)
+    await get_loop_lag_monitor().start()
+    await get_transfer_queue().start()
+    await get_confirmation_poller().start()
+    await get_spend_reconciler().start()
+    warming = asyncio.create_task(warm_up(app))
+    yield
+    warming.cancel()
+    await asyncio.gather(warming, return_exceptions=True)
+    await get_spend_reconciler().stop()
+    await get_confirmation_poller().stop()
+    await get_loop_lag_monitor().stop()
+    await get_transfer_queue().stop()
+    await get_circle_wrapper().aclose()
+    await close_repository()
+    get_llm_client().shutdown()
+    get_policy_simulator().shutdown()
+
+class SettingsCORSMiddleware(CORSMiddleware):
+    """
+    CORSMiddleware that reads its origins from the settings
+
+    Starlette builds the middleware stack on startup, so the settings load
+    then instead of when the app is imported.
+    """
+
+    def __init__(self, app, **options):
+        super().__init__(app, allow_origins=get_settings().cors_origins, **options)
 
 app = FastAPI(
     title="Aurralis API",
     description="AI-powered transaction assistant with policy enforcement",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.cors_origins,
+    SettingsCORSMiddleware,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+# Component stats exported on /metrics, read at scrape time from the components already built
+for name, get_component in COMPONENTS:
+    stats_collector.register(
+        name,
+        lambda get_component=get_component: get_component().stats() if get_component.cache_info().currsize else {}
+    )
 
 # Include routers
 app.include_router(intent.router, prefix="/api", tags=["intent"])
 app.include_router(activities.router, prefix="/api", tags=["activities"])
 app.include_router(policies.router, prefix="/api", tags=["policies"])
+app.include_router(transfers.router, prefix="/api", tags=["transfers"])
 
 @app.get("/")
 async def root():
@@ -33,4 +152,25 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        **built_stats()
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Whether this worker has finished warming up and should get traffic
+    """
+    if not app.state.ready:
+        return JSONResponse(status_code=503, content={
+            "status": "failed" if app.state.warm_up_error else "starting",
+            "error": app.state.warm_up_error
+        })
+    return {"status": "ready", "warm_up_seconds": app.state.warm_up_seconds}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -1,45 +1,175 @@
-from fastapi import APIRouter, HTTPException
-from app.database import get_supabase
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.config import get_settings
+from app.database import get_repository
+from app.dependencies import get_user_id
+from app.services.event_bus import get_event_bus
+from datetime import datetime
+from typing import List, Optional, Tuple
+import base64
+import json
+import uuid
 
 router = APIRouter()
 
+ACTIVITY_FIELDS = {
+    'id', 'user_id', 'user_query', 'structured_intent', 'ai_reasoning', 'status',
+    'policy_checks', 'policy_version', 'locked', 'locked_at', 'created_at', 'updated_at'
+}
+
+# Columns the cursor is built from, always selected
+CURSOR_FIELDS = ['created_at', 'id']
+
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(activity: dict) -> str:
+    raw = f"{activity['created_at']}|{activity['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    The (created_at, id) a cursor points after
+
+    Both are parsed and re-serialized, since they end up in a PostgREST
+    filter string; anything else in the cursor is rejected.
+    """
+    try:
+        created_at, activity_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(activity_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = set(requested) - ACTIVITY_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    
+    return CURSOR_FIELDS + [f for f in requested if f not in CURSOR_FIELDS]
+
 @router.get("/activities")
-async def get_activities():
+async def get_activities(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[List[str]] = Query(None),
+    user_id: Optional[str] = Depends(get_user_id),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    include_transactions: bool = False
+):
     """
-    Get all agent activities with transactions
+    Get a page of the caller's agent activities, newest first
+    
+    Pass the returned `next_cursor` as `cursor` to fetch the next page.
+    `fields` is a comma-separated column projection and transactions are
+    only embedded when `include_transactions` is set.
     """
-    supabase = get_supabase()
+    repository = get_repository()
+    after = decode_cursor(cursor) if cursor else None
+    columns = parse_fields(fields)
     
     try:
-        response = supabase.table('agent_activities').select('''
-            *,
-            transactions (*)
-        ''').order('created_at', desc=True).execute()
+        # Fetch one extra row to know whether another page exists
+        rows = await repository.list_activities(
+            limit=limit + 1,
+            after=after,
+            statuses=status,
+            user_id=user_id,
+            created_after=created_after,
+            created_before=created_before,
+            columns=columns,
+            with_transactions=include_transactions
+        )
+        
+        activities = rows[:limit]
+        next_cursor = encode_cursor(activities[-1]) if len(rows) > limit else None
         
-        return {"activities": response.data}
+        return {"activities": activities, "next_cursor": next_cursor}
         
     except Exception as e:
         print(f"Error fetching activities: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/activities/stream")
+async def stream_activities(
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user_id: Optional[str] = Depends(get_user_id)
+):
+    """
+    Stream the caller's activity and transaction changes as server-sent events
+    
+    Events are compact deltas: `activity.created` carries the new row's
+    summary, while `activity.updated`, `transaction.created` and
+    `transaction.updated` carry only what changed. Browsers resume from
+    the Last-Event-ID header on reconnect; a `reset` event means the gap
+    was too large to replay and the client should refetch /api/activities.
+    """
+    resume_from = last_event_id_header or last_event_id
+    
+    async def events():
+        subscription = get_event_bus().subscribe(resume_from, heartbeat=get_settings().event_heartbeat, user_id=user_id)
+        try:
+            yield "retry: 3000\n\n"
+            async for event in subscription:
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+        finally:
+            # Unregister right away when the client disconnects
+            await subscription.aclose()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/activities/stats")
+async def get_activity_stats(
+    days: int = Query(30, ge=1, le=366),
+    vendors: int = Query(10, ge=1, le=100),
+    user_id: Optional[str] = Depends(get_user_id)
+):
+    """
+    Dashboard aggregates for the caller
+    
+    Activities by status, spend per day over the last `days` days, the
+    current spend windows and the top `vendors` vendors by spend. Read
+    from summary tables the database keeps current on every write, so the
+    cost and size of the answer do not grow with the history.
+    """
+    repository = get_repository()
+    
+    try:
+        return await repository.get_activity_stats(user_id, days=days, vendors=vendors)
+        
+    except Exception as e:
+        print(f"Error fetching activity stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/activities/{activity_id}")
-async def get_activity(activity_id: str):
+async def get_activity(activity_id: str, user_id: Optional[str] = Depends(get_user_id)):
     """
     Get specific activity
     """
-    supabase = get_supabase()
+    repository = get_repository()
     
     try:
-        response = supabase.table('agent_activities').select('''
-            *,
-            transactions (*)
-        ''').eq('id', activity_id).single().execute()
+        activity = await repository.get_activity(activity_id, user_id, with_transactions=True)
         
-        if not response.data:
+        if not activity:
             raise HTTPException(status_code=404, detail="Activity not found")
         
-        return response.data
+        return activity
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching activity: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,206 +1,610 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from app.database import get_supabase
-from app.services.intent_processor import intent_processor
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
+from app.config import get_settings
+from app.database import get_repository
+from app.dependencies import get_user_id
+from app.services.event_bus import get_event_bus
+from app.services.idempotency import get_idempotency_store
+from app.services.intent_processor import get_intent_processor
+from app.services.policy_cache import get_policy_cache
+from app.services.policy_rules import SpendState
 from app.services.policy_validator import policy_validator
-from app.services.circle_wrapper import circle_wrapper
-from app.services.proof_generator import proof_generator
+from app.services.telemetry import stage
+from app.services.transfer_queue import get_transfer_queue
 import asyncio
+import json
+import uuid
 
 router = APIRouter()
 
 class IntentRequest(BaseModel):
     query: str
 
+class BatchIntentRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    
+    @field_validator('queries')
+    @classmethod
+    def limit_batch_size(cls, queries: List[str]) -> List[str]:
+        # Checked per request so the limit is read from the settings at run time
+        max_items = get_settings().intent_batch_max_items
+        if len(queries) > max_items:
+            raise ValueError(f"At most {max_items} queries per batch")
+        return queries
+
 class ApproveRequest(BaseModel):
     activity_id: str
 
+class BatchActivityRequest(BaseModel):
+    activity_ids: List[str] = Field(..., min_length=1)
+    
+    @field_validator('activity_ids')
+    @classmethod
+    def normalize_ids(cls, activity_ids: List[str]) -> List[str]:
+        max_items = get_settings().approve_batch_max_items
+        # Canonical ids, first occurrence wins, so repeats act once
+        normalized = list(dict.fromkeys(str(uuid.UUID(activity_id)) for activity_id in activity_ids))
+        if len(normalized) > max_items:
+            raise ValueError(f"At most {max_items} activities per batch")
+        return normalized
+
+NOT_A_TRANSACTION_MESSAGE = "I'd be happy to help! Please specify an amount and recipient. For example: 'Send $100 to Stripe'"
+
+def build_activity(query: str, intent_data: dict, validation: dict, status: str, policy: dict, user_id: Optional[str]) -> dict:
+    return {
+        "user_id": user_id,
+        "user_query": query,
+        "structured_intent": intent_data,
+        "ai_reasoning": intent_data.get('reasoning', ''),
+        "status": status,
+        "policy_checks": validation['policy_checks'],
+        "policy_version": policy.get('version')
+    }
+
+def decision_card(activity: dict, intent_data: dict, validation: dict, status: str) -> dict:
+    return {
+        "activity_id": activity['id'],
+        "structured_intent": intent_data,
+        "ai_reasoning": intent_data.get('reasoning', ''),
+        "policy_checks": validation['policy_checks'],
+        "status": status,
+        "is_valid": validation['is_valid'],
+        "violations": validation.get('violations', [])
+    }
+
 @router.post("/intent")
-async def process_intent(request: IntentRequest):
+async def process_intent(
+    request: IntentRequest,
+    user_id: Optional[str] = Depends(get_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     Process user query and create agent activity
+    
+    Repeats with the same Idempotency-Key return the first response instead
+    of creating another activity; concurrent identical queries share one run.
     """
-    supabase = get_supabase()
+    return await get_idempotency_store().run(
+        f'intent:{user_id}', idempotency_key, {"query": request.query},
+        lambda: create_intent_activity(request.query, user_id)
+    )
+
+async def create_intent_activity(query: str, user_id: Optional[str]):
+    repository = get_repository()
     
     try:
         # 1. Fetch current policy
-        policy_response = supabase.table('policies').select('*').order('created_at', desc=True).limit(1).execute()
-        if not policy_response.data:
+        with stage('intent', 'policy_fetch'):
+            policy = await get_policy_cache().get(user_id)
+        if not policy:
             raise HTTPException(status_code=404, detail="Policy not found")
         
-        policy = policy_response.data[0]
-        
         # 2. Process intent with Gemini
-        intent_data = await intent_processor.process_query(request.query, policy)
+        with stage('intent', 'parse'):
+            intent_data = await get_intent_processor().process_query(query, policy)
         
         if not intent_data or not intent_data.get('amount'):
             return {
-                "message": "I'd be happy to help! Please specify an amount and recipient. For example: 'Send $100 to Stripe'",
+                "message": NOT_A_TRANSACTION_MESSAGE,
                 "is_transaction": False
             }
         
         # 3. Validate against policy
-        validation = policy_validator.validate(intent_data, policy)
-        status = policy_validator.determine_status(validation['is_valid'])
+        with stage('intent', 'validate'):
+            validation = policy_validator.validate(intent_data, policy)
+            status = policy_validator.determine_status(validation['is_valid'])
         
         # 4. Create agent_activity record
-        activity_data = {
-            "user_query": request.query,
-            "structured_intent": intent_data,
-            "ai_reasoning": intent_data.get('reasoning', ''),
-            "status": status,
-            "policy_checks": validation['policy_checks']
-        }
+        activity_data = build_activity(query, intent_data, validation, status, policy, user_id)
         
-        activity_response = supabase.table('agent_activities').insert(activity_data).execute()
+        with stage('intent', 'insert'):
+            activity = await repository.insert_activity(activity_data)
         
-        if not activity_response.data:
+        if not activity:
             raise HTTPException(status_code=500, detail="Failed to create activity")
-        
-        activity = activity_response.data[0]
+        get_event_bus().activity_created(activity, intent_data)
         
         # 5. Return decision card data
+        return decision_card(activity, intent_data, validation, status)
+        
+    except Exception as e:
+        print(f"Error processing intent: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/intent/stream")
+async def stream_intent(request: IntentRequest, user_id: Optional[str] = Depends(get_user_id)):
+    """
+    Process user query, streaming the decision as server-sent events
+    
+    Emits `fields` with the structured intent as soon as it parses,
+    `reasoning` deltas while Gemini writes them, `checks` with the policy
+    validation and finally `decision` with the same payload as POST
+    /api/intent (or `message` when the query is not a transaction).
+    """
+    repository = get_repository()
+    
+    # 1. Fetch current policy before the stream starts, so errors keep their status code
+    try:
+        policy = await get_policy_cache().get(user_id)
+    except Exception as e:
+        print(f"Error processing intent: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not policy:
+        raise HTTPException(status_code=404, detail="Policy not found")
+    
+    async def events():
+        try:
+            # 2. Stream the intent from Gemini
+            intent_data = None
+            async for kind, payload in get_intent_processor().stream_query(request.query, policy):
+                if kind == 'fields':
+                    yield sse('fields', payload)
+                elif kind == 'reasoning':
+                    if payload:
+                        yield sse('reasoning', {"delta": payload})
+                else:
+                    intent_data = payload
+            
+            if not intent_data or not intent_data.get('amount'):
+                yield sse('message', {"message": NOT_A_TRANSACTION_MESSAGE, "is_transaction": False})
+                return
+            
+            # 3. Validate against policy
+            validation = policy_validator.validate(intent_data, policy)
+            status = policy_validator.determine_status(validation['is_valid'])
+            yield sse('checks', {
+                "policy_checks": validation['policy_checks'],
+                "is_valid": validation['is_valid'],
+                "violations": validation.get('violations', []),
+                "status": status
+            })
+            
+            # 4. Create agent_activity record
+            activity = await repository.insert_activity(build_activity(request.query, intent_data, validation, status, policy, user_id))
+            if not activity:
+                yield sse('error', {"detail": "Failed to create activity"})
+                return
+            get_event_bus().activity_created(activity, intent_data)
+            
+            # 5. Finish with the decision card
+            yield sse('decision', decision_card(activity, intent_data, validation, status))
+            
+        except Exception as e:
+            print(f"Error streaming intent: {e}")
+            yield sse('error', {"detail": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/intents")
+async def process_intents(request: BatchIntentRequest, user_id: Optional[str] = Depends(get_user_id)):
+    """
+    Process a batch of queries against one policy snapshot
+    
+    Items are validated in order and each valid item counts against the
+    daily and monthly budgets for the ones after it. Results are returned
+    per item, in request order, alongside any per-item errors.
+    """
+    repository = get_repository()
+    
+    try:
+        # 1. Fetch current policy once for the whole batch
+        policy = await get_policy_cache().get(user_id)
+        if not policy:
+            raise HTTPException(status_code=404, detail="Policy not found")
+        
+        # 2. Parse intents concurrently with a bounded fan-out
+        semaphore = asyncio.Semaphore(get_settings().intent_batch_concurrency)
+        
+        async def parse(query: str):
+            async with semaphore:
+                return await get_intent_processor().process_query(query, policy)
+        
+        parsed = await asyncio.gather(*(parse(q) for q in request.queries), return_exceptions=True)
+        
+        # 3. Validate in one batch pass so earlier items consume budget
+        results = [None] * len(request.queries)
+        transactions = []
+        
+        for index, (query, intent_data) in enumerate(zip(request.queries, parsed)):
+            if isinstance(intent_data, Exception):
+                results[index] = {"index": index, "query": query, "error": str(intent_data)}
+                continue
+            if not intent_data or not intent_data.get('amount'):
+                results[index] = {"index": index, "query": query, "is_transaction": False, "message": NOT_A_TRANSACTION_MESSAGE}
+                continue
+            transactions.append((index, query, intent_data))
+        
+        evaluations = policy_validator.validate_batch([intent_data for _, _, intent_data in transactions], policy)
+        pending = []
+        for (index, query, intent_data), evaluation in zip(transactions, evaluations):
+            validation = evaluation.as_dict()
+            pending.append((index, query, intent_data, validation, policy_validator.determine_status(validation['is_valid'])))
+        
+        # 4. Create all agent_activity records in one insert
+        if pending:
+            activities = await repository.insert_activities([
+                build_activity(query, intent_data, validation, status, policy, user_id)
+                for _, query, intent_data, validation, status in pending
+            ])
+            if len(activities) != len(pending):
+                raise HTTPException(status_code=500, detail="Failed to create activities")
+            
+            for (index, query, intent_data, validation, status), activity in zip(pending, activities):
+                get_event_bus().activity_created(activity, intent_data)
+                results[index] = {"index": index, "query": query, **decision_card(activity, intent_data, validation, status)}
+        
+        # 5. Return per-item results
         return {
-            "activity_id": activity['id'],
-            "structured_intent": intent_data,
-            "ai_reasoning": intent_data.get('reasoning', ''),
-            "policy_checks": validation['policy_checks'],
-            "status": status,
-            "is_valid": validation['is_valid'],
-            "violations": validation.get('violations', [])
+            "results": results,
+            "summary": {
+                "total": len(results),
+                "created": len(pending),
+                "flagged": sum(1 for item in pending if item[4] == 'flagged_by_policy'),
+                "not_transactions": sum(1 for r in results if r.get('is_transaction') is False),
+                "errors": sum(1 for r in results if 'error' in r)
+            }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error processing intent: {e}")
+        print(f"Error processing intent batch: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/approve/{activity_id}")
-async def approve_transaction(activity_id: str):
+async def approve_transaction(
+    activity_id: str,
+    wait: bool = False,
+    user_id: Optional[str] = Depends(get_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
-    Approve and execute transaction
+    Approve transaction and queue its execution
+    
+    Returns 202 once the transfer is queued; progress streams from
+    /api/transfers/{activity_id}/events. With `wait=true` the call blocks
+    until the transfer finishes and returns the proof data. Retries with the
+    same Idempotency-Key get the original response back.
     """
-    supabase = get_supabase()
+    return await get_idempotency_store().run(
+        f'approve:{user_id}', idempotency_key, {"activity_id": activity_id, "wait": wait},
+        lambda: execute_approval(activity_id, wait, user_id)
+    )
+
+async def execute_approval(activity_id: str, wait: bool, user_id: Optional[str]):
+    repository = get_repository()
+    claimed = False
+    amount = 0.0
+    policy = None
     
     try:
-        # 1. Get activity
-        activity_response = supabase.table('agent_activities').select('*').eq('id', activity_id).single().execute()
+        # 1-4. Lock the activity, check its status and reserve the spend in one
+        # atomic call, so concurrent approvals can neither both execute nor
+        # overshoot the budget
+        with stage('approve', 'claim'):
+            claim = await repository.claim_activity(activity_id, user_id)
+        outcome = claim.get('outcome')
         
-        if not activity_response.data:
+        if outcome == 'not_found':
             raise HTTPException(status_code=404, detail="Activity not found")
-        
-        activity = activity_response.data
-        
-        # 2. Check state lock
-        if activity.get('locked'):
+        if outcome == 'locked':
             raise HTTPException(status_code=409, detail="Transaction already being processed")
+        if outcome == 'invalid_status':
+            raise HTTPException(status_code=400, detail=f"Cannot approve transaction in status: {claim['activity']['status']}")
         
-        # 3. Check status
-        if activity['status'] not in ['pending_approval', 'flagged_by_policy']:
-            raise HTTPException(status_code=400, detail=f"Cannot approve transaction in status: {activity['status']}")
+        activity = claim['activity']
+        intent = activity['structured_intent']
+        policy = claim.get('policy')
         
-        # 4. Set lock
-        supabase.table('agent_activities').update({
-            'locked': True,
-            'locked_at': 'now()',
-            'status': 'executing'
-        }).eq('id', activity_id).execute()
+        if outcome == 'over_budget':
+            # The activity was already flagged by the same call
+            get_policy_cache().replace(policy)
+            get_event_bus().activity_updated(activity_id, 'flagged_by_policy', user_id)
+            detail = policy_validator.check(intent, policy) or "Transaction exceeds policy limits"
+            raise HTTPException(status_code=403, detail=detail)
         
-        # 5. Re-validate policy
-        policy_response = supabase.table('policies').select('*').order('created_at', desc=True).limit(1).execute()
-        policy = policy_response.data[0] if policy_response.data else None
+        claimed = True
+        amount = float(claim.get('amount') or 0)
+        get_event_bus().activity_updated(activity_id, 'executing', user_id)
+        if policy:
+            spend = SpendState.from_policy(policy)
+            spend.add(amount)
+            get_policy_cache().replace({**policy, **spend.window()})
         
+        # 5. Re-validate policy against the snapshot the spend was reserved on
         if policy:
-            intent = activity['structured_intent']
-            validation = policy_validator.validate(intent, policy)
+            with stage('approve', 'validate'):
+                violation = policy_validator.check(intent, policy)
             
-            if not validation['is_valid']:
-                # Update status to flagged
-                supabase.table('agent_activities').update({
-                    'status': 'flagged_by_policy',
-                    'locked': False
-                }).eq('id', activity_id).execute()
+            if violation:
+                # Flag and give the reserved spend back
+                await repository.release_activity(activity_id, 'flagged_by_policy', policy['id'], amount)
+                claimed = False
+                get_policy_cache().invalidate(user_id)
+                get_event_bus().activity_updated(activity_id, 'flagged_by_policy', user_id)
                 
-                raise HTTPException(status_code=403, detail=validation['violations'][0])
+                raise HTTPException(status_code=403, detail=violation)
         
-        # 6. Execute via Circle
-        intent = activity['structured_intent']
-        transfer_result = await circle_wrapper.transfer_with_timeout(
-            amount=intent['amount'],
-            recipient=intent['recipient'],
-            timeout=30
-        )
-        
-        # 7. Create transaction record
-        transaction_data = {
-            'activity_id': activity_id,
-            'tx_hash': transfer_result['tx_hash'],
-            'explorer_url': proof_generator.generate_explorer_url(transfer_result['tx_hash']),
-            'amount': intent['amount'],
-            'currency': intent.get('currency', 'USDC'),
-            'recipient': intent['recipient'],
-            'status': transfer_result['status'],
-            'confirmations': 0
-        }
+        # 6. Hand the transfer to the background workers
+        with stage('approve', 'enqueue'):
+            job = get_transfer_queue().enqueue(activity_id, user_id, intent, policy['id'] if policy else None, amount)
+        claimed = False
         
-        tx_response = supabase.table('transactions').insert(transaction_data).execute()
+        if not wait:
+            return JSONResponse(status_code=202, content={
+                "activity_id": activity_id,
+                "status": "executing",
+                "job": job.snapshot(),
+                "events_url": f"/api/transfers/{activity_id}/events"
+            })
         
-        # 8. Update activity status
-        final_status = 'executed' if transfer_result['status'] == 'confirmed' else 'executing'
-        supabase.table('agent_activities').update({
-            'status': final_status,
-            'locked': False
-        }).eq('id', activity_id).execute()
+        # 7. Optionally block until the proof is ready, as the endpoint used to
+        with stage('approve', 'wait_transfer'):
+            await job.done.wait()
+        if job.state == 'failed':
+            raise HTTPException(status_code=500, detail=job.error)
         
-        # 9. Update policy spending
-        if policy:
-            new_spent = float(policy.get('current_monthly_spent', 0)) + intent['amount']
-            supabase.table('policies').update({
-                'current_monthly_spent': new_spent
-            }).eq('id', policy['id']).execute()
-        
-        # 10. Return proof data
-        return {
-            "activity_id": activity_id,
-            "tx_hash": transfer_result['tx_hash'],
-            "explorer_url": proof_generator.generate_explorer_url(transfer_result['tx_hash']),
-            "status": transfer_result['status'],
-            "proof_data": proof_generator.generate_proof_data(
-                transfer_result['tx_hash'],
-                intent['amount'],
-                intent['recipient']
-            )
-        }
+        return job.result
         
     except HTTPException:
         raise
     except Exception as e:
-        # Release lock on error
-        supabase.table('agent_activities').update({
-            'status': 'failed',
-            'locked': False
-        }).eq('id', activity_id).execute()
+        # Release lock on error and refund the reservation
+        if claimed:
+            await repository.release_activity(activity_id, 'failed', policy['id'] if policy else None, amount)
+            get_policy_cache().invalidate(user_id)
+            get_event_bus().activity_updated(activity_id, 'failed', user_id)
         
         print(f"Error approving transaction: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/deny/{activity_id}")
-async def deny_transaction(activity_id: str):
+async def deny_transaction(activity_id: str, user_id: Optional[str] = Depends(get_user_id)):
     """
     Deny transaction
     """
-    supabase = get_supabase()
+    repository = get_repository()
     
     try:
-        # Update activity status
-        response = supabase.table('agent_activities').update({
-            'status': 'rejected'
-        }).eq('id', activity_id).execute()
+        # One update scoped to the owner, so nobody else's activity can be denied
+        [result] = await repository.deny_activities([activity_id], user_id)
         
-        if not response.data:
+        if result['outcome'] == 'not_found':
             raise HTTPException(status_code=404, detail="Activity not found")
+        if result['outcome'] == 'locked':
+            raise HTTPException(status_code=409, detail="Transaction already being processed")
+        if result['outcome'] == 'invalid_status':
+            raise HTTPException(status_code=400, detail=f"Cannot deny transaction in status: {result['status']}")
+        get_event_bus().activity_updated(activity_id, 'rejected', user_id)
         
         return {"message": "Transaction denied", "activity_id": activity_id}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error denying transaction: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+# Per-item detail for activities a batch could not act on
+SKIPPED_DETAILS = {
+    "not_found": "Activity not found",
+    "locked": "Transaction already being processed",
+    "invalid_status": "Cannot act on transaction in status: {status}",
+}
+
+def skipped(activity_id: str, outcome: str, status: Optional[str] = None) -> dict:
+    return {
+        "activity_id": activity_id,
+        "outcome": outcome,
+        "status": status,
+        "detail": SKIPPED_DETAILS[outcome].format(status=status)
+    }
+
+@router.post("/approve:batch")
+async def approve_transactions(
+    request: BatchActivityRequest,
+    wait: bool = False,
+    user_id: Optional[str] = Depends(get_user_id),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Approve a batch of transactions and execute them together
+    
+    Intents that break a rule the spend does not affect (vendor lists, time
+    windows, vendor caps) are flagged without reserving anything. The rest
+    are locked in one statement and checked in request order against one
+    policy snapshot, each counting against the budgets and velocity limit
+    for the ones after it; those that no longer fit are flagged. Transfers run
+    concurrently and their results are written in bulk. Returns 202 with
+    one result per activity, in request order; with `wait=true` it blocks
+    until every transfer has finished.
+    """
+    return await get_idempotency_store().run(
+        f'approve-batch:{user_id}', idempotency_key, {"activity_ids": request.activity_ids, "wait": wait},
+        lambda: execute_batch_approval(request.activity_ids, wait, user_id)
+    )
+
+async def execute_batch_approval(activity_ids: List[str], wait: bool, user_id: Optional[str]):
+    repository = get_repository()
+    claimed = []
+    policy = None
+    
+    try:
+        # 1. Check the rules the spend does not affect up front, so the claim
+        # reserves nothing for the intents they flag
+        with stage('approve_batch', 'precheck'):
+            current, rows = await asyncio.gather(
+                get_policy_cache().get(user_id),
+                repository.get_activities(activity_ids, user_id, columns=['id', 'structured_intent'])
+            )
+        rejections = {}
+        if current:
+            for row in rows:
+                violation = policy_validator.check_stateless(row.get('structured_intent') or {}, current)
+                if violation:
+                    rejections[row['id']] = violation
+        
+        # 2. Lock every activity and reserve the spend of those that fit in one call; the
+        # budgets and velocity limit are checked there, atomically and in request order
+        with stage('approve_batch', 'claim'):
+            claim = await repository.claim_activities(activity_ids, user_id, list(rejections))
+        policy = claim.get('policy')
+        policy_id = policy['id'] if policy else None
+        
+        # 3. Re-check the claimed ones against the snapshot the spend was reserved on,
+        # in case the policy changed since the pre-check; those that fail are released
+        results = {}
+        released = []
+        spend = SpendState.from_policy(policy)
+        
+        with stage('approve_batch', 'validate'):
+            for item in claim.get('results') or []:
+                activity_id, outcome = item['id'], item['outcome']
+                if outcome in SKIPPED_DETAILS:
+                    results[activity_id] = skipped(activity_id, outcome, (item.get('activity') or {}).get('status'))
+                    continue
+                
+                intent = item['activity']['structured_intent']
+                amount = float(item.get('amount') or 0)
+                
+                if outcome in ('rejected', 'over_budget'):
+                    # Already flagged by the claim
+                    detail = rejections.get(activity_id) or (policy_validator.check(intent, policy, spend) if policy else None)
+                    results[activity_id] = {
+                        "activity_id": activity_id, "outcome": "flagged", "status": "flagged_by_policy",
+                        "detail": detail or "Transaction exceeds policy limits"
+                    }
+                    continue
+                
+                claimed.append((activity_id, intent, amount))
+                violation = policy_validator.check_stateless(intent, policy) if policy else None
+                if violation:
+                    released.append({"id": activity_id, "status": "flagged_by_policy", "refund": amount})
+                    results[activity_id] = {"activity_id": activity_id, "outcome": "flagged", "status": "flagged_by_policy", "detail": violation}
+                else:
+                    spend.add(amount)
+        
+        # 4. Flag the ones that failed the re-check and give their spend back
+        if released:
+            await repository.settle_activities(released)
+            flagged = {update['id'] for update in released}
+            claimed = [entry for entry in claimed if entry[0] not in flagged]
+        
+        if released:
+            get_policy_cache().invalidate(user_id)
+        elif policy:
+            get_policy_cache().replace({**policy, **spend.window()})
+        
+        for activity_id, result in results.items():
+            if result['outcome'] == 'flagged':
+                get_event_bus().activity_updated(activity_id, 'flagged_by_policy', user_id)
+        for activity_id, _, _ in claimed:
+            get_event_bus().activity_updated(activity_id, 'executing', user_id)
+        
+        # 5. Hand the transfers over as one batch
+        jobs = []
+        if claimed:
+            with stage('approve_batch', 'enqueue'):
+                jobs = get_transfer_queue().enqueue_batch(user_id, policy_id, claimed)
+        claimed = []
+        
+        # 6. Optionally block until every transfer has finished
+        if wait and jobs:
+            with stage('approve_batch', 'wait_transfer'):
+                await asyncio.gather(*(job.done.wait() for job in jobs))
+        
+        for job in jobs:
+            result = {"activity_id": job.activity_id, "outcome": "queued", "status": "executing", "events_url": f"/api/transfers/{job.activity_id}/events"}
+            if wait:
+                if job.state == 'failed':
+                    result.update(outcome="failed", status="failed", detail=job.error)
+                else:
+                    result.update(outcome="completed", status="executed" if job.result['status'] == 'confirmed' else "executing", result=job.result)
+            results[job.activity_id] = result
+        
+        ordered = [results[activity_id] for activity_id in activity_ids if activity_id in results]
+        outcomes = [result['outcome'] for result in ordered]
+        return JSONResponse(status_code=200 if wait else 202, content={
+            "results": ordered,
+            "summary": {
+                "total": len(ordered),
+                **{outcome: outcomes.count(outcome) for outcome in dict.fromkeys(outcomes)}
+            }
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Release the locks taken by the claim and refund their reservations
+        if claimed:
+            await repository.settle_activities([
+                {"id": activity_id, "status": "failed", "refund": amount} for activity_id, _, amount in claimed
+            ])
+            get_policy_cache().invalidate(user_id)
+            for activity_id, _, _ in claimed:
+                get_event_bus().activity_updated(activity_id, 'failed', user_id)
+        
+        print(f"Error approving transaction batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/deny:batch")
+async def deny_transactions(request: BatchActivityRequest, user_id: Optional[str] = Depends(get_user_id)):
+    """
+    Deny a batch of transactions in one update
+    
+    Only the caller's activities awaiting a decision are rejected; locked
+    or already decided ones are reported per item and left alone.
+    """
+    repository = get_repository()
+    
+    try:
+        denied = await repository.deny_activities(request.activity_ids, user_id)
+        
+        results = []
+        for item in denied:
+            if item['outcome'] == 'rejected':
+                get_event_bus().activity_updated(item['id'], 'rejected', user_id)
+                results.append({"activity_id": item['id'], "outcome": "rejected", "status": "rejected"})
+            else:
+                results.append(skipped(item['id'], item['outcome'], item.get('status')))
+        
+        return {
+            "results": results,
+            "summary": {
+                "total": len(results),
+                "rejected": sum(1 for result in results if result['outcome'] == 'rejected')
+            }
+        }
+        
+    except Exception as e:
+        print(f"Error denying transaction batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from app.database import get_supabase
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, field_validator
+from app.database import get_repository
+from app.dependencies import get_user_id
+from app.services.event_bus import get_event_bus
+from app.services.policy_cache import get_policy_cache
+from app.services.policy_rules import SpendState, compile_rules
+from app.services.policy_simulator import get_policy_simulator
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
 router = APIRouter()
 
@@ -10,18 +16,27 @@ class PolicyUpdate(BaseModel):
     monthly_budget: float | None = None
     allow_list: List[str] | None = None
     block_list: List[str] | None = None
+    vendor_aliases: Dict[str, List[str]] | None = None
+    rules: List[dict] | None = None
+    
+    @field_validator('rules')
+    @classmethod
+    def check_rules(cls, rules: List[dict] | None) -> List[dict] | None:
+        # Compiling raises RuleError (a ValueError), which becomes a 422
+        compile_rules(rules)
+        return rules
 
 @router.get("/policy")
-async def get_policy():
+async def get_policy(user_id: Optional[str] = Depends(get_user_id)):
     """
-    Get current policy
+    Get the caller's current policy, creating the default one on first use
     """
-    supabase = get_supabase()
+    repository = get_repository()
     
     try:
-        response = supabase.table('policies').select('*').order('created_at', desc=True).limit(1).execute()
+        policy = await get_policy_cache().get(user_id)
         
-        if not response.data:
+        if not policy:
             # Create default policy
             default_policy = {
                 'max_tx_amount': 1000,
@@ -32,31 +47,33 @@ async def get_policy():
                 'block_list': []
             }
             
-            create_response = supabase.table('policies').insert(default_policy).execute()
-            return create_response.data[0] if create_response.data else default_policy
+            created = await repository.insert_policy(default_policy, user_id)
+            if not created:
+                return default_policy
+            # Reload so the spend windows come from the ledger
+            get_policy_cache().invalidate(user_id)
+            return await get_policy_cache().get(user_id) or created
         
-        return response.data[0]
+        return policy
         
     except Exception as e:
         print(f"Error fetching policy: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/policy")
-async def update_policy(policy_update: PolicyUpdate):
+async def update_policy(policy_update: PolicyUpdate, user_id: Optional[str] = Depends(get_user_id)):
     """
-    Update policy
+    Update the caller's policy
     """
-    supabase = get_supabase()
+    repository = get_repository()
     
     try:
         # Get current policy
-        response = supabase.table('policies').select('*').order('created_at', desc=True).limit(1).execute()
+        current_policy = await get_policy_cache().get(user_id)
         
-        if not response.data:
+        if not current_policy:
             raise HTTPException(status_code=404, detail="Policy not found")
         
-        current_policy = response.data[0]
-        
         # Prepare updates
         updates = {}
         if policy_update.max_tx_amount is not None:
@@ -67,12 +84,56 @@ async def update_policy(policy_update: PolicyUpdate):
             updates['allow_list'] = policy_update.allow_list
         if policy_update.block_list is not None:
             updates['block_list'] = policy_update.block_list
+        if policy_update.vendor_aliases is not None:
+            updates['vendor_aliases'] = policy_update.vendor_aliases
+        if policy_update.rules is not None:
+            updates['rules'] = policy_update.rules
         
         # Update policy
-        update_response = supabase.table('policies').update(updates).eq('id', current_policy['id']).execute()
+        updated = await repository.update_policy(current_policy['id'], updates)
         
-        return update_response.data[0] if update_response.data else current_policy
+        # Drop the cached copy everywhere so the next request sees the new rules
+        if updated:
+            # Spend windows come from the ledger, not the policies row
+            updated = {**updated, **SpendState.from_policy(current_policy).window()}
+            get_policy_cache().replace(updated)
+            get_event_bus().publish('policy.updated', {"id": updated['id'], "version": updated.get('version'), **updates}, user_id)
+        else:
+            get_policy_cache().invalidate(user_id)
+        
+        return updated or current_policy
         
     except Exception as e:
         print(f"Error updating policy: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/policy/simulate")
+async def simulate_policy(
+    policy_update: PolicyUpdate,
+    days: int = Query(90, ge=1, le=3660),
+    user_id: Optional[str] = Depends(get_user_id)
+):
+    """
+    Backtest policy changes against the caller's past intents
+
+    Takes the same body as PUT /policy and nothing is saved. Every activity
+    of the last `days` days is scored under the current policy and under
+    the changed one, each against the spend windows it saw at the time;
+    returns the decisions that would flip, by rule and by vendor.
+    """
+    try:
+        current_policy = await get_policy_cache().get(user_id)
+        
+        if not current_policy:
+            raise HTTPException(status_code=404, detail="Policy not found")
+        
+        # No id or version, so the candidate plan is cached by its content
+        candidate = {**current_policy, **policy_update.model_dump(exclude_none=True), 'id': None, 'version': None}
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        return await get_policy_simulator().run(current_policy, candidate, user_id, since)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error simulating policy: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
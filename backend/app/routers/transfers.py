@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from app.dependencies import get_user_id
+from app.services.transfer_queue import TransferJob, get_transfer_queue
+from typing import Optional
+import json
+
+router = APIRouter()
+
+def get_job(activity_id: str, user_id: Optional[str]) -> TransferJob:
+    job = get_transfer_queue().get(activity_id)
+    if not job or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Transfer not found")
+    return job
+
+@router.get("/transfers/{activity_id}")
+async def get_transfer(activity_id: str, user_id: Optional[str] = Depends(get_user_id)):
+    """
+    Get the current state of a queued transfer
+    """
+    job = get_job(activity_id, user_id)
+    
+    return job.snapshot()
+
+@router.get("/transfers/{activity_id}/events")
+async def stream_transfer_events(activity_id: str, user_id: Optional[str] = Depends(get_user_id)):
+    """
+    Stream transfer progress as server-sent events
+    
+    Each `step` event carries the ExecutionProgress step id (validate,
+    transfer, confirm) and its status; the stream ends once the job
+    completes or fails.
+    """
+    get_job(activity_id, user_id)
+    
+    async def events():
+        async for event in get_transfer_queue().subscribe(activity_id):
+            name = 'step' if 'step' in event else 'state'
+            yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
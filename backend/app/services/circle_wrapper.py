@@ -1,81 +1,365 @@
 import httpx
-from app.config import settings
+from app.config import get_settings
+from app.services.telemetry import external_call
 import asyncio
-from typing import Dict
+import hashlib
+import random
+import time
+import uuid
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+
+class CircleAPIError(Exception):
+    """
+    Raised when Circle rejects a request or retries are exhausted
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+
+class CircuitOpenError(CircleAPIError):
+    """
+    Raised without calling Circle while the circuit breaker is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after consecutive failures and lets a single probe through once
+    the reset timeout has passed
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self) -> bool:
+        """
+        Raise while open; returns whether this call is the half-open probe
+        """
+        state = self.state
+        if state == 'open' or (state == 'half_open' and self.probing):
+            raise CircuitOpenError("Circle circuit breaker is open")
+        if state == 'half_open':
+            self.probing = True
+            return True
+        return False
+
+    def abandon_probe(self):
+        """
+        The probe ended without an answer, e.g. it was cancelled; let the next call probe
+        """
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probing:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+class RateLimiter:
+    """
+    Token bucket spacing calls to at most `rate` per second
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
 
 class CircleWrapper:
     """
     Wrapper for Circle API (Sandbox)
     Handles USDC transfers
+
+    Requests share one keep-alive HTTP/2 connection pool, are capped by a
+    concurrency limit, retried with jittered exponential backoff and guarded
+    by a circuit breaker. Transfers carry an idempotency key, so a retried
+    request can never create a second transfer.
     """
-    
-    def __init__(self):
-        self.base_url = settings.circle_base_url
-        self.api_key = settings.circle_api_key
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.settings = get_settings()
+        self.base_url = self.settings.circle_base_url
+        self.api_key = self.settings.circle_api_key
+        self.mock = self.settings.circle_mock
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-    
-    async def create_transfer(self, amount: float, recipient: str) -> Dict[str, any]:
+        self.max_retries = self.settings.circle_max_retries
+        self.breaker = CircuitBreaker(self.settings.circle_breaker_threshold, self.settings.circle_breaker_reset)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(self.settings.circle_max_concurrency)
+        self._status_limiter = RateLimiter(self.settings.circle_status_rate, burst=int(self.settings.circle_status_rate) or 1)
+
+        # Metrics
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=self.settings.circle_timeout,
+                http2=self._transport is None,
+                transport=self._transport,
+                limits=httpx.Limits(
+                    max_connections=self.settings.circle_max_connections,
+                    max_keepalive_connections=self.settings.circle_max_connections
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, path: str, json: Optional[dict] = None, params: Optional[dict] = None):
         """
-        Create a USDC transfer via Circle API
-        
-        For now, this is a mock implementation
-        In production, this would call the actual Circle API
+        Send a request with bounded concurrency, retries and the circuit breaker
         """
-        # Mock implementation for demo
-        await asyncio.sleep(2)  # Simulate API delay
-        
-        # Generate mock transaction hash
-        import hashlib
-        import time
-        hash_input = f"{amount}{recipient}{time.time()}"
-        tx_hash = "0x" + hashlib.sha256(hash_input.encode()).hexdigest()
-        
+        attempt = 0
+        while True:
+            probe = self.breaker.before_call()
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    self.in_flight += 1
+                    self.requests += 1
+                    try:
+                        response = await self.client.request(method, path, json=json, params=params)
+                        if response.status_code == 429 or response.status_code >= 500:
+                            retry_after = response.headers.get('Retry-After')
+                            raise CircleAPIError(
+                                f"Circle returned {response.status_code}",
+                                status_code=response.status_code,
+                                retryable=True
+                            )
+                        if response.status_code >= 400:
+                            # The request itself is wrong; Circle is healthy
+                            self.breaker.record_success()
+                            raise CircleAPIError(
+                                f"Circle rejected request: {response.text}",
+                                status_code=response.status_code
+                            )
+                        self.breaker.record_success()
+                        return response.json().get('data', {})
+                    except (httpx.TransportError, CircleAPIError) as e:
+                        if isinstance(e, CircleAPIError) and not e.retryable:
+                            raise
+                        self.breaker.record_failure()
+                        if attempt >= self.max_retries:
+                            raise CircleAPIError(f"Circle request failed after {attempt + 1} attempts: {e}", retryable=True)
+                    finally:
+                        self.in_flight -= 1
+            finally:
+                if probe and self.breaker.probing:
+                    # Cancelled, e.g. by a caller's timeout, or failed with an
+                    # unexpected error: no outcome was recorded, so let the next call probe
+                    self.breaker.abandon_probe()
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.settings.circle_backoff_max)
+            except ValueError:
+                pass
+        # Full jitter keeps retrying clients from synchronizing
+        return random.uniform(0, min(self.settings.circle_backoff_max, self.settings.circle_backoff_base * 2 ** attempt))
+
+    def _to_result(self, transfer: dict, amount: float, recipient: str) -> Dict[str, any]:
+        status = transfer.get('status')
         return {
-            "tx_hash": tx_hash,
-            "status": "pending_on_chain",
+            "tx_hash": transfer.get('transactionHash') or transfer.get('id'),
+            "transfer_id": transfer.get('id'),
+            "status": "confirmed" if status == 'complete' else "failed" if status == 'failed' else "pending_on_chain",
             "amount": amount,
             "recipient": recipient
         }
-    
-    async def get_transfer_status(self, tx_hash: str) -> Dict[str, any]:
+
+    async def create_transfer(self, amount: float, recipient: str, idempotency_key: Optional[str] = None) -> Dict[str, any]:
+        """
+        Create a USDC transfer via Circle API
+
+        Retries with the same idempotency key return the same transfer.
+        With CIRCLE_MOCK enabled no request is sent and a hash is simulated.
         """
-        Get status of a USDC transfer
+        idempotency_key = idempotency_key or str(uuid.uuid4())
+
+        if self.mock:
+            await asyncio.sleep(self.settings.circle_mock_latency)  # Simulate API delay
+            tx_hash = "0x" + hashlib.sha256(idempotency_key.encode()).hexdigest()
+            return {
+                "tx_hash": tx_hash,
+                "transfer_id": None,
+                "status": "pending_on_chain",
+                "amount": amount,
+                "recipient": recipient
+            }
+
+        with external_call('circle', 'create_transfer'):
+            transfer = await self._request('POST', '/v1/transfers', json={
+                "idempotencyKey": idempotency_key,
+                "source": {"type": "wallet", "id": self.settings.circle_wallet_id},
+                "destination": {"type": "blockchain", "address": recipient, "chain": self.settings.circle_chain},
+                "amount": {"amount": f"{amount:.2f}", "currency": "USD"}
+            })
+        return self._to_result(transfer, amount, recipient)
+
+    async def get_transfer_status(self, transfer_ref: str) -> Dict[str, any]:
         """
-        # Mock implementation
-        await asyncio.sleep(1)
-        
+        Get status of a USDC transfer by Circle transfer id (tx hash in mock mode)
+        """
+        if self.mock:
+            await asyncio.sleep(self.settings.circle_mock_latency / 2)
+            return {
+                "tx_hash": transfer_ref,
+                "status": "confirmed",
+                "confirmations": 12
+            }
+
+        with external_call('circle', 'get_transfer'):
+            transfer = await self._request('GET', f'/v1/transfers/{transfer_ref}')
+        result = self._to_result(transfer, 0, '')
         return {
-            "tx_hash": tx_hash,
-            "status": "confirmed",
-            "confirmations": 12
+            "tx_hash": result['tx_hash'],
+            "status": result['status'],
+            "confirmations": transfer.get('confirmations')
         }
-    
-    async def transfer_with_timeout(self, amount: float, recipient: str, timeout: int = 30) -> Dict[str, any]:
+
+    async def get_transfer_statuses(
+        self,
+        transfer_refs: List[str],
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None
+    ) -> Dict[str, Dict[str, any]]:
+        """
+        Statuses for many transfers, keyed by transfer ref
+
+        Transfers created within [`created_from`, `created_to`] are read from
+        the paged list endpoint (up to 50 per request); only refs not found
+        there fall back to rate-limited single lookups.
+        """
+        if self.mock:
+            # One simulated round-trip for the whole batch
+            await asyncio.sleep(self.settings.circle_mock_latency / 2)
+            return {ref: {"tx_hash": ref, "status": "confirmed", "confirmations": 12} for ref in transfer_refs}
+
+        wanted = set(transfer_refs)
+        statuses: Dict[str, Dict[str, any]] = {}
+
+        if created_from:
+            params = {"from": created_from, "pageSize": 50}
+            if created_to:
+                params["to"] = created_to
+            for _ in range(self.settings.circle_status_max_pages):
+                with external_call('circle', 'list_transfers'):
+                    page = await self._request('GET', '/v1/transfers', params=params)
+                transfers = page if isinstance(page, list) else []
+                for transfer in transfers:
+                    if transfer.get('id') in wanted:
+                        result = self._to_result(transfer, 0, '')
+                        statuses[transfer['id']] = {
+                            "tx_hash": result['tx_hash'],
+                            "status": result['status'],
+                            "confirmations": transfer.get('confirmations')
+                        }
+                if len(transfers) < params["pageSize"] or wanted <= statuses.keys():
+                    break
+                params["pageAfter"] = transfers[-1]['id']
+
+        async def lookup(ref: str):
+            await self._status_limiter.acquire()
+            try:
+                statuses[ref] = await self.get_transfer_status(ref)
+            except CircleAPIError as e:
+                print(f"Circle status lookup failed for {ref}: {e}")
+
+        await asyncio.gather(*(lookup(ref) for ref in wanted - statuses.keys()))
+        return statuses
+
+    async def transfer_with_timeout(self, amount: float, recipient: str, timeout: int = 30, idempotency_key: Optional[str] = None) -> Dict[str, any]:
         """
         Execute transfer with timeout handling
         """
+        idempotency_key = idempotency_key or str(uuid.uuid4())
         try:
             result = await asyncio.wait_for(
-                self.create_transfer(amount, recipient),
+                self.create_transfer(amount, recipient, idempotency_key),
                 timeout=timeout
             )
             return result
         except asyncio.TimeoutError:
             # Mark as pending_on_chain - money is in flight
-            import hashlib
-            import time
-            hash_input = f"{amount}{recipient}{time.time()}"
-            tx_hash = "0x" + hashlib.sha256(hash_input.encode()).hexdigest()
-            
+            tx_hash = "0x" + hashlib.sha256(idempotency_key.encode()).hexdigest()
+
             return {
                 "tx_hash": tx_hash,
+                "transfer_id": None,
                 "status": "pending_on_chain",
                 "amount": amount,
                 "recipient": recipient,
                 "timeout": True
             }
 
-circle_wrapper = CircleWrapper()
+    def stats(self) -> Dict[str, any]:
+        return {
+            "mock": self.mock,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "retries": self.retries,
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened
+        }
+
+@lru_cache
+def get_circle_wrapper() -> CircleWrapper:
+    return CircleWrapper()
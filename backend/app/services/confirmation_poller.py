@@ -0,0 +1,195 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional
+from app.config import get_settings
+from app.database import get_repository
+from app.services.circle_wrapper import get_circle_wrapper
+from app.services.event_bus import get_event_bus
+from app.services.policy_cache import get_policy_cache
+
+
+def _shift(timestamp: str, seconds: float) -> str:
+    # Circle stamps a transfer before we record it, up to a full transfer timeout earlier
+    return (datetime.fromisoformat(timestamp.replace('Z', '+00:00')) + timedelta(seconds=seconds)).isoformat()
+
+
+def _owner(row: dict) -> Optional[str]:
+    # Tenant of the transaction, embedded from its activity
+    return (row.get('activity') or {}).get('user_id')
+
+
+class ConfirmationPoller:
+    """
+    Background reconciler for transfers left in `pending_on_chain`
+
+    Each tick leases pages of the transactions due for a check, so pollers
+    on several workers never ask Circle about the same rows, asks Circle
+    for a whole page of statuses at once and writes the page back with a
+    single RPC. Transfers that are still pending are checked again with
+    exponential backoff, so long-running transfers cost fewer requests.
+    After `max_attempts` checks, or at once when Circle cannot know the
+    transfer (a timed-out create left no transfer id), it is moved to
+    `needs_review` with its spend still reserved.
+    """
+
+    def __init__(self, interval: float, page_size: int, backoff_base: float, backoff_max: float,
+                 max_attempts: int, lease: float):
+        self.interval = interval
+        self.page_size = page_size
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.ticks = 0
+        self.checked = 0
+        self.confirmed = 0
+        self.failed = 0
+        self.needs_review = 0
+        self.last_tick_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    async def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.tick()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Confirmation poller error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def tick(self) -> int:
+        """
+        Check every due transaction once; returns how many were checked
+        """
+        repository = get_repository()
+        started = time.monotonic()
+        checked = 0
+
+        while True:
+            # Leased rows are no longer due, so each call returns the next page
+            rows = await repository.claim_pending_transactions(limit=self.page_size, lease_seconds=self.lease)
+            if not rows:
+                break
+
+            updates = await self._check_page(rows)
+            await repository.apply_transaction_updates(updates)
+            self._publish(rows, updates)
+            checked += len(rows)
+
+            if len(rows) < self.page_size:
+                break
+
+        self.ticks += 1
+        self.checked += checked
+        self.last_tick_seconds = round(time.monotonic() - started, 3)
+        return checked
+
+    async def _check_page(self, rows: List[dict]) -> List[dict]:
+        circle = get_circle_wrapper()
+        # Mock transfers have no Circle id; their hash is the reference. A
+        # live transfer whose create timed out has neither: Circle cannot be asked.
+        refs = {
+            row['id']: row.get('transfer_id') or row['tx_hash']
+            for row in rows
+            if row.get('transfer_id') or circle.mock
+        }
+        statuses = {}
+        if refs:
+            statuses = await circle.get_transfer_statuses(
+                list(refs.values()),
+                created_from=_shift(min(row['created_at'] for row in rows), -get_settings().transfer_timeout),
+                created_to=max(row['created_at'] for row in rows)
+            )
+
+        updates = []
+        refunded = set()
+        for row in rows:
+            status = statuses.get(refs.get(row['id']))
+            attempts = row.get('check_attempts') or 0
+            update: Dict[str, any] = {"id": row['id']}
+            if status and status['status'] in ('confirmed', 'failed'):
+                update.update({
+                    "status": status['status'],
+                    "confirmations": status.get('confirmations'),
+                    "tx_hash": status.get('tx_hash') if row.get('transfer_id') else None
+                })
+                if status['status'] == 'confirmed':
+                    self.confirmed += 1
+                else:
+                    self.failed += 1
+                    refunded.add(_owner(row))
+            elif row['id'] not in refs or attempts + 1 >= self.max_attempts:
+                # Left for someone to check by hand; the spend stays reserved
+                reason = "no Circle transfer id" if row['id'] not in refs else f"still pending after {attempts + 1} checks"
+                print(f"Transaction {row['id']} needs review: {reason}")
+                update["status"] = 'needs_review'
+                self.needs_review += 1
+            else:
+                # Still pending, or Circle did not answer for it this time
+                if status:
+                    update["confirmations"] = status.get('confirmations')
+                update["next_check_in_seconds"] = self._backoff(attempts)
+            updates.append(update)
+
+        for user_id in refunded:
+            get_policy_cache().invalidate(user_id)
+        return updates
+
+    def _publish(self, rows: List[dict], updates: List[dict]):
+        for row, update in zip(rows, updates):
+            if not update.get('status'):
+                continue
+            user_id = _owner(row)
+            get_event_bus().transaction_updated(
+                row['id'],
+                row['activity_id'],
+                update['status'],
+                user_id,
+                confirmations=update.get('confirmations')
+            )
+            if row['activity_id']:
+                get_event_bus().activity_updated(row['activity_id'], 'executed' if update['status'] == 'confirmed' else update['status'], user_id)
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.backoff_max, self.backoff_base * 2 ** attempts)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "ticks": self.ticks,
+            "checked": self.checked,
+            "confirmed": self.confirmed,
+            "failed": self.failed,
+            "needs_review": self.needs_review,
+            "last_tick_seconds": self.last_tick_seconds,
+            "last_error": self.last_error
+        }
+
+
+@lru_cache
+def get_confirmation_poller() -> ConfirmationPoller:
+    settings = get_settings()
+    return ConfirmationPoller(
+        interval=settings.confirmation_poll_interval,
+        page_size=settings.confirmation_page_size,
+        backoff_base=settings.confirmation_backoff_base,
+        backoff_max=settings.confirmation_backoff_max,
+        max_attempts=settings.confirmation_max_attempts,
+        lease=settings.confirmation_lease
+    )
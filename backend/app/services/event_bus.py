@@ -0,0 +1,159 @@
+import asyncio
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set
+from app.config import get_settings
+
+# Activity columns sent when a new activity is announced
+ACTIVITY_DELTA_FIELDS = ('id', 'user_id', 'user_query', 'status', 'policy_version', 'created_at')
+
+
+class EventBus:
+    """
+    In-process feed of activity, transaction and policy changes
+
+    Routers and background workers publish small deltas tagged with the
+    tenant they belong to; subscribers get a live stream of their tenant's
+    events and can resume after a reconnect from the last event id they
+    saw, as long as it is still in the replay buffer. Event ids embed a
+    per-process epoch, so a client resuming against a restarted (or a
+    different) worker is told to refetch instead of silently missing events.
+    """
+
+    def __init__(self, buffer_size: int, subscriber_queue_size: int):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.subscriber_queue_size = subscriber_queue_size
+        self._seq = 0
+        self._buffer: Deque[dict] = deque(maxlen=buffer_size)
+        # Subscriber queues per tenant, so publishing only touches that tenant's clients
+        self._subscribers: Dict[Optional[str], Set[asyncio.Queue]] = defaultdict(set)
+
+        # Metrics
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def publish(self, event_type: str, data: dict, user_id: Optional[str] = None) -> dict:
+        self._seq += 1
+        event = {
+            "id": f"{self.epoch}-{self._seq}",
+            "seq": self._seq,
+            "type": event_type,
+            "user_id": user_id,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "data": data
+        }
+        self._buffer.append(event)
+        self.published += 1
+
+        subscribers = self._subscribers.get(user_id, ())
+        for queue in list(subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client is cut off and resumes from its last id
+                subscribers.discard(queue)
+                self.dropped_subscribers += 1
+        return event
+
+    def activity_created(self, activity: dict, intent: Optional[dict] = None):
+        intent = intent or activity.get('structured_intent') or {}
+        self.publish('activity.created', {
+            **{field: activity.get(field) for field in ACTIVITY_DELTA_FIELDS},
+            "amount": intent.get('amount'),
+            "currency": intent.get('currency'),
+            "recipient_name": intent.get('recipientName')
+        }, activity.get('user_id'))
+
+    def activity_updated(self, activity_id: str, status: str, user_id: Optional[str], **changes):
+        self.publish('activity.updated', {"id": activity_id, "status": status, **changes}, user_id)
+
+    def transaction_created(self, transaction: dict, user_id: Optional[str]):
+        self.publish('transaction.created', {
+            field: transaction.get(field)
+            for field in ('id', 'activity_id', 'tx_hash', 'explorer_url', 'amount', 'currency', 'status', 'confirmations')
+        }, user_id)
+
+    def transaction_updated(self, transaction_id: str, activity_id: Optional[str], status: str, user_id: Optional[str], **changes):
+        self.publish('transaction.updated', {"id": transaction_id, "activity_id": activity_id, "status": status, **changes}, user_id)
+
+    def _replay(self, last_event_id: Optional[str]) -> Optional[List[dict]]:
+        """
+        Buffered events after `last_event_id`, or None if they cannot be replayed
+        """
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq >= self._seq:
+            return []
+        if not self._buffer or self._buffer[0]['seq'] > seq + 1:
+            return None
+        return [event for event in self._buffer if event['seq'] > seq]
+
+    async def subscribe(
+        self,
+        last_event_id: Optional[str] = None,
+        heartbeat: Optional[float] = None,
+        user_id: Optional[str] = None
+    ) -> AsyncIterator[Optional[dict]]:
+        """
+        Yield the tenant's missed events since `last_event_id`, then live ones
+
+        Yields a `reset` event first when the gap cannot be replayed; the
+        client should then refetch /api/activities and continue from there.
+        With `heartbeat` set, yields None after that many idle seconds.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        # Register before reading the buffer so nothing published in between is lost
+        subscribers = self._subscribers[user_id]
+        subscribers.add(queue)
+        try:
+            replay = self._replay(last_event_id)
+            last_seq = 0
+            if replay is None:
+                yield {"id": f"{self.epoch}-{self._seq}", "seq": self._seq, "type": "reset", "data": {}}
+                last_seq = self._seq
+            else:
+                for event in replay:
+                    last_seq = event['seq']
+                    if event['user_id'] == user_id:
+                        yield event
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event['seq'] > last_seq:
+                    last_seq = event['seq']
+                    yield event
+                if queue not in subscribers and queue.empty():
+                    return
+        finally:
+            subscribers.discard(queue)
+            if not subscribers and self._subscribers.get(user_id) is subscribers:
+                del self._subscribers[user_id]
+
+    def stats(self) -> dict:
+        return {
+            "epoch": self.epoch,
+            "last_seq": self._seq,
+            "buffered": len(self._buffer),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers
+        }
+
+
+@lru_cache
+def get_event_bus() -> EventBus:
+    settings = get_settings()
+    return EventBus(
+        buffer_size=settings.event_buffer_size,
+        subscriber_queue_size=settings.event_subscriber_queue_size
+    )
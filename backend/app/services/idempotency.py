@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.config import get_settings
+from app.services.intent_cache import MemoryBackend, RedisBackend
+
+IN_PROGRESS = "in_progress"
+
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    body: object
+    # Conflicts are answers about the key, not replays of a response
+    replay: bool = True
+
+    def to_response(self, replayed: bool) -> JSONResponse:
+        headers = {"Idempotency-Replayed": "true"} if replayed and self.replay else None
+        return JSONResponse(status_code=self.status_code, content=self.body, headers=headers)
+
+
+def fingerprint(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def _capture(handler: Callable[[], Awaitable[object]]) -> StoredResponse:
+    """
+    Run a route body and turn whatever it returns or raises into a response
+    """
+    try:
+        result = await handler()
+    except HTTPException as e:
+        return StoredResponse(e.status_code, jsonable_encoder({"detail": e.detail}))
+    if isinstance(result, JSONResponse):
+        return StoredResponse(result.status_code, json.loads(result.body))
+    return StoredResponse(200, jsonable_encoder(result))
+
+
+class IdempotencyStore:
+    """
+    Replays responses for repeated Idempotency-Key requests
+
+    The first request with a key runs; its response is kept for the TTL and
+    returned for every repeat with the same payload. Concurrent identical
+    requests, with or without a key, share one in-progress execution
+    instead of each running the pipeline. Across workers the key is claimed
+    with an atomic add, and the loser answers 409 until the winner has
+    stored its response. Server errors are shared with concurrent callers
+    but not stored, so the client can retry them.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+        # Metrics
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.conflicts = 0
+        self.errors = 0
+
+    async def run(
+        self,
+        scope: str,
+        key: Optional[str],
+        payload: dict,
+        handler: Callable[[], Awaitable[object]]
+    ) -> JSONResponse:
+        request_hash = fingerprint(payload)
+        # Without a key only in-flight duplicates are coalesced; nothing is stored
+        flight_key = f"{scope}:key:{key}" if key else f"{scope}:auto:{request_hash}"
+
+        in_flight = self._in_flight.get(flight_key)
+        if in_flight is not None:
+            if in_flight[0] != request_hash:
+                return self._conflict().to_response(replayed=False)
+            self.coalesced += 1
+            return (await asyncio.shield(in_flight[1])).to_response(replayed=True)
+
+        # Registered before the first await so same-key requests on this worker coalesce
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[flight_key] = (request_hash, future)
+        claimed = False
+        try:
+            if key:
+                stored = await self._get(flight_key)
+                if stored is None:
+                    # Atomic, so only one worker runs the request
+                    claimed = await self._add(flight_key, {"fingerprint": request_hash, "state": IN_PROGRESS})
+                    if not claimed:
+                        stored = await self._get(flight_key)
+                if not claimed:
+                    response = self._stored(stored, request_hash)
+                    future.set_result(response)
+                    return response.to_response(replayed=True)
+
+            self.executed += 1
+            response = await _capture(handler)
+            if key:
+                if response.status_code < 500:
+                    await self._set(flight_key, {
+                        "fingerprint": request_hash,
+                        "status_code": response.status_code,
+                        "body": response.body
+                    })
+                else:
+                    await self._delete(flight_key)
+            future.set_result(response)
+            return response.to_response(replayed=False)
+        except BaseException as e:
+            if claimed:
+                await self._delete(flight_key)
+            if not future.done():
+                future.set_exception(e)
+                # Retrieved here so an unshared failure is not reported as never retrieved
+                future.exception()
+            raise
+        finally:
+            self._in_flight.pop(flight_key, None)
+
+    def _stored(self, stored: Optional[dict], request_hash: str) -> StoredResponse:
+        """
+        Answer for a key another request holds: its response, or why there is none
+        """
+        if stored is not None and stored.get('fingerprint') != request_hash:
+            return self._conflict()
+        if stored is None or stored.get('state') == IN_PROGRESS:
+            # Running on another worker (or finished with a server error just now)
+            return StoredResponse(409, {"detail": "A request with this Idempotency-Key is still in progress"}, replay=False)
+        self.replayed += 1
+        return StoredResponse(stored['status_code'], stored['body'])
+
+    def _conflict(self) -> StoredResponse:
+        self.conflicts += 1
+        return StoredResponse(422, {"detail": "Idempotency-Key was already used with a different request"}, replay=False)
+
+    async def _get(self, key: str) -> Optional[dict]:
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            # A broken store degrades to running the request
+            self.errors += 1
+            print(f"Idempotency store read error: {e}")
+            return None
+
+    async def _add(self, key: str, value: dict) -> bool:
+        try:
+            return await self.backend.add(key, value)
+        except Exception as e:
+            # As with reads, a broken store degrades to running the request
+            self.errors += 1
+            print(f"Idempotency store write error: {e}")
+            return True
+
+    async def _set(self, key: str, value: dict):
+        try:
+            await self.backend.set(key, value)
+        except Exception as e:
+            self.errors += 1
+            print(f"Idempotency store write error: {e}")
+
+    async def _delete(self, key: str):
+        try:
+            await self.backend.delete(key)
+        except Exception as e:
+            self.errors += 1
+            print(f"Idempotency store delete error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "in_flight": len(self._in_flight),
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "conflicts": self.conflicts,
+            "errors": self.errors,
+        }
+
+
+def create_backend():
+    settings = get_settings()
+    backend = settings.idempotency_backend.lower()
+    if backend == 'memory':
+        return MemoryBackend(settings.idempotency_ttl, settings.idempotency_max_entries)
+    if backend == 'redis':
+        return RedisBackend(settings.idempotency_redis_url or settings.intent_cache_redis_url, settings.idempotency_ttl, prefix="aurralis:idempotency:")
+    raise ValueError(f"Unknown idempotency backend: {settings.idempotency_backend}")
+
+
+@lru_cache
+def get_idempotency_store() -> IdempotencyStore:
+    return IdempotencyStore(create_backend())
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+from app.config import get_settings
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s.!?]+$')
+_THOUSANDS_SEPARATOR = re.compile(r'(?<=\d),(?=\d{3}\b)')
+_ZERO_CENTS = re.compile(r'(?<=\d)\.00\b')
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a query for cache lookups
+
+    "Send $1,000.00 to Stripe!" and "send $1000 to  stripe" share an entry.
+    """
+    normalized = _WHITESPACE.sub(' ', query.strip().lower())
+    normalized = _THOUSANDS_SEPARATOR.sub('', normalized)
+    normalized = _ZERO_CENTS.sub('', normalized)
+    return _TRAILING_PUNCTUATION.sub('', normalized)
+
+
+def cache_key(query: str, policy: dict) -> str:
+    """
+    Key on the normalized query and the policy fields that shape the parse
+
+    The spend windows are left out: they change with every transfer and
+    would expire every entry, while the parse does not depend on them.
+    Vendor aliases decide which recipient a name resolves to, so they are in.
+    """
+    aliases = policy.get('vendor_aliases') or {}
+    material = json.dumps([
+        normalize_query(query),
+        policy.get('max_tx_amount'),
+        policy.get('monthly_budget'),
+        sorted(policy.get('allow_list') or []),
+        sorted((vendor, sorted(names or [])) for vendor, names in aliases.items()),
+    ], default=str)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class MemoryBackend:
+    """
+    Per-process LRU with TTL expiry
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: dict):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def add(self, key: str, value: dict) -> bool:
+        """
+        Set only if the key is absent or expired; True when this call set it
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            return False
+        await self.set(key, value)
+        return True
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def clear(self):
+        self._entries.clear()
+
+
+class SQLiteBackend:
+    """
+    SQLite file shared by every worker on the host, LRU by last access
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS intent_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_intent_cache_accessed_at ON intent_cache(accessed_at)")
+        self._lock = asyncio.Lock()
+
+    async def get(self, key: str) -> Optional[dict]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: dict):
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, value)
+
+    async def add(self, key: str, value: dict) -> bool:
+        async with self._lock:
+            return await asyncio.to_thread(self._add, key, value)
+
+    async def delete(self, key: str):
+        async with self._lock:
+            await asyncio.to_thread(self._conn.execute, "DELETE FROM intent_cache WHERE key = ?", (key,))
+
+    async def clear(self):
+        async with self._lock:
+            await asyncio.to_thread(self._conn.execute, "DELETE FROM intent_cache")
+
+    def _get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT value FROM intent_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute("UPDATE intent_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def _add(self, key: str, value: dict) -> bool:
+        now = time.time()
+        # INSERT OR IGNORE is atomic across the processes sharing the file
+        self._conn.execute("DELETE FROM intent_cache WHERE key = ? AND expires_at <= ?", (key, now))
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO intent_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + self.ttl, now)
+        )
+        return cursor.rowcount == 1
+
+    def _set(self, key: str, value: dict):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO intent_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + self.ttl, now)
+        )
+        self._conn.execute("DELETE FROM intent_cache WHERE expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM intent_cache WHERE key IN ("
+            "SELECT key FROM intent_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+
+class RedisBackend:
+    """
+    Redis (or any RESP-compatible store) shared across hosts
+
+    Eviction is left to the server's maxmemory-policy (allkeys-lru).
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = "aurralis:intent:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("INTENT_CACHE_BACKEND=redis requires the 'redis' package")
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = await self._client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: dict):
+        await self._client.set(self.prefix + key, json.dumps(value), ex=max(int(self.ttl), 1))
+
+    async def add(self, key: str, value: dict) -> bool:
+        # SET NX: only one client across all hosts gets True
+        return bool(await self._client.set(self.prefix + key, json.dumps(value), ex=max(int(self.ttl), 1), nx=True))
+
+    async def delete(self, key: str):
+        await self._client.delete(self.prefix + key)
+
+    async def clear(self):
+        async for key in self._client.scan_iter(match=self.prefix + '*'):
+            await self._client.delete(key)
+
+
+class IntentCache:
+    """
+    Cache of parsed intents in front of Gemini
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, query: str, policy: dict) -> Optional[dict]:
+        try:
+            value = await self.backend.get(cache_key(query, policy))
+        except Exception as e:
+            # A broken cache must never fail the request
+            self.errors += 1
+            print(f"Intent cache read error: {e}")
+            return None
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return dict(value)
+
+    async def set(self, query: str, policy: dict, intent: dict):
+        try:
+            await self.backend.set(cache_key(query, policy), dict(intent))
+        except Exception as e:
+            self.errors += 1
+            print(f"Intent cache write error: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def create_backend():
+    settings = get_settings()
+    backend = settings.intent_cache_backend.lower()
+    if backend == 'memory':
+        return MemoryBackend(settings.intent_cache_ttl, settings.intent_cache_max_entries)
+    if backend == 'sqlite':
+        return SQLiteBackend(settings.intent_cache_sqlite_path, settings.intent_cache_ttl, settings.intent_cache_max_entries)
+    if backend == 'redis':
+        return RedisBackend(settings.intent_cache_redis_url, settings.intent_cache_ttl)
+    raise ValueError(f"Unknown intent cache backend: {settings.intent_cache_backend}")
+
+
+@lru_cache
+def get_intent_cache() -> IntentCache:
+    return IntentCache(create_backend())
@@ -1,99 +1,227 @@
-import google.generativeai as genai
-from app.config import settings
+from app.config import get_settings
+from app.services.llm_client import get_llm_client, UsageTracker
+from app.services.intent_cache import get_intent_cache
+from app.services.prompt_builder import PromptBuilder, SYSTEM_INSTRUCTION
+from app.services.telemetry import LLM_TOKENS, external_call
+from app.services import rule_parser
+from functools import lru_cache
+from typing import Any, AsyncIterator, Iterable, Optional, Tuple
 import re
 import json
+import time
 
-genai.configure(api_key=settings.gemini_api_key)
+REASONING_KEY = re.compile(r'"reasoning"\s*:\s*"')
+# A trailing backslash or unfinished \uXXXX escape cannot be decoded yet
+INCOMPLETE_ESCAPE = re.compile(r'\\(?:u[0-9a-fA-F]{0,3})?$')
+
+def _fill_recipient(intent_data: dict) -> dict:
+    # Generate mock address if needed
+    if not intent_data.get('recipient') or intent_data['recipient'] == '':
+        intent_data['recipient'] = rule_parser.mock_address(
+            intent_data.get('recipientName', 'unknown'),
+            intent_data.get('amount', 0)
+        )
+    return intent_data
+
+def _fields(intent_data: dict) -> dict:
+    return {key: value for key, value in intent_data.items() if key != 'reasoning'}
+
+async def _replay(intent_data: dict) -> AsyncIterator[Tuple[str, Any]]:
+    # Answers that did not come from a live stream are sent in one go
+    yield "fields", _fields(intent_data)
+    yield "reasoning", intent_data.get('reasoning', '')
+    yield "intent", intent_data
+
+class PartialIntent:
+    """
+    Incremental reader for the JSON object Gemini streams back
+
+    The prompt asks for `reasoning` last, so everything before its key is
+    the structured fields; the reasoning string is then decoded as it grows.
+    """
+    
+    def __init__(self):
+        self.text = ''
+        self.fields: Optional[dict] = None
+        self.reasoning_sent = ''
+        self._reasoning_start: Optional[int] = None
+    
+    def feed(self, chunk: str) -> Tuple[Optional[dict], str]:
+        """
+        Add a chunk; returns fields parsed just now (if any) and new reasoning text
+        """
+        self.text += chunk
+        new_fields = None
+        
+        if self._reasoning_start is None:
+            key = REASONING_KEY.search(self.text)
+            if not key:
+                return None, ''
+            head = self.text[:key.start()].rstrip().rstrip(',')
+            brace = head.find('{')
+            try:
+                self.fields = json.loads(head[brace:] + '}') if brace >= 0 else None
+            except ValueError:
+                self.fields = None
+            if self.fields is None:
+                # Not the layout we asked for; the full answer is parsed at the end
+                self._reasoning_start = -1
+                return None, ''
+            new_fields = self.fields
+            self._reasoning_start = key.end()
+        
+        if self._reasoning_start < 0:
+            return None, ''
+        
+        raw = self.text[self._reasoning_start:]
+        end = re.search(r'(?<!\\)(?:\\\\)*"', raw)
+        raw = raw[:end.end() - 1] if end else INCOMPLETE_ESCAPE.sub('', raw)
+        try:
+            reasoning = json.loads(f'"{raw}"')
+        except ValueError:
+            return new_fields, ''
+        
+        delta = reasoning[len(self.reasoning_sent):]
+        self.reasoning_sent = reasoning
+        return new_fields, delta
 
 class IntentProcessor:
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-pro')
+        # The Gemini SDK is slow to import, so it loads with the first processor
+        import google.generativeai as genai
+        
+        self.settings = get_settings()
+        genai.configure(api_key=self.settings.gemini_api_key)
+        # JSON mode returns bare JSON, so answers no longer need scraping
+        self.model = genai.GenerativeModel(
+            self.settings.gemini_model,
+            system_instruction=SYSTEM_INSTRUCTION,
+            generation_config=genai.GenerationConfig(response_mime_type="application/json")
+        )
+        self.prompt_builder = PromptBuilder(self.settings.prompt_max_vendors)
+        self.usage = UsageTracker(self.settings.llm_usage_window)
     
     async def process_query(self, query: str, policy: dict) -> dict:
         """
         Process user query using Gemini to extract structured intent
+        
+        Queries the rule parser handles confidently never reach Gemini.
         """
-        system_prompt = f"""You are a financial AI assistant analyzing transaction requests.
-
-Current Policy Limits:
-- Max Transaction: ${policy.get('max_tx_amount', 1000)}
-- Monthly Budget: ${policy.get('monthly_budget', 5000)}
-- Current Monthly Spent: ${policy.get('current_monthly_spent', 0)}
-- Approved Vendors: {', '.join(policy.get('allow_list', []))}
-
-User Query: "{query}"
-
-Extract the following information in JSON format:
-1. amount: The transaction amount (number, no currency symbol)
-2. currency: The currency (default: "USDC")
-3. recipient: Generate a mock blockchain address or use vendor name
-4. recipientName: The vendor/merchant name (e.g., "Stripe", "Circle")
-5. reasoning: A brief explanation (2-3 sentences) of why this transaction is or isn't safe based on policy limits
-
-If the query is not a transaction request, return null for amount.
-
-Examples:
-Query: "Send $50 to Stripe"
-Response: {{"amount": 50, "currency": "USDC", "recipient": "0x1234abcd", "recipientName": "Stripe", "reasoning": "This $50 payment to Stripe is well within your $1,000 transaction limit and Stripe is on your approved vendor list. The transaction is safe to proceed."}}
-
-Query: "Pay the dev $1500"
-Response: {{"amount": 1500, "currency": "USDC", "recipient": "0x5678ef90",  "recipientName": "dev", "reasoning": "This $1,500 payment exceeds your maximum transaction limit of $1,000. This violates your policy and should be flagged for review."}}
-
-Respond ONLY with valid JSON, no additional text.
-"""
+        parsed = rule_parser.parse(query, policy)
+        if parsed and parsed['confidence'] >= self.settings.rule_parser_min_confidence:
+            return parsed
+        
+        cached = await get_intent_cache().get(query, policy)
+        if cached is not None:
+            return cached
+        
+        system_prompt = self.prompt_builder.build(query, policy)
         
         try:
-            response = self.model.generate_content(system_prompt)
-            result = response.text.strip()
-            
-            # Extract JSON from response
-            json_match = re.search(r'\{.*\}', result, re.DOTALL)
-            if json_match:
-                intent_data = json.loads(json_match.group())
-                
-                # Generate mock address if needed
-                if not intent_data.get('recipient') or intent_data['recipient'] == '':
-                    import hashlib
-                    hash_input = f"{intent_data.get('recipientName', 'unknown')}{intent_data.get('amount', 0)}"
-                    address_hash = hashlib.md5(hash_input.encode()).hexdigest()[:8]
-                    intent_data['recipient'] = f"0x{address_hash}...{address_hash[-4:]}"
-                
-                return intent_data
-            else:
-                # Fallback parsing
-                return self._fallback_parse(query)
+            started = time.monotonic()
+            with external_call('gemini', 'generate'):
+                response = await get_llm_client().call(self.model.generate_content, system_prompt)
+            self._record_usage(started, response.usage_metadata)
+            intent_data = await self._finish(response.text, query, policy)
+            return intent_data if intent_data is not None else parsed
                 
         except Exception as e:
             print(f"Gemini API error: {e}")
-            return self._fallback_parse(query)
+            return parsed
     
-    def _fallback_parse(self, query: str) -> dict:
+    async def stream_query(self, query: str, policy: dict) -> AsyncIterator[Tuple[str, Any]]:
         """
-        Fallback parser if Gemini fails
+        Streaming variant of process_query
+        
+        Yields ("fields", dict) once the structured fields can be parsed,
+        ("reasoning", str) deltas of the reasoning text as Gemini generates
+        it, and finally ("intent", dict) with the same result process_query
+        would return.
         """
-        # Simple regex patterns
-        amount_pattern = r'\$?(\d+(?:\.\d{2})?)'
-        recipient_pattern = r'to\s+([a-zA-Z0-9]+)'
+        parsed = rule_parser.parse(query, policy)
+        if parsed and parsed['confidence'] >= self.settings.rule_parser_min_confidence:
+            async for event in _replay(parsed):
+                yield event
+            return
         
-        amount_match = re.search(amount_pattern, query)
-        recipient_match = re.search(recipient_pattern, query, re.IGNORECASE)
+        cached = await get_intent_cache().get(query, policy)
+        if cached is not None:
+            async for event in _replay(cached):
+                yield event
+            return
         
-        if amount_match and recipient_match:
-            amount = float(amount_match.group(1))
-            recipient_name = recipient_match.group(1)
-            
-            import hashlib
-            hash_input = f"{recipient_name}{amount}"
-            address_hash = hashlib.md5(hash_input.encode()).hexdigest()[:8]
+        system_prompt = self.prompt_builder.build(query, policy)
+        partial = PartialIntent()
+        streamed_fields = False
+        
+        try:
+            started = time.monotonic()
+            usage = None
+            with external_call('gemini', 'generate_stream'):
+                async for chunk, chunk_usage in get_llm_client().stream(self._generate_stream, system_prompt):
+                    usage = chunk_usage or usage
+                    fields, reasoning = partial.feed(chunk)
+                    if fields is not None:
+                        streamed_fields = True
+                        yield "fields", _fill_recipient(fields)
+                    if reasoning:
+                        yield "reasoning", reasoning
             
-            return {
-                "amount": amount,
-                "currency": "USDC",
-                "recipient": f"0x{address_hash}...{address_hash[-4:]}",
-                "recipientName": recipient_name,
-                "reasoning": f"Detected payment of ${amount} to {recipient_name}. Please review the transaction details and policy limits before approving."
-            }
-        
-        return None
+            self._record_usage(started, usage)
+            intent_data = await self._finish(partial.text, query, policy)
+        except Exception as e:
+            print(f"Gemini API error: {e}")
+            intent_data = None
+        
+        if intent_data is None:
+            intent_data = parsed
+            if not streamed_fields and intent_data:
+                async for event in _replay(intent_data):
+                    yield event
+                return
+        elif not streamed_fields:
+            # Gemini put the reasoning first or answered in one chunk
+            yield "fields", _fields(intent_data)
+            yield "reasoning", intent_data.get('reasoning', '')
+        else:
+            reasoning = intent_data.get('reasoning', '')
+            if reasoning.startswith(partial.reasoning_sent) and len(reasoning) > len(partial.reasoning_sent):
+                yield "reasoning", reasoning[len(partial.reasoning_sent):]
+        
+        yield "intent", intent_data
+    
+    def _generate_stream(self, prompt: str) -> Iterable[Tuple[str, Any]]:
+        # Runs on an LLM worker thread; iterating the response blocks on the network
+        for chunk in self.model.generate_content(prompt, stream=True):
+            yield (chunk.text if chunk.parts else ''), chunk.usage_metadata
+    
+    def _record_usage(self, started: float, usage_metadata):
+        prompt_tokens = getattr(usage_metadata, 'prompt_token_count', None)
+        completion_tokens = getattr(usage_metadata, 'candidates_token_count', None)
+        self.usage.record(time.monotonic() - started, prompt_tokens, completion_tokens)
+        LLM_TOKENS.labels('prompt').inc(prompt_tokens or 0)
+        LLM_TOKENS.labels('completion').inc(completion_tokens or 0)
+    
+    async def _finish(self, text: str, query: str, policy: dict) -> Optional[dict]:
+        """
+        Parse Gemini's answer, fill in the recipient and cache it
+        """
+        try:
+            intent_data = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(intent_data, dict):
+            return None
+        
+        _fill_recipient(intent_data)
+        
+        # Only Gemini answers are cached; fallback parses are retried next time
+        await get_intent_cache().set(query, policy, intent_data)
+        return intent_data
+
+    def stats(self) -> dict:
+        return self.usage.stats()
 
-intent_processor = IntentProcessor()
+@lru_cache
+def get_intent_processor() -> IntentProcessor:
+    return IntentProcessor()
@@ -0,0 +1,232 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, Optional
+from app.config import get_settings
+
+
+class LLMTimeoutError(Exception):
+    """
+    Raised when an LLM call exceeds its timeout
+    """
+
+
+class LLMClient:
+    """
+    Runs blocking LLM SDK calls off the event loop
+
+    Calls go through a bounded thread pool behind a concurrency cap, so a
+    slow Gemini round-trip only occupies a worker thread and never the loop
+    that serves every other request. A slot is held until its thread
+    returns, even after the caller timed out, so the cap bounds the calls
+    actually in flight to Gemini.
+    """
+
+    def __init__(self, max_workers: int, max_concurrency: int, timeout: float):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Metrics
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.calls = 0
+        self.total_latency = 0.0
+
+    async def call(self, fn: Callable[..., Any], *args, timeout: float | None = None, **kwargs) -> Any:
+        """
+        Run a blocking callable in the worker pool with a timeout
+
+        Waiting for a concurrency slot counts against the same timeout, so a
+        saturated pool fails fast instead of building an unbounded backlog.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        deadline = time.monotonic() + timeout
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMTimeoutError(f"No LLM worker available within {timeout}s")
+        finally:
+            self.queued -= 1
+
+        loop = asyncio.get_running_loop()
+        future = self._submit(loop, fn, *args, **kwargs)
+        started = time.monotonic()
+        try:
+            # A timeout only cancels the call if no thread has picked it up yet
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=max(deadline - time.monotonic(), 0))
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            # The worker thread keeps running until the SDK returns and
+            # keeps its slot until then; only the caller is released.
+            self.timeouts += 1
+            raise LLMTimeoutError(f"LLM call exceeded {timeout}s")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.calls += 1
+            self.total_latency += time.monotonic() - started
+
+    async def stream(self, fn: Callable[..., Iterable[Any]], *args, timeout: float | None = None, **kwargs) -> AsyncIterator[Any]:
+        """
+        Run a blocking callable that returns an iterator and yield its items
+
+        The iterator is consumed on a worker thread and each item is handed
+        to the event loop as soon as it arrives. The timeout bounds the whole
+        stream; if the consumer stops early or times out the thread stops
+        after the current item and holds its slot until then.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        deadline = time.monotonic() + timeout
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMTimeoutError(f"No LLM worker available within {timeout}s")
+        finally:
+            self.queued -= 1
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for item in fn(*args, **kwargs):
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+                loop.call_soon_threadsafe(queue.put_nowait, (done, None))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, (done, e))
+
+        self._submit(loop, produce)
+        started = time.monotonic()
+        try:
+            while True:
+                try:
+                    item, error = await asyncio.wait_for(queue.get(), timeout=max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise LLMTimeoutError(f"LLM stream exceeded {timeout}s")
+                if error is not None:
+                    self.failed += 1
+                    raise error
+                if item is done:
+                    self.completed += 1
+                    return
+                yield item
+        finally:
+            cancelled.set()
+            self.calls += 1
+            self.total_latency += time.monotonic() - started
+
+    def _submit(self, loop: asyncio.AbstractEventLoop, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Start `fn` on a worker thread under the slot the caller acquired
+
+        The slot is given back when the thread finishes, not when the caller
+        stops waiting for it.
+        """
+        self.in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+
+        def release(_):
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                # The loop is closed; nothing is left to wait for the slot
+                pass
+
+        future.add_done_callback(release)
+        return future
+
+    def _release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of pool utilisation and queue depth
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "avg_latency_ms": round(self.total_latency / self.calls * 1000, 2) if self.calls else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class UsageTracker:
+    """
+    Token counts and latency per model call
+
+    Totals cover the process lifetime; averages and percentiles cover the
+    most recent `window` calls, so a regression shows up quickly.
+    """
+
+    def __init__(self, window: int):
+        self._calls: Deque[tuple] = deque(maxlen=window)
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, latency: float, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        prompt_tokens = prompt_tokens or 0
+        completion_tokens = completion_tokens or 0
+        self._calls.append((latency, prompt_tokens, completion_tokens))
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        recent = list(self._calls)
+        latencies = sorted(call[0] for call in recent)
+
+        def percentile(p: float) -> float:
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2) if latencies else 0.0
+
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_prompt_tokens": round(sum(call[1] for call in recent) / len(recent), 1) if recent else 0.0,
+            "avg_completion_tokens": round(sum(call[2] for call in recent) / len(recent), 1) if recent else 0.0,
+            "p50_latency_ms": percentile(0.5),
+            "p95_latency_ms": percentile(0.95),
+        }
+
+
+@lru_cache
+def get_llm_client() -> LLMClient:
+    settings = get_settings()
+    return LLMClient(
+        max_workers=settings.gemini_max_workers,
+        max_concurrency=settings.gemini_max_concurrency,
+        timeout=settings.gemini_timeout
+    )
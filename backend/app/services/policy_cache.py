@@ -0,0 +1,150 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+from app.config import get_settings
+from app.database import get_repository
+
+
+class PolicyCache:
+    """
+    In-process cache of each tenant's active policy
+
+    Entries expire after a TTL and are dropped explicitly whenever a policy
+    is written; the least recently used tenants are evicted past
+    `max_tenants`. When an invalidation file is configured, writers touch it
+    and every process sharing the file refetches on its next read, which
+    stands in for Postgres LISTEN/NOTIFY across workers.
+    """
+
+    def __init__(self, ttl: float, max_tenants: int, invalidation_file: Optional[str] = None):
+        self.ttl = ttl
+        self.max_tenants = max_tenants
+        self.invalidation_file = Path(invalidation_file) if invalidation_file else None
+        # user_id -> (expires_at, policy); None is the default tenant
+        self._entries: OrderedDict = OrderedDict()
+        self._loading: Dict[Optional[str], asyncio.Future] = {}
+        self._seen_marker = self._read_marker()
+
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id: Optional[str] = None) -> Optional[dict]:
+        """
+        Return the tenant's active policy, loading it at most once per expiry
+        """
+        policy = self._lookup(user_id)
+        if policy is not None:
+            self.hits += 1
+            return policy
+
+        # Requests for a tenant that is already loading wait for that load
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            self.hits += 1
+            return await asyncio.shield(loading)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            policy = await get_repository().get_current_policy(user_id)
+            self._store(user_id, policy)
+            future.set_result(policy)
+            return policy
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieved here so a load nobody waited on is not reported
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(user_id, None)
+
+    def replace(self, policy: dict):
+        """
+        Write-through after a policy was changed by this process
+        """
+        self._store(policy.get('user_id'), policy)
+        self._notify_peers()
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """
+        Drop one tenant's cached policy here, and every tenant's in peer processes
+        """
+        self._entries.pop(user_id, None)
+        self._notify_peers()
+
+    def clear(self):
+        """
+        Drop every cached policy here and in peer processes
+        """
+        self._entries.clear()
+        self._notify_peers()
+
+    def _store(self, user_id: Optional[str], policy: Optional[dict]):
+        if not policy:
+            self._entries.pop(user_id, None)
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, policy)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_tenants:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, user_id: Optional[str]) -> Optional[dict]:
+        marker = self._read_marker()
+        if marker != self._seen_marker:
+            # A peer wrote a policy; the marker does not say whose
+            self._entries.clear()
+            self._seen_marker = marker
+            return None
+
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, policy = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return policy
+
+    def _read_marker(self) -> Optional[int]:
+        if not self.invalidation_file:
+            return None
+        try:
+            return self.invalidation_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _notify_peers(self):
+        if not self.invalidation_file:
+            return
+        # Bump explicitly so back-to-back writes within the filesystem's
+        # timestamp resolution are still seen as changes
+        previous = self._read_marker() or 0
+        self.invalidation_file.touch()
+        marker = max(time.time_ns(), previous + 1)
+        os.utime(self.invalidation_file, ns=(marker, marker))
+        self._seen_marker = self._read_marker()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "tenants": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+@lru_cache
+def get_policy_cache() -> PolicyCache:
+    settings = get_settings()
+    return PolicyCache(
+        ttl=settings.policy_cache_ttl,
+        max_tenants=settings.policy_cache_max_tenants,
+        invalidation_file=settings.policy_cache_invalidation_file
+    )
@@ -0,0 +1,581 @@
+"""
+Declarative policy rules compiled into evaluation plans
+
+A policy is a rule set: the limits and vendor lists in its columns plus
+the extra rules in its `rules` column, for example
+
+    [{"type": "time_window", "days": ["mon", "tue", "wed", "thu", "fri"],
+      "start": "09:00", "end": "18:00", "timezone": "Europe/London"},
+     {"type": "velocity", "max_transactions": 20},
+     {"type": "vendor_cap", "vendor": "Amazon", "max_amount": 250}]
+
+get_plan compiles it once per policy version into a PolicyPlan. The plan
+tests rules cheapest first and stops at the first violation when only the
+verdict is needed; check and violation messages are formatted only when
+they are read.
+"""
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from app.services.vendor_matcher import ALLOW, BLOCK, VendorMatcher, get_matcher
+
+MAX_CACHED_PLANS = 64
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# Policy fields a plan is compiled from
+RULE_FIELDS = (
+    'max_tx_amount', 'daily_budget', 'monthly_budget', 'required_approval_threshold',
+    'allow_list', 'block_list', 'vendor_aliases', 'rules'
+)
+
+
+class RuleError(ValueError):
+    """
+    A declarative rule that cannot be compiled
+    """
+
+
+@dataclass
+class SpendState:
+    """
+    Spend the budget and velocity rules measure against
+
+    Starts from the windows of a policy snapshot; batch scoring adds each
+    allowed intent so the ones after it see its spend.
+    """
+    monthly: float = 0.0
+    daily: float = 0.0
+    transactions: int = 0
+
+    @classmethod
+    def from_policy(cls, policy: Optional[dict]) -> 'SpendState':
+        policy = policy or {}
+        return cls(
+            float(policy.get('current_monthly_spent') or 0),
+            float(policy.get('current_daily_spent') or 0),
+            int(policy.get('current_daily_transactions') or 0)
+        )
+
+    def add(self, amount: float):
+        self.monthly += amount
+        self.daily += amount
+        self.transactions += 1
+
+    def copy(self) -> 'SpendState':
+        return SpendState(self.monthly, self.daily, self.transactions)
+
+    def window(self) -> dict:
+        """
+        The spend fields of a policy snapshot
+        """
+        return {
+            'current_monthly_spent': self.monthly,
+            'current_daily_spent': self.daily,
+            'current_daily_transactions': self.transactions
+        }
+
+
+class Facts:
+    """
+    What rules read from one intent
+
+    Vendor matches are looked up on first use and memoized in `memo`, which
+    batch scoring shares across the batch so each recipient is matched once.
+    """
+    __slots__ = ('amount', 'recipient', '_at', '_memo')
+
+    def __init__(self, intent: dict, at: Optional[datetime] = None, memo: Optional[dict] = None):
+        self.amount = intent.get('amount', 0)
+        self.recipient = intent.get('recipientName', '')
+        self._at = at
+        self._memo = {} if memo is None else memo
+
+    @property
+    def at(self) -> datetime:
+        if self._at is None:
+            self._at = datetime.now(timezone.utc)
+        return self._at
+
+    def match(self, matcher: VendorMatcher) -> dict:
+        key = (id(matcher), self.recipient)
+        found = self._memo.get(key)
+        if found is None:
+            found = self._memo[key] = matcher.match(self.recipient)
+        return found
+
+
+class Rule:
+    """
+    One check of a compiled plan
+
+    `cost` orders evaluation, cheapest first. A rule that is not
+    `blocking` is reported but never makes an intent invalid; a `stateful`
+    one reads the spend state, so batch scoring runs it in request order
+    after the others.
+    """
+    name = ''
+    cost = 0
+    blocking = True
+    stateful = False
+
+    def applies(self, facts: Facts, passed: bool) -> bool:
+        """
+        Whether the rule is listed in the checks for these facts
+        """
+        return True
+
+    def test(self, facts: Facts, spend: SpendState) -> bool:
+        raise NotImplementedError
+
+    def message(self, facts: Facts, spend: SpendState, passed: bool) -> str:
+        raise NotImplementedError
+
+    def violation(self, facts: Facts, spend: SpendState) -> str:
+        return f"{self.name} failed"
+
+
+class MaxAmountRule(Rule):
+    name = "Max Transaction Limit"
+
+    def __init__(self, limit: float):
+        self.limit = limit
+
+    def test(self, facts, spend):
+        return facts.amount <= self.limit
+
+    def message(self, facts, spend, passed):
+        return f"${facts.amount} {'≤' if passed else '>'} ${self.limit}"
+
+    def violation(self, facts, spend):
+        return f"Amount ${facts.amount} exceeds max transaction limit of ${self.limit}"
+
+
+class ApprovalThresholdRule(Rule):
+    name = "Approval Threshold"
+    blocking = False
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    def test(self, facts, spend):
+        return facts.amount < self.threshold
+
+    def message(self, facts, spend, passed):
+        if passed:
+            return f"${facts.amount} is under the ${self.threshold} approval threshold"
+        return f"${facts.amount} ≥ ${self.threshold}: needs manual approval"
+
+
+class MonthlyBudgetRule(Rule):
+    name = "Monthly Budget"
+    cost = 1
+    stateful = True
+
+    def __init__(self, budget: float):
+        self.budget = budget
+
+    def test(self, facts, spend):
+        return spend.monthly + facts.amount <= self.budget
+
+    def message(self, facts, spend, passed):
+        if passed:
+            return f"Remaining: ${self.budget - spend.monthly:.2f}"
+        return f"Would exceed by ${(spend.monthly + facts.amount - self.budget):.2f}"
+
+    def violation(self, facts, spend):
+        return f"Would exceed monthly limit. Remaining: ${self.budget - spend.monthly:.2f}"
+
+
+class DailyBudgetRule(Rule):
+    name = "Daily Budget"
+    cost = 1
+    stateful = True
+
+    def __init__(self, budget: float):
+        self.budget = budget
+
+    def test(self, facts, spend):
+        return spend.daily + facts.amount <= self.budget
+
+    def message(self, facts, spend, passed):
+        if passed:
+            return f"Remaining today: ${self.budget - spend.daily:.2f}"
+        return f"Would exceed by ${(spend.daily + facts.amount - self.budget):.2f}"
+
+    def violation(self, facts, spend):
+        return f"Would exceed daily limit. Remaining today: ${self.budget - spend.daily:.2f}"
+
+
+class VelocityRule(Rule):
+    name = "Daily Velocity"
+    cost = 1
+    stateful = True
+
+    def __init__(self, max_transactions: int):
+        self.max_transactions = max_transactions
+
+    def test(self, facts, spend):
+        return spend.transactions < self.max_transactions
+
+    def message(self, facts, spend, passed):
+        if passed:
+            return f"Transaction {spend.transactions + 1} of {self.max_transactions} allowed today"
+        return f"{spend.transactions} of {self.max_transactions} transactions already made today"
+
+    def violation(self, facts, spend):
+        return f"Would exceed {self.max_transactions} transactions per day"
+
+
+class TimeWindowRule(Rule):
+    name = "Time Window"
+    cost = 5
+
+    def __init__(self, days: Iterable[str], start: str, end: str, zone: str):
+        self.days = frozenset(WEEKDAYS.index(day) for day in days)
+        self.start = _minutes(start)
+        self.end = _minutes(end)
+        self.zone = ZoneInfo(zone)
+        self.label = f"{', '.join(day.title() for day in WEEKDAYS if WEEKDAYS.index(day) in self.days)} {start}-{end} {zone}"
+
+    def _local(self, facts: Facts) -> datetime:
+        return facts.at.astimezone(self.zone)
+
+    def test(self, facts, spend):
+        local = self._local(facts)
+        if local.weekday() not in self.days:
+            return False
+        clock = local.hour * 60 + local.minute
+        if self.start <= self.end:
+            return self.start <= clock < self.end
+        # Overnight windows such as 22:00-06:00
+        return clock >= self.start or clock < self.end
+
+    def message(self, facts, spend, passed):
+        return f"{self._local(facts):%a %H:%M} is {'inside' if passed else 'outside'} {self.label}"
+
+    def violation(self, facts, spend):
+        return f"Transactions are only allowed {self.label}"
+
+
+class AllowListRule(Rule):
+    name = "Approved Vendor"
+    cost = 10
+    blocking = False
+
+    def __init__(self, matcher: VendorMatcher):
+        self.matcher = matcher
+
+    def test(self, facts, spend):
+        return facts.match(self.matcher)[ALLOW] is not None
+
+    def message(self, facts, spend, passed):
+        return f"{facts.recipient} is {'on' if passed else 'not on'} approved list"
+
+
+class BlockListRule(Rule):
+    name = "Block List"
+    cost = 10
+
+    def __init__(self, matcher: VendorMatcher):
+        self.matcher = matcher
+
+    def applies(self, facts, passed):
+        # Only listed when the recipient is blocked
+        return not passed
+
+    def test(self, facts, spend):
+        return facts.match(self.matcher)[BLOCK] is None
+
+    def message(self, facts, spend, passed):
+        return f"{facts.recipient} is on the block list"
+
+    def violation(self, facts, spend):
+        return f"Recipient {facts.recipient} is on the block list"
+
+
+class VendorCapRule(Rule):
+    name = "Vendor Cap"
+    cost = 10
+
+    def __init__(self, caps: Dict[str, float], aliases: Dict[str, List[str]]):
+        self.caps = caps
+        self.matcher = VendorMatcher(list(caps), [], aliases)
+
+    def _cap(self, facts: Facts):
+        found = facts.match(self.matcher)[ALLOW]
+        return (found.vendor, self.caps[found.vendor]) if found else (None, None)
+
+    def applies(self, facts, passed):
+        return self._cap(facts)[0] is not None
+
+    def test(self, facts, spend):
+        vendor, cap = self._cap(facts)
+        return vendor is None or facts.amount <= cap
+
+    def message(self, facts, spend, passed):
+        vendor, cap = self._cap(facts)
+        return f"${facts.amount} {'≤' if passed else '>'} ${cap} cap for {vendor}"
+
+    def violation(self, facts, spend):
+        vendor, cap = self._cap(facts)
+        return f"Amount ${facts.amount} exceeds the ${cap} cap for {vendor}"
+
+
+def _number(rule: dict, field: str) -> float:
+    value = rule.get(field)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise RuleError(f"{rule.get('type')} rule needs a non-negative number in '{field}'")
+    return value
+
+
+def _minutes(clock: str) -> int:
+    hours, minutes = clock.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def _clock(rule: dict, field: str) -> str:
+    value = rule.get(field)
+    try:
+        return datetime.strptime(value, '%H:%M').strftime('%H:%M')
+    except (TypeError, ValueError):
+        raise RuleError(f"time_window rule needs '{field}' as HH:MM")
+
+
+def compile_rules(rules: Optional[List[dict]], aliases: Optional[Dict[str, List[str]]] = None) -> List[Rule]:
+    """
+    Compile the declarative entries of a policy's `rules` column
+
+    Raises RuleError for unknown types or malformed fields, so it doubles
+    as the validation of rule updates.
+    """
+    compiled: List[Rule] = []
+    caps: Dict[str, float] = {}
+    for rule in rules or []:
+        if not isinstance(rule, dict):
+            raise RuleError("Each rule must be an object with a 'type'")
+        kind = rule.get('type')
+        if kind == 'vendor_cap':
+            vendor = rule.get('vendor')
+            if not isinstance(vendor, str) or not vendor.strip():
+                raise RuleError("vendor_cap rule needs a 'vendor'")
+            caps[vendor] = min(_number(rule, 'max_amount'), caps.get(vendor, float('inf')))
+        elif kind == 'velocity':
+            compiled.append(VelocityRule(int(_number(rule, 'max_transactions'))))
+        elif kind == 'time_window':
+            days = rule.get('days', list(WEEKDAYS))
+            if not isinstance(days, list) or not days or any(day not in WEEKDAYS for day in days):
+                raise RuleError(f"time_window rule needs 'days' from {', '.join(WEEKDAYS)}")
+            start, end = _clock(rule, 'start'), _clock(rule, 'end')
+            try:
+                compiled.append(TimeWindowRule(days, start, end, rule.get('timezone', 'UTC')))
+            except (ZoneInfoNotFoundError, TypeError, ValueError):
+                raise RuleError(f"Unknown timezone: {rule.get('timezone')}")
+        else:
+            raise RuleError(f"Unknown rule type: {kind}")
+    if caps:
+        compiled.append(VendorCapRule(caps, aliases or {}))
+    return compiled
+
+
+class Evaluation:
+    """
+    The outcome of a plan for one intent
+
+    Rule results are computed on demand, blocking rules first and cheapest
+    first, so reading only `is_valid` stops at the first violation.
+    Messages are formatted when `policy_checks` or `violations` are read.
+    """
+    __slots__ = ('plan', 'facts', 'spend', '_outcomes')
+
+    def __init__(self, plan: 'PolicyPlan', facts: Facts, spend: SpendState):
+        self.plan = plan
+        self.facts = facts
+        self.spend = spend
+        # Indexed by the rule's position in plan.rules
+        self._outcomes: List[Optional[bool]] = [None] * len(plan.rules)
+
+    def passed(self, rule: Rule) -> bool:
+        index = self.plan.index[rule]
+        outcome = self._outcomes[index]
+        if outcome is None:
+            outcome = self._outcomes[index] = rule.test(self.facts, self.spend)
+        return outcome
+
+    def first_failure(self) -> Optional[Rule]:
+        for rule in self.plan.blocking:
+            if not self.passed(rule):
+                return rule
+        return None
+
+    @property
+    def is_valid(self) -> bool:
+        return self.first_failure() is None
+
+    @property
+    def failed_rules(self) -> List[str]:
+        """
+        Names of the blocking rules that fail, in report order
+        """
+        return [rule.name for rule in self.plan.rules if rule.blocking and not self.passed(rule)]
+
+    @property
+    def violations(self) -> List[str]:
+        return [
+            rule.violation(self.facts, self.spend)
+            for rule in self.plan.rules if rule.blocking and not self.passed(rule)
+        ]
+
+    @property
+    def policy_checks(self) -> List[dict]:
+        return self.as_dict()['policy_checks']
+
+    def as_dict(self) -> dict:
+        """
+        The full result, in the shape PolicyValidator.validate returns
+        """
+        facts, spend = self.facts, self.spend
+        violations = []
+        checks = []
+        for rule in self.plan.rules:
+            passed = self.passed(rule)
+            if rule.blocking and not passed:
+                violations.append(rule.violation(facts, spend))
+            if rule.applies(facts, passed):
+                checks.append({
+                    "rule": rule.name,
+                    "passed": passed,
+                    "message": rule.message(facts, spend, passed)
+                })
+        return {
+            "is_valid": len(violations) == 0,
+            "violations": violations,
+            "policy_checks": checks
+        }
+
+
+class PolicyPlan:
+    """
+    A policy's rules in report order, with their evaluation order precomputed
+    """
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self.index = {rule: position for position, rule in enumerate(rules)}
+        # Stable sort: equal costs keep report order
+        self.blocking = sorted((rule for rule in rules if rule.blocking), key=lambda rule: rule.cost)
+        self._stateless = [rule for rule in self.blocking if not rule.stateful]
+        self._stateful = [rule for rule in self.blocking if rule.stateful]
+
+    def evaluate(self, intent: dict, spend: SpendState, at: Optional[datetime] = None) -> Evaluation:
+        return Evaluation(self, Facts(intent, at), spend.copy())
+
+    def check(self, intent: dict, spend: SpendState, at: Optional[datetime] = None) -> Optional[str]:
+        """
+        First violation for an intent, or None when it is allowed
+        """
+        facts = Facts(intent, at)
+        for rule in self.blocking:
+            if not rule.test(facts, spend):
+                return rule.violation(facts, spend)
+        return None
+
+    def check_stateless(self, intent: dict, at: Optional[datetime] = None) -> Optional[str]:
+        """
+        First violation of a rule that does not depend on spend, or None
+        """
+        facts, spend = Facts(intent, at), SpendState()
+        for rule in self._stateless:
+            if not rule.test(facts, spend):
+                return rule.violation(facts, spend)
+        return None
+
+    def evaluate_batch(self, intents: List[dict], spend: Optional[SpendState] = None, at: Optional[datetime] = None,
+                       cumulative: bool = True, times: Optional[List[Optional[datetime]]] = None,
+                       spends: Optional[List[SpendState]] = None) -> List[Evaluation]:
+        """
+        Score many intents at once
+
+        Stateless rules run rule by rule across the whole batch, each
+        skipping intents an earlier rule already rejected, with vendor
+        matches shared between intents with the same recipient. Stateful
+        rules then run in order; with `cumulative` every allowed intent
+        adds to the spend the ones after it are measured against.
+
+        Replays pass `times` and `spends` instead: each intent's own moment
+        for time-window rules and its own spend state, used as given.
+        """
+        memo: dict = {}
+        spend = (spend or SpendState()).copy()
+        evaluations = [
+            Evaluation(self, Facts(intent, times[index] if times else at, memo), spends[index] if spends else spend)
+            for index, intent in enumerate(intents)
+        ]
+
+        rejected = [False] * len(evaluations)
+        for rule in self._stateless:
+            for index, evaluation in enumerate(evaluations):
+                if not rejected[index] and not evaluation.passed(rule):
+                    rejected[index] = True
+
+        if spends or not cumulative:
+            return evaluations
+
+        for index, evaluation in enumerate(evaluations):
+            evaluation.spend = spend.copy()
+            if not rejected[index] and all(evaluation.passed(rule) for rule in self._stateful):
+                spend.add(float(evaluation.facts.amount or 0))
+        return evaluations
+
+
+def compile_plan(policy: dict) -> PolicyPlan:
+    """
+    Build the plan for a policy, in the order its checks are reported
+    """
+    daily_budget = policy.get('daily_budget')
+    threshold = policy.get('required_approval_threshold')
+    matcher = get_matcher(policy)
+
+    rules: List[Rule] = [
+        MaxAmountRule(policy.get('max_tx_amount', 1000)),
+        MonthlyBudgetRule(policy.get('monthly_budget', 5000)),
+    ]
+    if daily_budget is not None:
+        rules.append(DailyBudgetRule(daily_budget))
+    if policy.get('allow_list', []):
+        rules.append(AllowListRule(matcher))
+    if policy.get('block_list', []):
+        rules.append(BlockListRule(matcher))
+    if threshold is not None:
+        rules.append(ApprovalThresholdRule(threshold))
+    rules.extend(compile_rules(policy.get('rules'), policy.get('vendor_aliases')))
+    return PolicyPlan(rules)
+
+
+_plans: "OrderedDict[tuple, PolicyPlan]" = OrderedDict()
+
+
+def _cache_key(policy: dict) -> tuple:
+    if policy.get('id') is not None and policy.get('version') is not None:
+        return ('version', policy['id'], policy['version'])
+    # Unsaved candidates (e.g. in a simulation) key on content
+    return ('content', json.dumps({field: policy.get(field) for field in RULE_FIELDS}, sort_keys=True, default=str))
+
+
+def get_plan(policy: dict) -> PolicyPlan:
+    """
+    Compiled plan for a policy, built once per policy version
+    """
+    key = _cache_key(policy)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = compile_plan(policy)
+        _plans[key] = plan
+        if len(_plans) > MAX_CACHED_PLANS:
+            _plans.popitem(last=False)
+    else:
+        _plans.move_to_end(key)
+    return plan
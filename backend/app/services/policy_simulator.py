@@ -0,0 +1,290 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from app.config import get_settings
+from app.database import get_repository
+from app.services.policy_rules import SpendState, get_plan
+from app.services.vendor_matcher import normalize
+
+# Statuses whose amount actually left the account
+SPENT_STATUSES = ('executing', 'executed')
+
+# Columns a replay reads from agent_activities
+HISTORY_COLUMNS = ['id', 'created_at', 'status', 'structured_intent']
+
+NEWLY_BLOCKED = 'newly_blocked'
+NEWLY_ALLOWED = 'newly_allowed'
+
+
+class SpendReplay:
+    """
+    Rebuilds the spend windows each past activity was decided against
+
+    Rows arrive oldest first; every executed activity adds to its UTC day
+    and month, the same windows the spend buckets keep.
+    """
+
+    def __init__(self):
+        self.day = None
+        self.month = None
+        self.spend = SpendState()
+
+    def snapshot(self, at: datetime) -> SpendState:
+        day = at.astimezone(timezone.utc).date()
+        if day != self.day:
+            self.day = day
+            self.spend.daily = 0.0
+            self.spend.transactions = 0
+        if (day.year, day.month) != self.month:
+            self.month = (day.year, day.month)
+            self.spend.monthly = 0.0
+        return self.spend.copy()
+
+    def record(self, amount: float):
+        self.spend.add(amount)
+
+
+def score_chunk(baseline: dict, candidate: dict, rows: List[tuple]) -> dict:
+    """
+    Score one chunk of history under both policies; runs in a pool process
+
+    Rows are (amount, recipient, created_at, monthly, daily, transactions,
+    executed). Returns counts only, so what travels back stays small.
+    """
+    intents = [{"amount": amount, "recipientName": recipient} for amount, recipient, *_ in rows]
+    times = [created_at for _, _, created_at, *_ in rows]
+    spends = [SpendState(monthly, daily, transactions) for _, _, _, monthly, daily, transactions, _ in rows]
+    before = get_plan(baseline).evaluate_batch(intents, times=times, spends=spends)
+    after = get_plan(candidate).evaluate_batch(intents, times=times, spends=spends)
+
+    partial = {
+        "rows": len(rows),
+        "baseline_allowed": 0,
+        "candidate_allowed": 0,
+        "counts": Counter(),
+        "amounts": Counter(),
+        "rules": Counter(),
+        "vendors": Counter(),
+        "vendor_amounts": Counter(),
+    }
+    for row, old, new in zip(rows, before, after):
+        amount, recipient, executed = row[0], row[1], row[6]
+        old_valid, new_valid = old.is_valid, new.is_valid
+        partial["baseline_allowed"] += old_valid
+        partial["candidate_allowed"] += new_valid
+        if old_valid == new_valid:
+            continue
+
+        direction = NEWLY_BLOCKED if old_valid else NEWLY_ALLOWED
+        # Credit the rules that changed the verdict
+        rules = new.failed_rules if old_valid else old.failed_rules
+        vendor = normalize(recipient or '')
+        partial["counts"][direction] += 1
+        partial["amounts"][direction] += amount
+        partial["rules"].update((direction, rule) for rule in rules)
+        partial["vendors"][direction, vendor] += 1
+        partial["vendor_amounts"][direction, vendor] += amount
+        if executed and old_valid:
+            partial["counts"]["executed_now_blocked"] += 1
+            partial["amounts"]["executed_now_blocked"] += amount
+    return partial
+
+
+class PolicySimulator:
+    """
+    Backtests a candidate policy against a tenant's past intents
+
+    History is read oldest first in keyset chunks. Each chunk gets the
+    spend windows its activities saw, then both the current and the
+    candidate policy score it in a process pool; at most
+    `max_in_flight` chunks are read ahead, so memory stays bounded however
+    many rows are replayed.
+    """
+
+    def __init__(self, workers: int, chunk_size: int, max_in_flight: int):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.runs = 0
+        self.running = 0
+        self.rows = 0
+        self.last_run_seconds: Optional[float] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a worker that holds client threads and sockets is unsafe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    async def run(self, baseline: dict, candidate: dict, user_id: Optional[str],
+                  since: Optional[datetime] = None, max_rows: Optional[int] = None,
+                  repository=None) -> dict:
+        """
+        Replay the tenant's history since `since` under both policies
+
+        Returns how many activities each policy allows and the flips
+        between them, grouped by the rules and vendors behind them.
+        """
+        repository = repository or get_repository()
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        replay = SpendReplay()
+        report = _Report()
+        pending = set()
+        after = None
+        read = 0
+        started = time.monotonic()
+        self.running += 1
+
+        try:
+            while max_rows is None or read < max_rows:
+                limit = self.chunk_size if max_rows is None else min(self.chunk_size, max_rows - read)
+                rows = await repository.list_activities(
+                    limit=limit, after=after, user_id=user_id, created_after=since,
+                    columns=HISTORY_COLUMNS, oldest_first=True
+                )
+                if not rows:
+                    break
+                read += len(rows)
+                after = (rows[-1]['created_at'], rows[-1]['id'])
+
+                chunk = self._annotate(rows, replay, report)
+                if chunk:
+                    pending.add(loop.run_in_executor(pool, score_chunk, baseline, candidate, chunk))
+                report.chunks += 1
+
+                # Read ahead only while the pool has room
+                while len(pending) >= self.max_in_flight:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        report.merge(future.result())
+                if len(rows) < limit:
+                    break
+
+            for partial in await asyncio.gather(*pending):
+                report.merge(partial)
+            pending = set()
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next run
+            self.shutdown()
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+            self.running -= 1
+
+        seconds = time.monotonic() - started
+        self.runs += 1
+        self.rows += read
+        self.last_run_seconds = round(seconds, 3)
+        return report.summary(read, seconds)
+
+    def _annotate(self, rows: List[dict], replay: SpendReplay, report: '_Report') -> List[tuple]:
+        chunk = []
+        for row in rows:
+            intent = row.get('structured_intent') or {}
+            amount = intent.get('amount')
+            if not isinstance(amount, (int, float)) or not amount:
+                report.skipped += 1
+                continue
+            created_at = datetime.fromisoformat(row['created_at'])
+            spend = replay.snapshot(created_at)
+            executed = row.get('status') in SPENT_STATUSES
+            chunk.append((amount, intent.get('recipientName', ''), created_at, spend.monthly, spend.daily, spend.transactions, executed))
+            if executed:
+                replay.record(float(amount))
+        return chunk
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, any]:
+        return {
+            "workers": self.workers,
+            "pool_started": self._pool is not None,
+            "running": self.running,
+            "runs": self.runs,
+            "rows": self.rows,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+
+class _Report:
+    """
+    Totals merged from the chunk results
+    """
+
+    def __init__(self):
+        self.chunks = 0
+        self.skipped = 0
+        self.scored = 0
+        self.baseline_allowed = 0
+        self.candidate_allowed = 0
+        self.counts = Counter()
+        self.amounts = Counter()
+        self.rules = Counter()
+        self.vendors = Counter()
+        self.vendor_amounts = Counter()
+
+    def merge(self, partial: dict):
+        self.scored += partial["rows"]
+        self.baseline_allowed += partial["baseline_allowed"]
+        self.candidate_allowed += partial["candidate_allowed"]
+        for name in ("counts", "amounts", "rules", "vendors", "vendor_amounts"):
+            getattr(self, name).update(partial[name])
+
+    def _flips(self, direction: str, top_vendors: int) -> dict:
+        vendors: List[Tuple[str, int]] = [(vendor, count) for (flip, vendor), count in self.vendors.items() if flip == direction]
+        vendors.sort(key=lambda item: (-item[1], item[0]))
+        return {
+            "count": self.counts[direction],
+            "amount": round(self.amounts[direction], 2),
+            "by_rule": dict(sorted(
+                ((rule, count) for (flip, rule), count in self.rules.items() if flip == direction),
+                key=lambda item: -item[1]
+            )),
+            "by_vendor": [
+                {"vendor": vendor, "count": count, "amount": round(self.vendor_amounts[direction, vendor], 2)}
+                for vendor, count in vendors[:top_vendors]
+            ],
+        }
+
+    def summary(self, read: int, seconds: float, top_vendors: int = 25) -> dict:
+        return {
+            "activities": read,
+            "scored": self.scored,
+            "skipped": self.skipped,
+            "chunks": self.chunks,
+            "baseline": {"allowed": self.baseline_allowed, "blocked": self.scored - self.baseline_allowed},
+            "candidate": {"allowed": self.candidate_allowed, "blocked": self.scored - self.candidate_allowed},
+            "flips": {
+                NEWLY_BLOCKED: self._flips(NEWLY_BLOCKED, top_vendors),
+                NEWLY_ALLOWED: self._flips(NEWLY_ALLOWED, top_vendors),
+            },
+            "executed_now_blocked": {
+                "count": self.counts["executed_now_blocked"],
+                "amount": round(self.amounts["executed_now_blocked"], 2),
+            },
+            "seconds": round(seconds, 3),
+        }
+
+
+@lru_cache
+def get_policy_simulator() -> PolicySimulator:
+    settings = get_settings()
+    workers = settings.simulation_workers or os.cpu_count() or 1
+    return PolicySimulator(
+        workers=workers,
+        chunk_size=settings.simulation_chunk_size,
+        max_in_flight=settings.simulation_max_in_flight or workers * 2
+    )
@@ -0,0 +1,38 @@
+from app.services.vendor_matcher import get_matcher
+
+# Sent once per model as its system instruction rather than with every query
+SYSTEM_INSTRUCTION = """You are a financial AI assistant analyzing transaction requests.
+
+Reply with one JSON object with these keys, in this order:
+- amount: the transaction amount as a number, or null if the query is not a transaction request
+- currency: the currency (default "USDC")
+- recipient: the blockchain address if the query contains one, otherwise ""
+- recipientName: the vendor/merchant name (e.g. "Stripe", "Circle"); use the listed vendor name when the query refers to one
+- reasoning: a brief explanation (2-3 sentences) of why this transaction is or isn't safe based on the policy limits
+
+Example, with a $1,000 max transaction:
+Query: "Pay the dev $1500"
+{"amount": 1500, "currency": "USDC", "recipient": "", "recipientName": "dev", "reasoning": "This $1,500 payment exceeds your maximum transaction limit of $1,000. This violates your policy and should be flagged for review."}"""
+
+
+class PromptBuilder:
+    """
+    Builds the per-query part of the intent prompt
+
+    Only the policy limits, the approved vendors relevant to the query and
+    the query itself change between calls, so prompt size no longer grows
+    with the allow list.
+    """
+
+    def __init__(self, max_vendors: int):
+        self.max_vendors = max_vendors
+
+    def build(self, query: str, policy: dict) -> str:
+        vendors = get_matcher(policy).candidates(query, self.max_vendors)
+        return f"""Current Policy Limits:
+- Max Transaction: ${policy.get('max_tx_amount', 1000)}
+- Monthly Budget: ${policy.get('monthly_budget', 5000)}
+- Current Monthly Spent: ${policy.get('current_monthly_spent', 0)}
+- Approved Vendors: {', '.join(vendors) if vendors else 'none relevant to this query'}
+
+User Query: "{query}\""""
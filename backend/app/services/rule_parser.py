@@ -0,0 +1,129 @@
+import hashlib
+import re
+from typing import Optional
+from app.services.vendor_matcher import get_matcher
+
+# Amount with optional currency symbol/code on either side: "$1,250.00", "20 usdc", "USD 75".
+# A number with more digits after it, like "100.999", is not matched rather than cut short.
+AMOUNT_PATTERN = re.compile(
+    r'(?P<symbol>[$€])?\s?'
+    r'(?<![\w.,])(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)(?![.,]?\d)'
+    r'(?:\s?(?P<code>usdc|usd|eurc|eur|dollars?|bucks|euros?)\b|(?P<suffix>k)\b|(?![\w]))',
+    re.IGNORECASE
+)
+CURRENCY_PREFIX_PATTERN = re.compile(r'\b(usdc|usd|eurc|eur)\s?$', re.IGNORECASE)
+# Requests not to pay, or to call a payment off, are left to Gemini
+NEGATION_PATTERN = re.compile(r"\b(?:don['’]?t|do\s+not|never|cancel\w*)\b", re.IGNORECASE)
+VERB_PATTERN = re.compile(r'\b(send|pay|transfer|wire|tip|remit|give|reimburse)\b', re.IGNORECASE)
+RECIPIENT_PATTERN = re.compile(
+    r'\b(?:to|pay|for|reimburse|tip)\s+(?:the\s+)?([a-z0-9][a-z0-9&.\'-]*(?:\s+(?!for\b|on\b|via\b|by\b|from\b|today\b|now\b|usdc\b|usd\b)[a-z][a-z0-9&.\'-]*){0,3})',
+    re.IGNORECASE
+)
+
+CURRENCY_CODES = {
+    '$': 'USDC', '€': 'EURC',
+    'usdc': 'USDC', 'usd': 'USDC', 'dollar': 'USDC', 'dollars': 'USDC', 'bucks': 'USDC',
+    'eurc': 'EURC', 'eur': 'EURC', 'euro': 'EURC', 'euros': 'EURC',
+}
+
+# Confidence contributed by each signal
+AMOUNT_SCORE = 0.4
+VERB_SCORE = 0.2
+CURRENCY_SCORE = 0.1
+LISTED_VENDOR_SCORE = 0.3
+UNLISTED_RECIPIENT_SCORE = 0.1
+AMBIGUOUS_AMOUNT_PENALTY = 0.3
+NEGATION_PENALTY = 0.5
+
+
+def mock_address(recipient_name: str, amount) -> str:
+    """
+    Deterministic placeholder address for a named recipient
+    """
+    address_hash = hashlib.md5(f"{recipient_name}{amount}".encode()).hexdigest()[:8]
+    return f"0x{address_hash}...{address_hash[-4:]}"
+
+
+def _find_amounts(query: str):
+    amounts = []
+    for match in AMOUNT_PATTERN.finditer(query):
+        value = float(match.group('number').replace(',', ''))
+        if match.group('suffix'):
+            value *= 1000
+
+        currency_token = match.group('symbol') or match.group('code')
+        if not currency_token:
+            prefix = CURRENCY_PREFIX_PATTERN.search(query[:match.start()])
+            currency_token = prefix.group(1) if prefix else None
+
+        amounts.append((value, CURRENCY_CODES.get(currency_token.lower()) if currency_token else None, match.span()))
+    return amounts
+
+
+def parse(query: str, policy: dict) -> Optional[dict]:
+    """
+    Deterministically parse a payment request
+
+    Returns the same fields as the Gemini parser plus a `confidence` in
+    [0, 1], or None when no amount or recipient can be found.
+    """
+    amounts = _find_amounts(query)
+    if not amounts:
+        return None
+
+    confidence = AMOUNT_SCORE
+    if len(amounts) > 1:
+        confidence -= AMBIGUOUS_AMOUNT_PENALTY
+    amount, currency, amount_span = amounts[0]
+    if currency:
+        confidence += CURRENCY_SCORE
+    if VERB_PATTERN.search(query):
+        confidence += VERB_SCORE
+    if NEGATION_PATTERN.search(query):
+        confidence -= NEGATION_PENALTY
+
+    # Prefer vendors known to the policy, matched anywhere in the query
+    recipient_name = None
+    vendor_match = get_matcher(policy).find_in_text(query)
+    if vendor_match:
+        recipient_name = vendor_match.vendor
+        confidence += LISTED_VENDOR_SCORE
+    else:
+        # Otherwise take the phrase after "to"/"pay"/"for"/..., skipping the amount itself
+        for match in RECIPIENT_PATTERN.finditer(query):
+            start, end = match.span(1)
+            if start < amount_span[1] and end > amount_span[0]:
+                continue
+            recipient_name = match.group(1).strip(" .,!?'")
+            break
+        if recipient_name:
+            confidence += UNLISTED_RECIPIENT_SCORE
+
+    if not recipient_name:
+        return None
+
+    currency = currency or 'USDC'
+    return {
+        "amount": amount,
+        "currency": currency,
+        "recipient": mock_address(recipient_name, amount),
+        "recipientName": recipient_name,
+        "reasoning": _reasoning(amount, currency, recipient_name, policy),
+        "confidence": round(min(max(confidence, 0.0), 1.0), 2),
+        "parser": "rules"
+    }
+
+
+def _reasoning(amount: float, currency: str, recipient_name: str, policy: dict) -> str:
+    max_tx = float(policy.get('max_tx_amount', 1000))
+    limit = (
+        f"is within your ${max_tx:,.0f} transaction limit"
+        if amount <= max_tx
+        else f"exceeds your maximum transaction limit of ${max_tx:,.0f}"
+    )
+    vendor = (
+        f"{recipient_name} is on your approved vendor list"
+        if get_matcher(policy).is_allowed(recipient_name)
+        else f"{recipient_name} is not on your approved vendor list"
+    )
+    return f"This {amount:,.2f} {currency} payment to {recipient_name} {limit}, and {vendor}. Please review the policy checks before approving."
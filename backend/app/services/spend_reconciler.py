@@ -0,0 +1,78 @@
+import asyncio
+import time
+from functools import lru_cache
+from typing import Optional
+from app.config import get_settings
+from app.database import get_repository
+from app.services.policy_cache import get_policy_cache
+
+
+class SpendReconciler:
+    """
+    Periodic job that rebuilds the spend buckets from the ledger
+
+    Claims, releases and failed transfers keep the day and month buckets
+    current as they happen, so budget checks never scan history. This job
+    is the safety net: it backfills reservations for transactions the
+    ledger missed, releases reservations whose activity never produced a
+    transfer, and recomputes the buckets of the current and previous month.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.runs = 0
+        self.last_result: Optional[dict] = None
+        self.last_run_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    async def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Spend reconciler error: {e}")
+
+    async def run_once(self) -> dict:
+        """
+        Reconcile the ledger once; returns the counts reported by the database
+        """
+        started = time.monotonic()
+        result = await get_repository().reconcile_spend()
+
+        # Cached policies carry spend windows that may have just moved
+        get_policy_cache().clear()
+
+        self.runs += 1
+        self.last_result = result
+        self.last_run_seconds = round(time.monotonic() - started, 3)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "runs": self.runs,
+            "last_result": self.last_result,
+            "last_run_seconds": self.last_run_seconds,
+            "last_error": self.last_error
+        }
+
+
+@lru_cache
+def get_spend_reconciler() -> SpendReconciler:
+    return SpendReconciler(interval=get_settings().spend_reconcile_interval)
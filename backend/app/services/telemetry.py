@@ -0,0 +1,227 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from app.config import get_settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    'aurralis_http_request_duration_seconds', 'HTTP request latency, including streamed bodies',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge('aurralis_http_requests_in_flight', 'HTTP requests being served')
+STAGE_DURATION = Histogram(
+    'aurralis_stage_duration_seconds', 'Time spent in each numbered pipeline step',
+    ['pipeline', 'stage', 'outcome'], buckets=LATENCY_BUCKETS
+)
+EXTERNAL_DURATION = Histogram(
+    'aurralis_external_call_duration_seconds', 'Latency of calls to Circle and Gemini, retries included',
+    ['service', 'operation', 'outcome'], buckets=LATENCY_BUCKETS
+)
+EXTERNAL_IN_FLIGHT = Gauge('aurralis_external_calls_in_flight', 'Calls to Circle and Gemini in progress', ['service'])
+LLM_TOKENS = Counter('aurralis_llm_tokens_total', 'Gemini tokens used', ['kind'])
+EVENT_LOOP_LAG = Histogram('aurralis_event_loop_lag_seconds', 'How late the event loop runs a scheduled wake-up', buckets=LAG_BUCKETS)
+
+
+class Tracer:
+    """
+    Optional OpenTelemetry tracing
+
+    Spans are only created when OTEL_EXPORTER_OTLP_ENDPOINT is set, so the
+    OpenTelemetry SDK is only needed where traces are exported.
+    """
+
+    def __init__(self):
+        self._tracer = None
+
+    def configure(self, endpoint: Optional[str], service_name: str):
+        if not endpoint or self._tracer is not None:
+            return
+        try:
+            from opentelemetry import trace
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            raise RuntimeError(
+                "OTLP export requires the 'opentelemetry-sdk' and 'opentelemetry-exporter-otlp-proto-http' packages"
+            )
+
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint.rstrip('/')}/v1/traces")))
+        trace.set_tracer_provider(provider)
+        self._tracer = trace.get_tracer("aurralis")
+
+    @contextmanager
+    def span(self, name: str, attributes: Dict[str, str]) -> Iterator[None]:
+        if self._tracer is None:
+            yield
+            return
+        with self._tracer.start_as_current_span(name, attributes=attributes):
+            yield
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def stage(pipeline: str, name: str) -> Iterator[None]:
+    """
+    Time one numbered step of a request pipeline
+    """
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        with tracer.span(f"{pipeline}.{name}", {"pipeline": pipeline, "stage": name}):
+            yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        STAGE_DURATION.labels(pipeline, name, outcome).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def external_call(service: str, operation: str) -> Iterator[None]:
+    """
+    Time a call to an external service and count it as in flight
+    """
+    started = time.perf_counter()
+    outcome = 'ok'
+    in_flight = EXTERNAL_IN_FLIGHT.labels(service)
+    in_flight.inc()
+    try:
+        with tracer.span(f"{service}.{operation}", {"service": service, "operation": operation}):
+            yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        in_flight.dec()
+        EXTERNAL_DURATION.labels(service, operation, outcome).observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route and in-flight requests
+
+    Routes are labelled by their path template so ids do not blow up label
+    cardinality; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[Callable, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return 'unmatched'
+        if endpoint not in self._routes:
+            for route in scope['app'].routes:
+                if getattr(route, 'endpoint', None) is endpoint:
+                    self._routes[endpoint] = route.path
+                    break
+            else:
+                self._routes[endpoint] = getattr(endpoint, '__name__', 'unknown')
+        return self._routes[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            # Parent span for the stage and external-call spans of this request
+            with tracer.span('http.request', {"http.method": scope['method'], "http.target": scope['path']}):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            HTTP_REQUEST_DURATION.labels(scope['method'], self._route(scope), str(status)).observe(time.perf_counter() - started)
+
+
+class LoopLagMonitor:
+    """
+    Samples event-loop lag: how much later than asked a sleeping task wakes
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(time.perf_counter() - started - self.interval, 0.0)
+            EVENT_LOOP_LAG.observe(self.last_lag)
+
+
+class StatsCollector:
+    """
+    Exposes the in-process stats the services already keep as gauges
+
+    Read at scrape time, so the services need no Prometheus code of their own.
+    """
+
+    def __init__(self):
+        self._sources: List[tuple] = []
+
+    def register(self, name: str, stats: Callable[[], dict]):
+        self._sources.append((name, stats))
+
+    def collect(self):
+        cache_hits = GaugeMetricFamily('aurralis_cache_hit_ratio', 'Cache hit ratio since start', labels=['cache'])
+        values = GaugeMetricFamily('aurralis_component_stat', 'Numeric stats reported by app components', labels=['component', 'stat'])
+        for name, stats in self._sources:
+            try:
+                snapshot = stats()
+            except Exception:
+                continue
+            if 'hits' in snapshot and 'misses' in snapshot:
+                lookups = snapshot['hits'] + snapshot['misses']
+                cache_hits.add_metric([name], snapshot['hits'] / lookups if lookups else 0.0)
+            for key, value in snapshot.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values.add_metric([name, key], float(value))
+        yield cache_hits
+        yield values
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+@lru_cache
+def get_loop_lag_monitor() -> LoopLagMonitor:
+    return LoopLagMonitor(get_settings().metrics_loop_lag_interval)
+
+
+def render_metrics() -> tuple:
+    return generate_latest(), CONTENT_TYPE_LATEST
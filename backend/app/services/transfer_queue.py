@@ -0,0 +1,493 @@
+import asyncio
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from app.config import get_settings
+from app.database import get_repository
+from app.services.circle_wrapper import CircleAPIError, CircuitOpenError, get_circle_wrapper
+from app.services.event_bus import get_event_bus
+from app.services.policy_cache import get_policy_cache
+from app.services.proof_generator import proof_generator
+
+# Same ids and labels as the ExecutionProgress steps in the frontend
+STEPS = [
+    ("validate", "Validating Policy"),
+    ("transfer", "Moving USDC"),
+    ("confirm", "Confirming on Arc"),
+]
+
+TERMINAL_STATES = ('completed', 'failed')
+
+
+def rejected(error: Exception) -> bool:
+    """
+    Whether a failed transfer attempt certainly created no transfer
+
+    Only Circle's 4xx answers and calls the open circuit breaker never
+    sent are; after a transport error, a timeout or a 5xx the transfer may
+    have gone through.
+    """
+    if isinstance(error, CircuitOpenError):
+        return True
+    return isinstance(error, CircleAPIError) and error.status_code is not None and 400 <= error.status_code < 500
+
+
+@dataclass
+class TransferJob:
+    activity_id: str
+    user_id: Optional[str]
+    intent: dict
+    policy_id: Optional[str]
+    amount: float
+    idempotency_key: str
+    state: str = 'queued'
+    attempts: int = 0
+    # Set once an attempt failed in a way that may still have moved the money
+    maybe_sent: bool = False
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    events: List[dict] = field(default_factory=list)
+    finished_at: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    subscribers: List[asyncio.Queue] = field(default_factory=list)
+
+    def snapshot(self) -> dict:
+        steps = {step_id: {"id": step_id, "label": label, "status": "pending"} for step_id, label in STEPS}
+        for event in self.events:
+            if event.get('step') in steps:
+                steps[event['step']]['status'] = event['status']
+                steps[event['step']]['timestamp'] = event['timestamp']
+        return {
+            "activity_id": self.activity_id,
+            "state": self.state,
+            "attempts": self.attempts,
+            "steps": list(steps.values()),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class TransferQueue:
+    """
+    In-process queue executing approved transfers on a pool of async workers
+
+    Approval only enqueues a job and returns. Workers run the Circle
+    transfer with retries under a per-activity idempotency key, persist the
+    transaction and publish step events that clients can follow over SSE.
+    Batch approvals run their transfers together and write the results in
+    bulk. Jobs live in memory, so progress must be followed on the worker
+    that accepted the approval. A periodic sweep renews the locks of the
+    jobs this worker still holds, then takes over the activities a stopped
+    or restarted worker left locked.
+    """
+
+    def __init__(self, workers: int, max_attempts: int, retry_backoff: float, retention: float, batch_concurrency: int,
+                 stale_after: float = 900.0, sweep_interval: float = 0.0):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retention = retention
+        self.batch_concurrency = batch_concurrency
+        self.stale_after = stale_after
+        self.sweep_interval = sweep_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._jobs: Dict[str, TransferJob] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._batches: Set[asyncio.Task] = set()
+        self._sweeper: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.recovered = {"settled": 0, "requeued": 0}
+        self.last_sweep_error: Optional[str] = None
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.sweep_interval > 0 and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self):
+        sweeper = [self._sweeper] if self._sweeper else []
+        for task in [*self._tasks, *self._batches, *sweeper]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._batches, *sweeper, return_exceptions=True)
+        self._tasks = []
+        self._batches.clear()
+        self._sweeper = None
+
+    async def sweep(self) -> dict:
+        """
+        Take over the activities left locked longer than `stale_after`
+
+        The locks of the jobs still queued or running here are renewed
+        first, so however long they wait no sweep treats them as stale.
+        Of the rest, those whose transaction was recorded are settled from
+        it and the others are queued here again. The retry reuses the
+        activity's idempotency key, so Circle does not send a transfer that
+        already went out twice.
+        """
+        await self.renew_locks()
+        result = await get_repository().recover_stale_activities(self.stale_after)
+        for activity in result['settled']:
+            get_event_bus().activity_updated(activity['id'], activity['status'], activity['user_id'])
+        held = set(self._active_ids())
+        requeued = [activity for activity in result['requeued'] if activity['id'] not in held]
+        for activity in requeued:
+            print(f"Requeueing transfer for stale activity {activity['id']}")
+            job = self.enqueue(activity['id'], activity['user_id'], activity['structured_intent'], activity['policy_id'], float(activity['amount']))
+            # The stopped worker may have sent it already, so a failed retry is no proof nothing moved
+            job.maybe_sent = True
+        counts = {"settled": len(result['settled']), "requeued": len(requeued)}
+        for key, count in counts.items():
+            self.recovered[key] += count
+        return counts
+
+    async def renew_locks(self) -> int:
+        """
+        Mark the activities of the jobs still queued or running here as live
+        """
+        activity_ids = self._active_ids()
+        if not activity_ids:
+            return 0
+        return await get_repository().renew_activity_locks(activity_ids)
+
+    def _active_ids(self) -> List[str]:
+        return [activity_id for activity_id, job in self._jobs.items() if job.state not in TERMINAL_STATES]
+
+    async def _sweep_periodically(self):
+        # First pass right away: a restart is when locks are most likely left behind
+        while True:
+            try:
+                await self.sweep()
+                self.last_sweep_error = None
+            except Exception as e:
+                self.last_sweep_error = str(e)
+                print(f"Transfer sweep error: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def enqueue(self, activity_id: str, user_id: Optional[str], intent: dict, policy_id: Optional[str], amount: float) -> TransferJob:
+        """
+        Queue the transfer for a claimed activity
+        """
+        self._prune()
+        existing = self._jobs.get(activity_id)
+        if existing and existing.state not in TERMINAL_STATES:
+            return existing
+
+        job = self._new_job(activity_id, user_id, intent, policy_id, amount)
+        self._queue.put_nowait(job)
+        return job
+
+    def enqueue_batch(self, user_id: Optional[str], policy_id: Optional[str], items: List[Tuple[str, dict, float]]) -> List[TransferJob]:
+        """
+        Queue the transfers of a batch of claimed activities as one unit
+
+        `items` are (activity_id, intent, amount). The transfers run
+        concurrently, at most `batch_concurrency` at a time, beside the
+        worker pool; their transactions are then written with one bulk
+        insert and the activities settled with one call.
+        """
+        self._prune()
+        jobs = [self._new_job(activity_id, user_id, intent, policy_id, amount) for activity_id, intent, amount in items]
+        task = asyncio.create_task(self._execute_batch(jobs))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+        return jobs
+
+    def _new_job(self, activity_id: str, user_id: Optional[str], intent: dict, policy_id: Optional[str], amount: float) -> TransferJob:
+        job = TransferJob(
+            activity_id=activity_id,
+            user_id=user_id,
+            intent=intent,
+            policy_id=policy_id,
+            amount=amount,
+            idempotency_key=str(uuid.uuid5(uuid.NAMESPACE_URL, f"aurralis:transfer:{activity_id}"))
+        )
+        self._jobs[activity_id] = job
+        self._publish(job, 'validate', 'completed')
+        self._publish(job, 'transfer', 'pending')
+        return job
+
+    def get(self, activity_id: str) -> Optional[TransferJob]:
+        return self._jobs.get(activity_id)
+
+    async def subscribe(self, activity_id: str) -> AsyncIterator[dict]:
+        """
+        Replay a job's events so far, then follow it until it finishes
+        """
+        job = self._jobs.get(activity_id)
+        if job is None:
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        history = list(job.events)
+        job.subscribers.append(queue)
+        try:
+            for event in history:
+                yield event
+            if job.state in TERMINAL_STATES:
+                return
+            while True:
+                event = await queue.get()
+                yield event
+                if event.get('state') in TERMINAL_STATES:
+                    return
+        finally:
+            job.subscribers.remove(queue)
+
+    def stats(self) -> dict:
+        states: Dict[str, int] = {}
+        for job in self._jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {
+            "workers": len(self._tasks),
+            "queue_depth": self._queue.qsize(),
+            "batches": len(self._batches),
+            "jobs": states,
+            "recovered": dict(self.recovered),
+            "last_sweep_error": self.last_sweep_error,
+        }
+
+    def _publish(self, job: TransferJob, step: Optional[str], status: Optional[str], **extra):
+        event = {
+            "activity_id": job.activity_id,
+            "state": job.state,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            **extra
+        }
+        if step:
+            event["step"] = step
+            event["status"] = status
+        job.events.append(event)
+        for queue in job.subscribers:
+            queue.put_nowait(event)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.retention
+        for activity_id in [a for a, j in self._jobs.items() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[activity_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._execute(job)
+            except Exception as e:
+                print(f"Transfer worker error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job: TransferJob):
+        repository = get_repository()
+        try:
+            transfer_result = await self._transfer(job)
+        except Exception as e:
+            if job.maybe_sent:
+                # The transfer may have gone out: keep the reservation and leave it for review
+                await repository.release_activity(job.activity_id, 'needs_review', job.policy_id, 0)
+                self._fail(job, 'transfer', str(e), 'needs_review')
+                return
+            # Nothing moved, so give the reserved spend back
+            await repository.release_activity(job.activity_id, 'failed', job.policy_id, job.amount)
+            get_policy_cache().invalidate(job.user_id)
+            self._fail(job, 'transfer', str(e))
+            return
+
+        if transfer_result['status'] == 'failed':
+            await repository.release_activity(job.activity_id, 'failed', job.policy_id, job.amount)
+            get_policy_cache().invalidate(job.user_id)
+            self._fail(job, 'transfer', "Circle rejected the transfer")
+            return
+
+        self._publish(job, 'transfer', 'completed', tx_hash=transfer_result['tx_hash'])
+        self._publish(job, 'confirm', 'in-progress')
+
+        try:
+            tx_hash = transfer_result['tx_hash']
+            transaction = await repository.insert_transaction(self._transaction_row(job, transfer_result))
+
+            final_status = 'executed' if transfer_result['status'] == 'confirmed' else 'executing'
+            await repository.update_activity(job.activity_id, {
+                'status': final_status,
+                'locked': False
+            })
+            if transaction:
+                get_event_bus().transaction_created(transaction, job.user_id)
+            get_event_bus().activity_updated(job.activity_id, final_status, job.user_id, tx_hash=tx_hash)
+        except Exception as e:
+            # Money moved but is not recorded: keep the reservation and leave it for review
+            await repository.release_activity(job.activity_id, 'needs_review', job.policy_id, 0)
+            self._fail(job, 'confirm', str(e), 'needs_review')
+            return
+
+        self._complete(job, transfer_result)
+
+    async def _execute_batch(self, jobs: List[TransferJob]):
+        repository = get_repository()
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def transfer(job: TransferJob) -> dict:
+            async with semaphore:
+                return await self._transfer(job)
+
+        results = await asyncio.gather(*(transfer(job) for job in jobs), return_exceptions=True)
+
+        moved = []
+        settle = []
+        failures = {}
+        for job, result in zip(jobs, results):
+            if isinstance(result, Exception) and job.maybe_sent:
+                # The transfer may have gone out: keep the reservation and leave it for review
+                settle.append({"id": job.activity_id, "status": "needs_review", "refund": 0})
+                failures[job.activity_id] = ('transfer', str(result), 'needs_review')
+                continue
+            if isinstance(result, Exception) or result['status'] == 'failed':
+                # Nothing moved, so give the reserved spend back
+                settle.append({"id": job.activity_id, "status": "failed", "refund": job.amount})
+                failures[job.activity_id] = ('transfer', str(result) if isinstance(result, Exception) else "Circle rejected the transfer")
+                continue
+            moved.append((job, result))
+            self._publish(job, 'transfer', 'completed', tx_hash=result['tx_hash'])
+            self._publish(job, 'confirm', 'in-progress')
+
+        transactions = await self._insert_transactions(moved)
+        for job, result in moved:
+            if isinstance(transactions.get(job.activity_id), Exception):
+                # Money moved but is not recorded: keep the reservation and leave it for review
+                settle.append({"id": job.activity_id, "status": "needs_review", "refund": 0})
+                failures[job.activity_id] = ('confirm', str(transactions[job.activity_id]), 'needs_review')
+            else:
+                status = 'executed' if result['status'] == 'confirmed' else 'executing'
+                settle.append({"id": job.activity_id, "status": status, "refund": 0})
+
+        try:
+            await repository.settle_activities(settle)
+        except Exception as e:
+            print(f"Bulk settle failed, settling one by one: {e}")
+            for update in settle:
+                try:
+                    await repository.release_activity(update['id'], update['status'], jobs[0].policy_id, update['refund'])
+                except Exception as e:
+                    print(f"Error settling activity {update['id']}: {e}")
+        if any(update['refund'] for update in settle):
+            get_policy_cache().invalidate(jobs[0].user_id)
+
+        for job, result in moved:
+            if job.activity_id in failures:
+                continue
+            transaction = transactions.get(job.activity_id)
+            if transaction:
+                get_event_bus().transaction_created(transaction, job.user_id)
+            status = 'executed' if result['status'] == 'confirmed' else 'executing'
+            get_event_bus().activity_updated(job.activity_id, status, job.user_id, tx_hash=result['tx_hash'])
+            self._complete(job, result)
+        for job in jobs:
+            if job.activity_id in failures:
+                self._fail(job, *failures[job.activity_id])
+
+    async def _insert_transactions(self, moved: List[Tuple[TransferJob, dict]]) -> Dict[str, object]:
+        """
+        Record the transactions of a batch, keyed by activity id
+
+        One bulk insert; if it is rejected the rows are retried one by one
+        so a single bad row only fails its own activity. Failed rows map to
+        the exception.
+        """
+        if not moved:
+            return {}
+        repository = get_repository()
+        try:
+            rows = await repository.insert_transactions([self._transaction_row(job, result) for job, result in moved])
+            return {row['activity_id']: row for row in rows}
+        except Exception as e:
+            print(f"Bulk transaction insert failed, inserting one by one: {e}")
+
+        transactions = {}
+        for job, result in moved:
+            try:
+                transactions[job.activity_id] = await repository.insert_transaction(self._transaction_row(job, result))
+            except Exception as e:
+                transactions[job.activity_id] = e
+        return transactions
+
+    async def _transfer(self, job: TransferJob) -> dict:
+        """
+        Run the Circle transfer with retries; raises once attempts run out
+
+        Attempts that may have reached Circle mark the job `maybe_sent`.
+        """
+        job.state = 'running'
+        self._publish(job, 'transfer', 'in-progress')
+        while True:
+            job.attempts += 1
+            try:
+                return await get_circle_wrapper().transfer_with_timeout(
+                    amount=job.intent['amount'],
+                    recipient=job.intent['recipient'],
+                    timeout=get_settings().transfer_timeout,
+                    idempotency_key=job.idempotency_key
+                )
+            except Exception as e:
+                if not rejected(e):
+                    job.maybe_sent = True
+                if job.attempts >= self.max_attempts:
+                    raise
+                delay = self.retry_backoff * 2 ** (job.attempts - 1)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    def _transaction_row(self, job: TransferJob, transfer_result: dict) -> dict:
+        intent = job.intent
+        return {
+            'activity_id': job.activity_id,
+            'tx_hash': transfer_result['tx_hash'],
+            'transfer_id': transfer_result.get('transfer_id'),
+            'explorer_url': proof_generator.generate_explorer_url(transfer_result['tx_hash']),
+            'amount': intent['amount'],
+            'currency': intent.get('currency', 'USDC'),
+            'recipient': intent['recipient'],
+            'status': transfer_result['status'],
+            'confirmations': 0
+        }
+
+    def _complete(self, job: TransferJob, transfer_result: dict):
+        intent = job.intent
+        tx_hash = transfer_result['tx_hash']
+        job.result = {
+            "activity_id": job.activity_id,
+            "tx_hash": tx_hash,
+            "explorer_url": proof_generator.generate_explorer_url(tx_hash),
+            "status": transfer_result['status'],
+            "proof_data": proof_generator.generate_proof_data(tx_hash, intent['amount'], intent['recipient'])
+        }
+        job.state = 'completed'
+        job.finished_at = time.monotonic()
+        confirm_status = 'completed' if transfer_result['status'] == 'confirmed' else 'in-progress'
+        self._publish(job, 'confirm', confirm_status, result=job.result)
+        job.done.set()
+
+    def _fail(self, job: TransferJob, step: str, error: str, status: str = 'failed'):
+        print(f"Transfer failed for {job.activity_id}: {error}")
+        get_event_bus().activity_updated(job.activity_id, status, job.user_id)
+        job.state = 'failed'
+        job.error = error
+        job.finished_at = time.monotonic()
+        self._publish(job, step, 'failed', error=error)
+        job.done.set()
+
+
+@lru_cache
+def get_transfer_queue() -> TransferQueue:
+    settings = get_settings()
+    return TransferQueue(
+        workers=settings.transfer_workers,
+        max_attempts=settings.transfer_max_attempts,
+        retry_backoff=settings.transfer_retry_backoff,
+        retention=settings.transfer_job_retention,
+        batch_concurrency=settings.approve_batch_concurrency,
+        stale_after=settings.transfer_stale_after,
+        sweep_interval=settings.transfer_sweep_interval
+    )
@@ -0,0 +1,219 @@
+import re
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ALLOW = 'allow'
+BLOCK = 'block'
+
+# Preference when several vendors match the same recipient
+KIND_RANK = {'exact': 0, 'prefix': 1, 'alias': 2, 'contains': 3}
+
+MAX_CACHED_MATCHERS = 64
+
+WORD_PATTERN = re.compile(r'\w{2,}')
+
+
+def normalize(name: str) -> str:
+    return ' '.join(name.casefold().split())
+
+
+@dataclass(frozen=True)
+class VendorMatch:
+    vendor: str
+    matched: str
+    kind: str
+
+
+class _Automaton:
+    """
+    Aho-Corasick automaton over normalized vendor names and aliases
+
+    A search walks the text once, so its cost depends on the length of the
+    recipient name and not on how many vendors the policy lists.
+    """
+
+    def __init__(self, patterns: Dict[str, List[Tuple[str, str, bool]]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, str, str, bool]]] = [[]]
+        # Nearest node along the fail chain that ends a pattern
+        self.output_link: List[int] = [0]
+
+        for pattern, payloads in patterns.items():
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.output_link.append(0)
+                node = next_node
+            self.out[node].extend((len(pattern), *payload) for payload in payloads)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                fail = self.goto[fallback].get(char, 0)
+                self.fail[child] = fail
+                self.output_link[child] = fail if self.out[fail] else self.output_link[fail]
+
+    def search(self, text: str) -> Iterable[Tuple[int, int, str, str, bool]]:
+        """
+        Yield (start, end, list_name, vendor, is_alias) for every occurrence
+        """
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            hit = node if self.out[node] else self.output_link[node]
+            while hit:
+                for length, list_name, vendor, is_alias in self.out[hit]:
+                    yield index + 1 - length, index + 1, list_name, vendor, is_alias
+                hit = self.output_link[hit]
+
+
+class VendorMatcher:
+    """
+    Allow/block list index compiled once per policy version
+
+    Recipients match a vendor exactly, by prefix, through an alias from the
+    policy's `vendor_aliases`, or by containing the vendor name, the same
+    case-insensitive substring rule the validator always applied.
+    """
+
+    def __init__(self, allow_list: List[str], block_list: List[str], aliases: Optional[Dict[str, List[str]]] = None):
+        aliases = aliases or {}
+        patterns: Dict[str, List[Tuple[str, str, bool]]] = {}
+        self.allow_list = list(allow_list or [])
+        # Word -> allow-list vendors whose name or alias contains it
+        self._allow_words: Dict[str, List[str]] = {}
+
+        for list_name, vendors in ((ALLOW, allow_list), (BLOCK, block_list)):
+            for vendor in vendors or []:
+                names = [(vendor, False)] + [(alias, True) for alias in aliases.get(vendor, [])]
+                for name, is_alias in names:
+                    key = normalize(name)
+                    if not key:
+                        continue
+                    patterns.setdefault(key, []).append((list_name, vendor, is_alias))
+                    if list_name == ALLOW:
+                        for word in set(WORD_PATTERN.findall(key)):
+                            vendors_with_word = self._allow_words.setdefault(word, [])
+                            if not vendors_with_word or vendors_with_word[-1] != vendor:
+                                vendors_with_word.append(vendor)
+
+        self._automaton = _Automaton(patterns)
+
+    def match(self, recipient_name: str) -> Dict[str, Optional[VendorMatch]]:
+        """
+        Best allow-list and block-list match for a recipient
+        """
+        text = normalize(recipient_name or '')
+        best: Dict[str, Optional[VendorMatch]] = {ALLOW: None, BLOCK: None}
+        if not text:
+            return best
+
+        ranks: Dict[str, Tuple[int, int]] = {}
+        for start, end, list_name, vendor, is_alias in self._automaton.search(text):
+            if end - start == len(text) and not is_alias:
+                kind = 'exact'
+            elif is_alias:
+                kind = 'alias'
+            elif start == 0:
+                kind = 'prefix'
+            else:
+                kind = 'contains'
+
+            rank = (KIND_RANK[kind], start - end)
+            if list_name not in ranks or rank < ranks[list_name]:
+                ranks[list_name] = rank
+                best[list_name] = VendorMatch(vendor, text[start:end], kind)
+        return best
+
+    def is_allowed(self, recipient_name: str) -> bool:
+        return self.match(recipient_name)[ALLOW] is not None
+
+    def is_blocked(self, recipient_name: str) -> bool:
+        return self.match(recipient_name)[BLOCK] is not None
+
+    def find_in_text(self, text: str) -> Optional[VendorMatch]:
+        """
+        Longest listed vendor (or alias) occurring as whole words in free text
+        """
+        text = normalize(text)
+        best = None
+        for start, end, _, vendor, is_alias in self._automaton.search(text):
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end < len(text) and text[end].isalnum():
+                continue
+            if best is None or end - start > len(best.matched):
+                best = VendorMatch(vendor, text[start:end], 'alias' if is_alias else 'exact')
+        return best
+
+    def candidates(self, text: str, limit: int) -> List[str]:
+        """
+        Allow-list vendors most relevant to free text, at most `limit`
+
+        A vendor named in the text comes first, then vendors sharing the most
+        words with it. Short lists are returned whole.
+        """
+        if len(self.allow_list) <= limit:
+            return list(self.allow_list)
+
+        scores: Dict[str, int] = {}
+        for word in set(WORD_PATTERN.findall(normalize(text))):
+            for vendor in self._allow_words.get(word, ()):
+                scores[vendor] = scores.get(vendor, 0) + 1
+
+        ranked = sorted(scores, key=lambda vendor: -scores[vendor])
+        found = self.find_in_text(text)
+        if found and found.vendor in self.allow_list:
+            ranked = [found.vendor] + [vendor for vendor in ranked if vendor != found.vendor]
+        return ranked[:limit]
+
+
+_matchers: "OrderedDict[tuple, VendorMatcher]" = OrderedDict()
+
+
+def _cache_key(policy: dict) -> tuple:
+    if policy.get('id') is not None and policy.get('version') is not None:
+        return ('version', policy['id'], policy['version'])
+    # Unsaved or unversioned policies (e.g. candidates in a simulation) key on content
+    aliases = policy.get('vendor_aliases') or {}
+    return (
+        'content',
+        tuple(policy.get('allow_list') or []),
+        tuple(policy.get('block_list') or []),
+        tuple(sorted((k, tuple(v)) for k, v in aliases.items()))
+    )
+
+
+def get_matcher(policy: dict) -> VendorMatcher:
+    """
+    Compiled matcher for a policy, built once per policy version
+    """
+    key = _cache_key(policy)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = VendorMatcher(
+            policy.get('allow_list') or [],
+            policy.get('block_list') or [],
+            policy.get('vendor_aliases') or {}
+        )
+        _matchers[key] = matcher
+        if len(_matchers) > MAX_CACHED_MATCHERS:
+            _matchers.popitem(last=False)
+    else:
+        _matchers.move_to_end(key)
+    return matcher
@@ -0,0 +1,16 @@
+# Benchmarks and load tools
+import os
+
+def use_dummy_settings(**overrides):
+    """
+    Fill in placeholder credentials so the settings load without a .env
+    """
+    defaults = {
+        "SUPABASE_URL": "http://supabase.invalid",
+        "SUPABASE_KEY": "bench",
+        "SUPABASE_SERVICE_KEY": "bench",
+        "GEMINI_API_KEY": "bench",
+        "CIRCLE_API_KEY": "bench",
+    }
+    for key, value in {**defaults, **overrides}.items():
+        os.environ.setdefault(key, str(value))
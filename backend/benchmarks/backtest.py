@@ -0,0 +1,124 @@
+"""
+Policy backtest
+
+Replays a tenant's past intents under its current policy and under the
+given changes, and prints the decisions that would flip. Reads the
+database in SUPABASE_URL / SUPABASE_SERVICE_KEY (read only):
+
+    python -m benchmarks.backtest --changes '{"max_tx_amount": 500}' [--user-id UUID] [--days 90]
+
+With --synthetic N it replays N generated activities instead, without a
+database; the rows are produced page by page, so it also measures
+throughput and shows memory staying flat as N grows:
+
+    python -m benchmarks.backtest --synthetic 1000000 --changes '{"rules": [{"type": "velocity", "max_transactions": 20}]}'
+"""
+import argparse
+import asyncio
+import json
+import resource
+import sys
+from datetime import datetime, timedelta, timezone
+
+RECIPIENTS = ["Stripe", "Amazon Web Services", "Acme Payroll Ltd", "Circle", "Unknown Vendor 42", "Shady Co", "AWS"]
+STATUSES = ["executed", "executed", "executed", "denied", "flagged_by_policy", "pending_approval"]
+
+SYNTHETIC_POLICY = {
+    "id": "backtest-synthetic",
+    "version": 1,
+    "max_tx_amount": 1000,
+    "required_approval_threshold": 500,
+    "allow_list": ["Stripe", "Amazon", "Circle", "Acme Payroll"],
+    "block_list": ["Shady Co"],
+    "vendor_aliases": {"Amazon": ["AWS", "Amazon Web Services"]},
+}
+
+
+class SyntheticHistory:
+    """
+    Deterministic stand-in for list_activities over `count` generated rows
+
+    Row i is derived from i alone, so any page can be rebuilt from the
+    keyset cursor and nothing is kept between pages.
+    """
+
+    def __init__(self, count: int, start: datetime, step: timedelta):
+        self.count = count
+        self.start = start
+        self.step = step
+
+    def row(self, i: int) -> dict:
+        return {
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "created_at": (self.start + self.step * i).isoformat(),
+            "status": STATUSES[i % len(STATUSES)],
+            "structured_intent": {
+                "amount": 20 + (i * 7919) % 1200,
+                "currency": "USDC",
+                "recipientName": RECIPIENTS[(i * 31) % len(RECIPIENTS)],
+            },
+        }
+
+    async def list_activities(self, limit: int = 50, after=None, oldest_first: bool = False, **_) -> list:
+        first = int(after[1].rsplit('-', 1)[1]) + 1 if after else 0
+        return [self.row(i) for i in range(first, min(first + limit, self.count))]
+
+
+async def run(args) -> int:
+    from app.services.policy_simulator import PolicySimulator
+
+    changes = json.loads(args.changes)
+    if args.synthetic:
+        # Spread the rows over the window, oldest first
+        days = args.days or 90
+        start = datetime.now(timezone.utc) - timedelta(days=days)
+        repository = SyntheticHistory(args.synthetic, start, timedelta(days=days) / max(args.synthetic, 1))
+        # Budgets that bind on the busier days, whatever the row count
+        daily_budget = round(300 * args.synthetic / days, 2)
+        current_policy = {**SYNTHETIC_POLICY, "daily_budget": daily_budget, "monthly_budget": daily_budget * 25}
+    else:
+        from app.database import get_repository
+        repository = get_repository()
+        current_policy = await repository.get_current_policy(args.user_id)
+        if not current_policy:
+            print("No policy found for this tenant")
+            return 1
+
+    from app.routers.policies import PolicyUpdate
+    candidate = {**current_policy, **PolicyUpdate(**changes).model_dump(exclude_none=True), "id": None, "version": None}
+    since = datetime.now(timezone.utc) - timedelta(days=args.days) if args.days else None
+
+    simulator = PolicySimulator(args.workers, args.chunk_size, args.max_in_flight or args.workers * 2)
+    try:
+        report = await simulator.run(current_policy, candidate, args.user_id, since, repository=repository)
+    finally:
+        simulator.shutdown()
+
+    print(json.dumps(report, indent=2))
+    rows_per_second = report["activities"] / report["seconds"] if report["seconds"] else 0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{report['activities']} activities in {report['seconds']:.2f}s ({rows_per_second:,.0f}/s), peak RSS {peak_mb:.0f} MB", file=sys.stderr)
+    return 0
+
+
+def main():
+    import os
+    from benchmarks import use_dummy_settings
+
+    parser = argparse.ArgumentParser(description="Backtest policy changes against past intents")
+    parser.add_argument("--changes", default="{}", help="PUT /api/policy body as JSON")
+    parser.add_argument("--user-id", default=None, help="Tenant to replay; the default tenant when omitted")
+    parser.add_argument("--days", type=int, default=None, help="Only the last N days; all history when omitted")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Chunks read ahead; twice the workers when omitted")
+    parser.add_argument("--synthetic", type=int, default=0, help="Replay N generated activities instead of the database")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        use_dummy_settings()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+CircleWrapper throughput and tail latency against the fake Circle API
+
+Runs the fake server in-process (no sockets) and drives create_transfer
+at a fixed concurrency, reporting throughput, latency percentiles,
+retries and duplicate transfers.
+
+    python -m benchmarks.bench_circle --transfers 2000 --concurrency 64 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import time
+from benchmarks import use_dummy_settings
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+async def run(args):
+    import httpx
+    from app.services.circle_wrapper import CircleWrapper
+    from benchmarks.fake_circle import create_app
+
+    fake = create_app(args.latency_ms, args.jitter_ms, args.error_rate)
+    wrapper = CircleWrapper(transport=httpx.ASGITransport(app=fake))
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    failures = 0
+
+    async def one(i):
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await wrapper.create_transfer(10.0, f"0xbench{i:06d}", idempotency_key=f"bench-{i}")
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.transfers)))
+    elapsed = time.perf_counter() - started
+    await wrapper.aclose()
+
+    latencies.sort()
+    stats = fake.state.stats
+    print(f"transfers:     {args.transfers} at concurrency {args.concurrency}")
+    print(f"throughput:    {args.transfers / elapsed:.1f} transfers/s")
+    print(f"latency p50:   {percentile(latencies, 0.50) * 1000:.1f} ms")
+    print(f"latency p95:   {percentile(latencies, 0.95) * 1000:.1f} ms")
+    print(f"latency p99:   {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"failures:      {failures}")
+    print(f"retries:       {wrapper.retries} (injected errors: {stats['errors']})")
+    print(f"created:       {stats['created']} (idempotent replays: {stats['replayed']})")
+    print(f"breaker:       {wrapper.breaker.state}, opened {wrapper.breaker.times_opened}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CircleWrapper benchmark against the fake Circle API")
+    parser.add_argument("--transfers", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    use_dummy_settings(CIRCLE_MOCK="false", CIRCLE_BASE_URL="http://fake-circle", CIRCLE_MAX_CONCURRENCY=args.concurrency)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Worker boot time benchmark
+
+Starts fresh interpreters that import app.main, the work every uvicorn or
+gunicorn worker and every serverless cold start repeats. `lazy` is the
+import alone, which now reads no settings and builds no clients. `eager`
+also builds what warm-up builds (settings, PostgREST client, Gemini model,
+Circle client, caches), which is what importing the app used to do. Each
+level starts that many workers at once, like a process manager spawning
+its pool on a shared machine.
+
+    python -m benchmarks.bench_import [--workers 1,4,8] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import sys, time
+started = time.perf_counter()
+import app.main
+if sys.argv[1] == 'eager':
+    from benchmarks import use_dummy_settings
+    use_dummy_settings()
+    for build in app.main.WARM_UP:
+        build()
+print(time.perf_counter() - started, 'google.generativeai' in sys.modules)
+"""
+
+
+def boot(mode: str, workers: int) -> tuple:
+    """
+    Start `workers` interpreters at once; returns (wall seconds, per-worker seconds, Gemini SDK loaded)
+    """
+    env = {**os.environ, "PYTHONPATH": str(BACKEND)}
+    started = time.perf_counter()
+    processes = [
+        subprocess.Popen([sys.executable, "-c", CHILD, mode], cwd=BACKEND, env=env, stdout=subprocess.PIPE, text=True)
+        for _ in range(workers)
+    ]
+    outputs = [process.communicate()[0].split() for process in processes]
+    wall = time.perf_counter() - started
+    if any(process.returncode for process in processes):
+        raise RuntimeError(f"{mode} worker failed to import app.main")
+    return wall, [float(seconds) for seconds, _ in outputs], outputs[0][1] == 'True'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", default="1,4,8", help="Comma-separated worker counts started together")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # Warm the OS file cache and bytecode so every mode starts equal
+    boot("eager", 1)
+
+    print(f"{'mode':>6} {'workers':>8} {'import p50 ms':>14} {'all ready ms':>13} {'gemini sdk':>11}")
+    for workers in (int(w) for w in args.workers.split(',')):
+        for mode in ("eager", "lazy"):
+            walls, imports, loaded = [], [], False
+            for _ in range(args.runs):
+                wall, per_worker, loaded = boot(mode, workers)
+                walls.append(wall)
+                imports.extend(per_worker)
+            print(f"{mode:>6} {workers:>8} {statistics.median(imports) * 1000:>14.0f} "
+                  f"{statistics.median(walls) * 1000:>13.0f} {'loaded' if loaded else 'deferred':>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Intent prompt size benchmark
+
+Compares the per-call prompt of the previous inline f-string (full allow
+list plus two few-shot examples) with PromptBuilder output as the allow
+list grows. Tokens are estimated at four characters per token; live counts
+are reported under `gemini` on /health.
+
+    python -m benchmarks.bench_prompt
+"""
+import argparse
+import random
+import time
+from app.services.prompt_builder import PromptBuilder, SYSTEM_INSTRUCTION
+from benchmarks.bench_vendor_matcher import make_policy
+
+QUERIES = [
+    "Send $50 to Stripe",
+    "pay amazon web services for last month's hosting, around 320 dollars",
+    "reimburse the acme payroll contractor 1.2k",
+    "tip the coffee place downstairs 5 bucks",
+]
+
+
+def legacy_prompt(query: str, policy: dict) -> str:
+    return f"""You are a financial AI assistant analyzing transaction requests.
+
+Current Policy Limits:
+- Max Transaction: ${policy.get('max_tx_amount', 1000)}
+- Monthly Budget: ${policy.get('monthly_budget', 5000)}
+- Current Monthly Spent: ${policy.get('current_monthly_spent', 0)}
+- Approved Vendors: {', '.join(policy.get('allow_list', []))}
+
+User Query: "{query}"
+
+Extract the following information in JSON format:
+1. amount: The transaction amount (number, no currency symbol)
+2. currency: The currency (default: "USDC")
+3. recipient: Generate a mock blockchain address or use vendor name
+4. recipientName: The vendor/merchant name (e.g., "Stripe", "Circle")
+5. reasoning: A brief explanation (2-3 sentences) of why this transaction is or isn't safe based on policy limits
+
+If the query is not a transaction request, return null for amount.
+
+Examples:
+Query: "Send $50 to Stripe"
+Response: {{"amount": 50, "currency": "USDC", "recipient": "0x1234abcd", "recipientName": "Stripe", "reasoning": "This $50 payment to Stripe is well within your $1,000 transaction limit and Stripe is on your approved vendor list. The transaction is safe to proceed."}}
+
+Query: "Pay the dev $1500"
+Response: {{"amount": 1500, "currency": "USDC", "recipient": "0x5678ef90",  "recipientName": "dev", "reasoning": "This $1,500 payment exceeds your maximum transaction limit of $1,000. This violates your policy and should be flagged for review."}}
+
+Respond ONLY with valid JSON, no additional text.
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="Comma-separated allow-list sizes")
+    parser.add_argument("--max-vendors", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    builder = PromptBuilder(args.max_vendors)
+    system_tokens = len(SYSTEM_INSTRUCTION) // 4
+
+    print(f"system instruction: ~{system_tokens} tokens per call")
+    print(f"{'vendors':>8} {'legacy tokens':>14} {'new tokens':>11} {'build us':>9}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        policy = make_policy(size, rng)
+        legacy = sum(len(legacy_prompt(q, policy)) for q in QUERIES) / len(QUERIES) / 4
+
+        builder.build(QUERIES[0], policy)  # compile the matcher outside the timing
+        started = time.perf_counter_ns()
+        current = sum(len(builder.build(q, policy)) for q in QUERIES) / len(QUERIES) / 4
+        build_us = (time.perf_counter_ns() - started) / len(QUERIES) / 1000
+
+        print(f"{size:>8} {legacy:>14,.0f} {current + system_tokens:>11,.0f} {build_us:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Rule parser coverage and latency benchmark
+
+Measures the share of queries the deterministic parser answers without
+Gemini (confidence at or above the threshold) and its per-query latency.
+
+    python -m benchmarks.bench_rule_parser
+    python -m benchmarks.bench_rule_parser --queries queries.txt --threshold 0.85
+
+`--queries` takes one query per line, e.g. an export of
+`agent_activities.user_query`, to measure coverage on real traffic.
+"""
+import argparse
+import statistics
+import time
+from app.services import rule_parser
+
+POLICY = {
+    "max_tx_amount": 1000,
+    "monthly_budget": 5000,
+    "current_monthly_spent": 0,
+    "allow_list": ["Stripe", "Circle", "Amazon", "Amazon Web Services", "GitHub", "Figma", "Notion"],
+    "block_list": ["Shady Co"],
+}
+
+SAMPLE_QUERIES = [
+    "Send $50 to Stripe",
+    "pay amazon 20",
+    "Pay the dev $1500",
+    "Transfer $1,250.00 to Amazon Web Services",
+    "send 30 usdc to Bob Smith for lunch",
+    "Pay GitHub $21 for the team plan",
+    "wire 2k to circle",
+    "USD 75 to Notion",
+    "send €40 to Maria",
+    "Can you pay Figma 45 dollars",
+    "reimburse Alex $12.50 for coffee",
+    "pay stripe invoice 349.99",
+    "Send 100 to shady co",
+    "tip the designer 25 bucks",
+    "What is my remaining budget?",
+    "How much did I spend in 2024?",
+    "Send money to Stripe",
+    "pay 20 and 30 to amazon",
+    "transfer 500 usdc to 0xabc123",
+    "hello",
+]
+
+
+def load_queries(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", help="File with one query per line (default: built-in sample)")
+    parser.add_argument("--threshold", type=float, default=0.85, help="Confidence needed to skip Gemini")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed passes over the query set")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else SAMPLE_QUERIES
+
+    # Warm the compiled vendor pattern cache
+    for query in queries:
+        rule_parser.parse(query, POLICY)
+
+    handled = 0
+    parsed_low = 0
+    for query in queries:
+        result = rule_parser.parse(query, POLICY)
+        if result and result["confidence"] >= args.threshold:
+            handled += 1
+        elif result:
+            parsed_low += 1
+
+    timings = []
+    for _ in range(args.iterations):
+        for query in queries:
+            started = time.perf_counter_ns()
+            rule_parser.parse(query, POLICY)
+            timings.append(time.perf_counter_ns() - started)
+
+    timings.sort()
+    total = len(queries)
+    print(f"queries:            {total}")
+    print(f"handled (>= {args.threshold:.2f}):  {handled} ({handled / total:.1%})")
+    print(f"parsed below thr.:  {parsed_low} ({parsed_low / total:.1%}) -> Gemini")
+    print(f"unparsed:           {total - handled - parsed_low} ({(total - handled - parsed_low) / total:.1%}) -> Gemini")
+    print(f"latency mean:       {statistics.fmean(timings) / 1000:.1f} us")
+    print(f"latency p50:        {timings[len(timings) // 2] / 1000:.1f} us")
+    print(f"latency p99:        {timings[int(len(timings) * 0.99)] / 1000:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Vendor matching microbenchmark
+
+Times PolicyValidator.validate against policies whose allow/block lists
+grow from tens to tens of thousands of vendors, next to the previous
+linear `any(vendor.lower() in name.lower() ...)` scan.
+
+    python -m benchmarks.bench_vendor_matcher
+"""
+import argparse
+import random
+import string
+import time
+from app.services.policy_validator import policy_validator
+from app.services.vendor_matcher import get_matcher
+
+RECIPIENTS = ["Stripe", "Amazon Web Services", "acme payroll ltd", "Unknown Vendor 42", "shady co"]
+
+
+def random_vendor(rng: random.Random) -> str:
+    words = rng.randint(1, 3)
+    return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))).title() for _ in range(words))
+
+
+def make_policy(size: int, rng: random.Random) -> dict:
+    allow_list = [random_vendor(rng) for _ in range(size)] + ["Stripe", "Amazon Web Services", "Acme Payroll"]
+    block_list = [random_vendor(rng) for _ in range(size // 10)] + ["Shady Co"]
+    return {
+        "id": f"bench-{size}",
+        "version": 1,
+        "max_tx_amount": 1000,
+        "monthly_budget": 5000,
+        "current_monthly_spent": 0,
+        "allow_list": allow_list,
+        "block_list": block_list,
+    }
+
+
+def legacy_lists(recipient_name: str, policy: dict):
+    allow = any(v.lower() in recipient_name.lower() for v in policy["allow_list"])
+    block = any(v.lower() in recipient_name.lower() for v in policy["block_list"])
+    return allow, block
+
+
+def time_per_call(fn, iterations: int) -> float:
+    started = time.perf_counter_ns()
+    for i in range(iterations):
+        fn(RECIPIENTS[i % len(RECIPIENTS)])
+    return (time.perf_counter_ns() - started) / iterations / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vendor matching microbenchmark")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="Comma-separated allow-list sizes")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'vendors':>8} {'compile ms':>11} {'validate us':>12} {'legacy scan us':>15}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        policy = make_policy(size, rng)
+
+        started = time.perf_counter()
+        get_matcher(policy)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        intent = {"amount": 50}
+        validate_us = time_per_call(
+            lambda name: policy_validator.validate({**intent, "recipientName": name}, policy),
+            args.iterations
+        )
+        legacy_us = time_per_call(lambda name: legacy_lists(name, policy), max(args.iterations // max(size // 1000, 1), 50))
+        print(f"{size:>8} {compile_ms:>11.1f} {validate_us:>12.1f} {legacy_us:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Local stand-in for the Circle transfers API
+
+Implements POST /v1/transfers (idempotent on idempotencyKey), the paged
+GET /v1/transfers list and GET /v1/transfers/{id} with configurable latency, error injection and
+confirmation delay, so CircleWrapper can be exercised without the network.
+
+    python -m benchmarks.fake_circle --port 8900 --latency-ms 80 --error-rate 0.05
+    CIRCLE_MOCK=false CIRCLE_BASE_URL=http://127.0.0.1:8900 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency_ms: float = 50, jitter_ms: float = 20, error_rate: float = 0.0, confirm_after: float = 2.0) -> FastAPI:
+    app = FastAPI(title="Fake Circle")
+    transfers = {}
+    by_key = {}
+    app.state.stats = {"requests": 0, "errors": 0, "created": 0, "replayed": 0}
+
+    async def simulate():
+        app.state.stats["requests"] += 1
+        await asyncio.sleep(max(latency_ms + random.uniform(-jitter_ms, jitter_ms), 0) / 1000)
+        if random.random() < error_rate:
+            app.state.stats["errors"] += 1
+            return JSONResponse(status_code=503, content={"code": 503, "message": "Injected failure"})
+        return None
+
+    def view(transfer: dict) -> dict:
+        complete = time.monotonic() - transfer["created"] >= confirm_after
+        return {
+            **{k: v for k, v in transfer.items() if k not in ("created", "created_at")},
+            "status": "complete" if complete else "pending",
+            "transactionHash": transfer["transactionHash"] if complete else None,
+            "confirmations": 12 if complete else 0,
+        }
+
+    @app.post("/v1/transfers")
+    async def create_transfer(request: Request):
+        failure = await simulate()
+        if failure:
+            return failure
+
+        body = await request.json()
+        key = body.get("idempotencyKey")
+        if not key:
+            return JSONResponse(status_code=400, content={"code": 2, "message": "idempotencyKey is required"})
+
+        if key in by_key:
+            app.state.stats["replayed"] += 1
+            return {"data": view(transfers[by_key[key]])}
+
+        transfer_id = str(uuid.uuid4())
+        transfers[transfer_id] = {
+            "id": transfer_id,
+            "source": body.get("source"),
+            "destination": body.get("destination"),
+            "amount": body.get("amount"),
+            "transactionHash": "0x" + hashlib.sha256(transfer_id.encode()).hexdigest(),
+            "createDate": datetime.now(timezone.utc).isoformat(),
+            "created": time.monotonic(),
+            "created_at": datetime.now(timezone.utc),
+        }
+        by_key[key] = transfer_id
+        app.state.stats["created"] += 1
+        return JSONResponse(status_code=201, content={"data": view(transfers[transfer_id])})
+
+    @app.get("/v1/transfers")
+    async def list_transfers(request: Request):
+        # Newest first; pageAfter is the exclusive start, as in Circle's API
+        failure = await simulate()
+        if failure:
+            return failure
+
+        params = request.query_params
+        page_size = min(int(params.get("pageSize", 10)), 50)
+        items = sorted(transfers.values(), key=lambda t: t["created_at"], reverse=True)
+        if params.get("from"):
+            since = datetime.fromisoformat(params["from"].replace("Z", "+00:00"))
+            items = [t for t in items if t["created_at"] >= since]
+        if params.get("to"):
+            until = datetime.fromisoformat(params["to"].replace("Z", "+00:00"))
+            items = [t for t in items if t["created_at"] <= until]
+        if params.get("pageAfter"):
+            ids = [t["id"] for t in items]
+            if params["pageAfter"] in ids:
+                items = items[ids.index(params["pageAfter"]) + 1:]
+        return {"data": [view(t) for t in items[:page_size]]}
+
+    @app.get("/v1/transfers/{transfer_id}")
+    async def get_transfer(transfer_id: str):
+        failure = await simulate()
+        if failure:
+            return failure
+        if transfer_id not in transfers:
+            return JSONResponse(status_code=404, content={"code": 404, "message": "Not found"})
+        return {"data": view(transfers[transfer_id])}
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Circle transfers API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--confirm-after", type=float, default=2.0, help="Seconds until a transfer is complete")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.confirm_after),
+        host=args.host,
+        port=args.port,
+        log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
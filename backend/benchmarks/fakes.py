@@ -0,0 +1,531 @@
+"""
+In-process stand-ins for Supabase/PostgREST and Gemini
+
+FakeRepository implements the Repository methods the app calls, with the
+same semantics as the SQL functions in frontend/supabase/schema.sql
+(claim/release, bulk transaction updates, the spend ledger), held in memory. FakeGeminiModel
+answers like Gemini in JSON mode. Both take a latency, jitter and error
+rate so load tests can model slow or flaky dependencies; Circle is covered
+by benchmarks.fake_circle.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import List, Optional, Tuple
+
+POLICY_RULE_FIELDS = ('max_tx_amount', 'daily_budget', 'monthly_budget', 'required_approval_threshold', 'allow_list', 'block_list', 'vendor_aliases', 'rules')
+
+
+class InjectedFailure(Exception):
+    pass
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeRepository:
+    """
+    Memory-backed Repository with latency and error injection per call
+    """
+
+    def __init__(self, latency_ms: float = 5, jitter_ms: float = 2, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.policies: List[dict] = []
+        self.activities: dict = {}
+        self.transactions: dict = {}
+        self.ledger: List[dict] = []
+        # (user_id, period, bucket_start) -> spent, like spend_buckets
+        self.buckets: dict = {}
+        # Same keys -> activities with spend reserved, like spend_buckets.transactions
+        self.bucket_transactions: dict = {}
+        # Row locks taken by the SQL functions are a single lock here
+        self._lock = asyncio.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    async def _roundtrip(self):
+        self.calls += 1
+        await asyncio.sleep(max(self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000)
+        if random.random() < self.error_rate:
+            self.errors += 1
+            raise InjectedFailure("Injected database failure")
+
+    # Policies
+
+    def _active_policy(self, user_id: Optional[str]) -> Optional[dict]:
+        return next((row for row in self.policies if row['user_id'] == user_id and row['is_active']), None)
+
+    @staticmethod
+    def _velocity_limit(policy: dict) -> Optional[int]:
+        limits = [int(rule['max_transactions']) for rule in policy.get('rules') or [] if rule.get('type') == 'velocity']
+        return min(limits) if limits else None
+
+    async def get_current_policy(self, user_id: Optional[str] = None) -> Optional[dict]:
+        await self._roundtrip()
+        policy = self._active_policy(user_id)
+        return {**policy, **self._spend_window(user_id)} if policy else None
+
+    async def insert_policy(self, policy: dict, user_id: Optional[str] = None) -> Optional[dict]:
+        await self._roundtrip()
+        previous = self._active_policy(user_id)
+        if previous:
+            previous['is_active'] = False
+        row = {
+            'id': str(uuid.uuid4()), 'version': 1, 'current_monthly_spent': 0, 'daily_budget': 5000,
+            'required_approval_threshold': 500, 'allow_list': [], 'block_list': [], 'vendor_aliases': {}, 'rules': [],
+            'created_at': now(), **policy, 'user_id': user_id, 'is_active': True
+        }
+        self.policies.append(row)
+        return dict(row)
+
+    async def update_policy(self, policy_id: str, updates: dict) -> Optional[dict]:
+        await self._roundtrip()
+        for row in self.policies:
+            if row['id'] == policy_id:
+                if any(field in updates and updates[field] != row.get(field) for field in POLICY_RULE_FIELDS):
+                    row['version'] += 1
+                row.update(updates)
+                return dict(row)
+        return None
+
+    # Spend ledger
+
+    @staticmethod
+    def _bucket_starts(spent_at: str) -> Tuple[str, str]:
+        day = datetime.fromisoformat(spent_at).astimezone(timezone.utc).date()
+        return day.isoformat(), day.replace(day=1).isoformat()
+
+    def _spend_window(self, user_id: Optional[str]) -> dict:
+        day, month = self._bucket_starts(now())
+        return {
+            'current_daily_spent': self.buckets.get((user_id, 'day', day), 0),
+            'current_monthly_spent': self.buckets.get((user_id, 'month', month), 0),
+            'current_daily_transactions': self.bucket_transactions.get((user_id, 'day', day), 0)
+        }
+
+    def _add_entry(self, user_id: Optional[str], activity_id: str, amount: float, spent_at: Optional[str] = None):
+        entry = {'id': len(self.ledger) + 1, 'user_id': user_id, 'activity_id': activity_id, 'amount': amount, 'spent_at': spent_at or now()}
+        self.ledger.append(entry)
+        net = sum(other['amount'] for other in self.ledger if other['activity_id'] == activity_id)
+        transactions = 1 if net > 0 >= net - amount else -1 if net <= 0 < net - amount else 0
+        day, month = self._bucket_starts(entry['spent_at'])
+        for key in ((user_id, 'day', day), (user_id, 'month', month)):
+            self.buckets[key] = self.buckets.get(key, 0) + amount
+            self.bucket_transactions[key] = self.bucket_transactions.get(key, 0) + transactions
+        self._mirror_monthly_spent(user_id)
+
+    def _mirror_monthly_spent(self, user_id: Optional[str]):
+        policy = self._active_policy(user_id)
+        if policy:
+            policy['current_monthly_spent'] = self._spend_window(user_id)['current_monthly_spent']
+
+    def _refund(self, activity_id: str, amount: Optional[float] = None):
+        entries = [entry for entry in self.ledger if entry['activity_id'] == activity_id]
+        outstanding = sum(entry['amount'] for entry in entries)
+        if outstanding <= 0:
+            return
+        reserved_at = min(entry['spent_at'] for entry in entries if entry['amount'] > 0)
+        refund = outstanding if amount is None else min(amount, outstanding)
+        self._add_entry(entries[0]['user_id'], activity_id, -refund, reserved_at)
+
+    async def reconcile_spend(self, since: Optional[datetime] = None) -> dict:
+        await self._roundtrip()
+        async with self._lock:
+            start = (since or datetime.now(timezone.utc) - timedelta(days=31)).astimezone(timezone.utc)
+            start = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            reserved = released = 0
+
+            for activity_id in {tx['activity_id'] for tx in self.transactions.values()}:
+                live = [tx for tx in self.transactions.values() if tx['activity_id'] == activity_id and tx['status'] != 'failed']
+                entries = [entry for entry in self.ledger if entry['activity_id'] == activity_id]
+                if live and not entries and min(tx['created_at'] for tx in live) >= start.isoformat():
+                    owner = self.activities.get(activity_id, {}).get('user_id')
+                    self._add_entry(owner, activity_id, sum(float(tx['amount']) for tx in live), min(tx['created_at'] for tx in live))
+                    reserved += 1
+
+            for activity_id in {entry['activity_id'] for entry in self.ledger}:
+                row = self.activities.get(activity_id)
+                if row is None or row.get('locked') or row['status'] not in ('pending_approval', 'flagged_by_policy', 'rejected', 'failed'):
+                    continue
+                if any(tx['activity_id'] == activity_id and tx['status'] != 'failed' for tx in self.transactions.values()):
+                    continue
+                if sum(entry['amount'] for entry in self.ledger if entry['activity_id'] == activity_id) > 0:
+                    self._refund(activity_id)
+                    released += 1
+
+            first_day = start.date().isoformat()
+            self.buckets = {key: spent for key, spent in self.buckets.items() if key[2] < first_day}
+            self.bucket_transactions = {key: count for key, count in self.bucket_transactions.items() if key[2] < first_day}
+            activity_days = {}
+            for entry in self.ledger:
+                if entry['spent_at'] < start.isoformat():
+                    continue
+                day, month = self._bucket_starts(entry['spent_at'])
+                for key in ((entry['user_id'], 'day', day), (entry['user_id'], 'month', month)):
+                    self.buckets[key] = self.buckets.get(key, 0) + entry['amount']
+                    activity_days[key, entry['activity_id']] = activity_days.get((key, entry['activity_id']), 0) + entry['amount']
+            for (key, activity_id), net in activity_days.items():
+                if activity_id is not None and net > 0:
+                    self.bucket_transactions[key] = self.bucket_transactions.get(key, 0) + 1
+            for policy in self.policies:
+                if policy['is_active']:
+                    self._mirror_monthly_spent(policy['user_id'])
+
+            return {'since': start.isoformat(), 'reserved': reserved, 'released': released, 'buckets': len(self.buckets), 'policies': len(self.policies)}
+
+    # Activities
+
+    async def get_activity(self, activity_id: str, user_id: Optional[str] = None, with_transactions: bool = False) -> Optional[dict]:
+        await self._roundtrip()
+        row = self.activities.get(activity_id)
+        if row is None or row.get('user_id') != user_id:
+            return None
+        row = dict(row)
+        if with_transactions:
+            row['transactions'] = [dict(tx) for tx in self.transactions.values() if tx['activity_id'] == activity_id]
+        return row
+
+    async def get_activities(self, activity_ids: List[str], user_id: Optional[str] = None, columns=None) -> List[dict]:
+        await self._roundtrip()
+        rows = (self.activities.get(activity_id) for activity_id in dict.fromkeys(activity_ids))
+        return [dict(row) for row in rows if row is not None and row.get('user_id') == user_id]
+
+    async def list_activities(self, limit: int = 50, after: Optional[Tuple[str, str]] = None, statuses=None, user_id=None,
+                              created_after=None, created_before=None, columns=None, with_transactions: bool = False,
+                              oldest_first: bool = False) -> List[dict]:
+        await self._roundtrip()
+        rows = [
+            row for row in self.activities.values()
+            if (not statuses or row['status'] in statuses)
+            and row.get('user_id') == user_id
+            and (not created_after or row['created_at'] >= created_after.isoformat())
+            and (not created_before or row['created_at'] < created_before.isoformat())
+            and (not after or ((row['created_at'], row['id']) > tuple(after) if oldest_first else (row['created_at'], row['id']) < tuple(after)))
+        ]
+        rows.sort(key=lambda row: (row['created_at'], row['id']), reverse=not oldest_first)
+        return [dict(row) for row in rows[:limit]]
+
+    async def get_activity_stats(self, user_id: Optional[str] = None, days: int = 30, vendors: int = 10) -> dict:
+        # Computed on the fly; the database keeps the same numbers in rollup tables
+        await self._roundtrip()
+        rows = [row for row in self.activities.values() if row.get('user_id') == user_id]
+        by_status = Counter(row['status'] for row in rows)
+
+        totals: dict = {}
+        for row in rows:
+            intent = row.get('structured_intent') or {}
+            name = (intent.get('recipientName') or '').strip()
+            if not name:
+                continue
+            total = totals.setdefault(name.lower(), {'vendor': name, 'activities': 0, 'requested': 0, 'spent': 0})
+            total['activities'] += 1
+            total['requested'] += float(intent.get('amount') or 0)
+            total['spent'] += sum(entry['amount'] for entry in self.ledger if entry['activity_id'] == row['id'])
+
+        first_day = (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+        daily = sorted(
+            (start, spent) for (owner, period, start), spent in self.buckets.items()
+            if owner == user_id and period == 'day' and start >= first_day
+        )
+        return {
+            'by_status': dict(by_status),
+            'daily_spend': [{'day': day, 'spent': spent} for day, spent in daily],
+            'spend': self._spend_window(user_id),
+            'vendors': sorted(totals.values(), key=lambda total: (total['spent'], total['requested']), reverse=True)[:vendors]
+        }
+
+    def _new_activity(self, activity: dict) -> dict:
+        row = {'id': str(uuid.uuid4()), 'user_id': None, 'locked': False, 'locked_at': None, 'created_at': now(), 'updated_at': now(), **activity}
+        self.activities[row['id']] = row
+        return dict(row)
+
+    async def insert_activity(self, activity: dict) -> Optional[dict]:
+        await self._roundtrip()
+        return self._new_activity(activity)
+
+    async def insert_activities(self, activities: List[dict]) -> List[dict]:
+        await self._roundtrip()
+        return [self._new_activity(activity) for activity in activities]
+
+    async def update_activity(self, activity_id: str, updates: dict) -> Optional[dict]:
+        await self._roundtrip()
+        row = self.activities.get(activity_id)
+        if row is None:
+            return None
+        row.update(updates, updated_at=now())
+        return dict(row)
+
+    async def claim_activity(self, activity_id: str, user_id: Optional[str] = None) -> dict:
+        await self._roundtrip()
+        async with self._lock:
+            row = self.activities.get(activity_id)
+            if row is None or row.get('user_id') != user_id:
+                return {'outcome': 'not_found'}
+            if row.get('locked'):
+                return {'outcome': 'locked', 'activity': dict(row)}
+            if row['status'] not in ('pending_approval', 'flagged_by_policy'):
+                return {'outcome': 'invalid_status', 'activity': dict(row)}
+
+            row.update(locked=True, locked_at=now(), status='executing')
+            amount = float((row.get('structured_intent') or {}).get('amount') or 0)
+            policy = self._active_policy(user_id)
+            if policy is None:
+                return {'outcome': 'claimed', 'activity': dict(row), 'policy': None, 'amount': amount}
+
+            snapshot = {**policy, **self._spend_window(user_id)}
+            if (amount > policy['max_tx_amount']
+                    or snapshot['current_monthly_spent'] + amount > policy['monthly_budget']
+                    or snapshot['current_daily_spent'] + amount > policy['daily_budget']
+                    or snapshot['current_daily_transactions'] >= (self._velocity_limit(policy) or float('inf'))):
+                row.update(status='flagged_by_policy', locked=False)
+                return {'outcome': 'over_budget', 'activity': dict(row), 'policy': snapshot, 'amount': amount}
+
+            if amount > 0:
+                self._add_entry(user_id, activity_id, amount)
+            return {'outcome': 'claimed', 'activity': dict(row), 'policy': snapshot, 'amount': amount}
+
+    async def release_activity(self, activity_id: str, status: str, policy_id: Optional[str], refund: float):
+        await self._roundtrip()
+        async with self._lock:
+            if activity_id in self.activities:
+                self.activities[activity_id].update(status=status, locked=False)
+            if policy_id is not None and refund > 0:
+                self._refund(activity_id, refund)
+
+    async def claim_activities(self, activity_ids: List[str], user_id: Optional[str] = None,
+                               rejected: Optional[List[str]] = None) -> dict:
+        await self._roundtrip()
+        async with self._lock:
+            policy = self._active_policy(user_id)
+            snapshot = {**policy, **self._spend_window(user_id)} if policy else None
+            monthly = snapshot['current_monthly_spent'] if snapshot else 0.0
+            daily = snapshot['current_daily_spent'] if snapshot else 0.0
+            transactions = snapshot['current_daily_transactions'] if snapshot else 0
+            max_transactions = (self._velocity_limit(policy) if policy else None) or float('inf')
+            rejected = set(rejected or [])
+            results = []
+            for activity_id in activity_ids:
+                row = self.activities.get(activity_id)
+                if row is None or row.get('user_id') != user_id:
+                    results.append({'id': activity_id, 'outcome': 'not_found'})
+                    continue
+                if row.get('locked'):
+                    results.append({'id': activity_id, 'outcome': 'locked', 'activity': dict(row)})
+                    continue
+                if row['status'] not in ('pending_approval', 'flagged_by_policy'):
+                    results.append({'id': activity_id, 'outcome': 'invalid_status', 'activity': dict(row)})
+                    continue
+
+                amount = float((row.get('structured_intent') or {}).get('amount') or 0)
+                if activity_id in rejected or snapshot and (amount > policy['max_tx_amount']
+                                                            or monthly + amount > policy['monthly_budget']
+                                                            or daily + amount > policy['daily_budget']
+                                                            or transactions >= max_transactions):
+                    row.update(status='flagged_by_policy', locked=False)
+                    outcome = 'rejected' if activity_id in rejected else 'over_budget'
+                    results.append({'id': activity_id, 'outcome': outcome, 'activity': dict(row), 'amount': amount})
+                    continue
+
+                row.update(locked=True, locked_at=now(), status='executing')
+                if snapshot and amount > 0:
+                    monthly += amount
+                    daily += amount
+                    transactions += 1
+                    self._add_entry(user_id, activity_id, amount)
+                results.append({'id': activity_id, 'outcome': 'claimed', 'activity': dict(row), 'amount': amount})
+            return {'policy': snapshot, 'results': results}
+
+    async def settle_activities(self, updates: List[dict]) -> int:
+        await self._roundtrip()
+        async with self._lock:
+            settled = 0
+            for update in updates:
+                if update['id'] in self.activities:
+                    self.activities[update['id']].update(status=update['status'], locked=False, updated_at=now())
+                    settled += 1
+                if update.get('refund', 0) > 0:
+                    self._refund(update['id'], update['refund'])
+            return settled
+
+    async def deny_activities(self, activity_ids: List[str], user_id: Optional[str] = None) -> List[dict]:
+        await self._roundtrip()
+        results = []
+        for activity_id in activity_ids:
+            row = self.activities.get(activity_id)
+            if row is None or row.get('user_id') != user_id:
+                results.append({'id': activity_id, 'outcome': 'not_found', 'status': None})
+            elif row.get('locked'):
+                results.append({'id': activity_id, 'outcome': 'locked', 'status': row['status']})
+            elif row['status'] not in ('pending_approval', 'flagged_by_policy'):
+                results.append({'id': activity_id, 'outcome': 'invalid_status', 'status': row['status']})
+            else:
+                row.update(status='rejected', updated_at=now())
+                results.append({'id': activity_id, 'outcome': 'rejected', 'status': 'rejected'})
+        return results
+
+    # Transactions
+
+    async def recover_stale_activities(self, stale_seconds: float, limit: int = 100) -> dict:
+        await self._roundtrip()
+        async with self._lock:
+            cutoff = (datetime.now(timezone.utc) - timedelta(seconds=stale_seconds)).isoformat()
+            stale = sorted(
+                (row for row in self.activities.values() if row.get('locked') and (row.get('locked_at') or '') < cutoff),
+                key=lambda row: row['locked_at']
+            )[:limit]
+            settled, requeued = [], []
+            for row in stale:
+                live = [tx for tx in self.transactions.values() if tx['activity_id'] == row['id'] and tx['status'] != 'failed']
+                if live:
+                    status = 'executed' if any(tx['status'] == 'confirmed' for tx in live) else 'executing'
+                    row.update(status=status, locked=False, updated_at=now())
+                    settled.append({'id': row['id'], 'user_id': row.get('user_id'), 'status': status})
+                    continue
+                row.update(locked_at=now())
+                policy = self._active_policy(row.get('user_id'))
+                requeued.append({
+                    'id': row['id'],
+                    'user_id': row.get('user_id'),
+                    'structured_intent': row['structured_intent'],
+                    'policy_id': policy['id'] if policy else None,
+                    'amount': sum(entry['amount'] for entry in self.ledger if entry['activity_id'] == row['id'])
+                })
+            return {'settled': settled, 'requeued': requeued}
+
+    async def renew_activity_locks(self, activity_ids: List[str]) -> int:
+        await self._roundtrip()
+        async with self._lock:
+            rows = [self.activities[activity_id] for activity_id in activity_ids if self.activities.get(activity_id, {}).get('locked')]
+            for row in rows:
+                row.update(locked_at=now())
+            return len(rows)
+
+    async def insert_transactions(self, transactions: List[dict]) -> List[dict]:
+        await self._roundtrip()
+        hashes = [transaction.get('tx_hash') for transaction in transactions]
+        if len(set(hashes)) < len(hashes) or any(tx['tx_hash'] in hashes for tx in self.transactions.values()):
+            raise InjectedFailure("duplicate key value violates unique constraint \"transactions_tx_hash_key\"")
+        rows = []
+        for transaction in transactions:
+            row = {'id': str(uuid.uuid4()), 'check_attempts': 0, 'next_check_at': now(), 'created_at': now(), 'confirmed_at': None, **transaction}
+            self.transactions[row['id']] = row
+            rows.append(dict(row))
+        return rows
+
+    async def insert_transaction(self, transaction: dict) -> Optional[dict]:
+        await self._roundtrip()
+        if any(tx['tx_hash'] == transaction.get('tx_hash') for tx in self.transactions.values()):
+            raise InjectedFailure("duplicate key value violates unique constraint \"transactions_tx_hash_key\"")
+        row = {'id': str(uuid.uuid4()), 'check_attempts': 0, 'next_check_at': now(), 'created_at': now(), 'confirmed_at': None, **transaction}
+        self.transactions[row['id']] = row
+        return dict(row)
+
+    async def claim_pending_transactions(self, limit: int = 500, lease_seconds: float = 300) -> List[dict]:
+        await self._roundtrip()
+        async with self._lock:
+            due = now()
+            rows = [row for row in self.transactions.values() if row['status'] == 'pending_on_chain' and row['next_check_at'] <= due]
+            rows = sorted(rows, key=lambda row: (row['next_check_at'], row['created_at'], row['id']))[:limit]
+            lease = (datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)).isoformat()
+            for row in rows:
+                row['next_check_at'] = lease
+            rows.sort(key=lambda row: (row['created_at'], row['id']))
+            return [
+                {**row, 'activity': {'user_id': self.activities.get(row['activity_id'], {}).get('user_id')}}
+                for row in rows
+            ]
+
+    async def apply_transaction_updates(self, updates: List[dict]) -> int:
+        await self._roundtrip()
+        changed = 0
+        async with self._lock:
+            for update in updates:
+                row = self.transactions.get(update['id'])
+                if row is None or row['status'] != 'pending_on_chain':
+                    continue
+                changed += 1
+                for field in ('status', 'confirmations', 'tx_hash'):
+                    if update.get(field) is not None:
+                        row[field] = update[field]
+                row['check_attempts'] += 1
+                delay = update.get('next_check_in_seconds') or 0
+                row['next_check_at'] = (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+                if row['status'] == 'confirmed':
+                    row['confirmed_at'] = now()
+                if row['status'] in ('confirmed', 'failed', 'needs_review') and row['activity_id'] in self.activities:
+                    self.activities[row['activity_id']]['status'] = 'executed' if row['status'] == 'confirmed' else row['status']
+                if row['status'] == 'failed':
+                    self._refund(row['activity_id'])
+        return changed
+
+    async def aclose(self):
+        pass
+
+
+AMOUNT = re.compile(r'(\d+(?:\.\d+)?)')
+RECIPIENT = re.compile(r'\b(?:to|for|pay|reimburse)\s+(?:the\s+)?([A-Za-z][\w&.\'-]*(?:\s+[A-Z][\w&.\'-]*)*)')
+QUERY_LINE = re.compile(r'User Query: "(.*)"', re.DOTALL)
+
+
+class FakeGeminiModel:
+    """
+    Stand-in for genai.GenerativeModel in JSON mode
+
+    Runs on the LLM worker threads like the real SDK, so latency is a
+    blocking sleep. Streaming splits the answer into small chunks spread
+    over the same latency.
+    """
+
+    def __init__(self, latency_ms: float = 400, jitter_ms: float = 150, error_rate: float = 0.0, chunks: int = 8):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.chunks = chunks
+        self.calls = 0
+        self.errors = 0
+
+    def _answer(self, prompt: str) -> str:
+        match = QUERY_LINE.search(prompt)
+        query = match.group(1) if match else prompt
+        amount = AMOUNT.search(query)
+        recipient = RECIPIENT.search(query)
+        name = recipient.group(1) if recipient else "Unknown"
+        return json.dumps({
+            "amount": float(amount.group(1)) if amount else None,
+            "currency": "USDC",
+            "recipient": "",
+            "recipientName": name,
+            "reasoning": f"This payment to {name} was reviewed against your transaction limit and approved vendor list."
+        })
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        delay = max(self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000
+        if random.random() < self.error_rate:
+            self.errors += 1
+            time.sleep(delay)
+            raise InjectedFailure("Injected Gemini failure")
+
+        text = self._answer(prompt)
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        if not stream:
+            time.sleep(delay)
+            return SimpleNamespace(text=text, parts=[text], usage_metadata=usage)
+
+        def chunks():
+            size = max(len(text) // self.chunks, 1)
+            for start in range(0, len(text), size):
+                time.sleep(delay / self.chunks)
+                piece = text[start:start + size]
+                last = start + size >= len(text)
+                yield SimpleNamespace(text=piece, parts=[piece], usage_metadata=usage if last else None)
+        return chunks()
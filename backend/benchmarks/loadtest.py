@@ -0,0 +1,262 @@
+"""
+End-to-end load test with in-process fakes
+
+Starts app.main:app (lifespan included) on httpx's ASGI transport with
+FakeRepository for Supabase, FakeGeminiModel for Gemini and the fake
+Circle API, then runs virtual users that submit /api/intent and approve a
+share of the resulting activities, at each concurrency level in turn.
+
+Reports throughput, p50/p95/p99 latency per endpoint and event-loop lag.
+Results can be saved as a baseline and later runs checked against it;
+a regression beyond the tolerance exits non-zero:
+
+    python -m benchmarks.loadtest --concurrency 1,8,32,128 --duration 10
+    python -m benchmarks.loadtest --save-baseline
+    python -m benchmarks.loadtest --check
+
+Baselines are per machine; record them on the runner that checks them.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from benchmarks import use_dummy_settings
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "loadtest.json"
+
+VENDORS = ["Stripe", "Circle", "Amazon Web Services", "Acme Payroll", "Figma"]
+
+# Latency checks ignore differences below this many milliseconds
+NOISE_FLOOR_MS = 5.0
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def make_query(rng: random.Random, llm_share: float) -> str:
+    vendor = rng.choice(VENDORS)
+    amount = rng.randint(5, 900) + rng.choice([0, 0.5, 0.25])
+    if rng.random() < llm_share:
+        # Too vague for the rule parser, so it goes to Gemini
+        return f"please settle what we owe {vendor} folks, roughly {amount}"
+    return f"Send ${amount} to {vendor}"
+
+
+class LoopLagMonitor:
+    """
+    Samples how late the event loop wakes up a task that sleeps `interval`
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(time.perf_counter() - started - self.interval, 0))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+async def run_level(client, concurrency: int, args, rng: random.Random) -> dict:
+    from app.services.transfer_queue import get_transfer_queue
+
+    latencies = {"intent": [], "approve": []}
+    statuses = Counter()
+    flows = 0
+    deadline = time.perf_counter() + args.duration
+
+    async def user():
+        nonlocal flows
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.post("/api/intent", json={"query": make_query(rng, args.llm_share)})
+            latencies["intent"].append(time.perf_counter() - started)
+            statuses[f"intent {response.status_code}"] += 1
+
+            body = response.json() if response.status_code == 200 else {}
+            if body.get("status") == "pending_approval" and rng.random() < args.approve_ratio:
+                started = time.perf_counter()
+                response = await client.post(f"/api/approve/{body['activity_id']}", params={"wait": str(args.wait).lower()})
+                latencies["approve"].append(time.perf_counter() - started)
+                statuses[f"approve {response.status_code}"] += 1
+            flows += 1
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    # Let queued transfers finish so they do not bleed into the next level
+    drain_deadline = time.perf_counter() + 60
+    while time.perf_counter() < drain_deadline:
+        stats = get_transfer_queue().stats()
+        if stats["queue_depth"] == 0 and not stats["jobs"].get("running") and not stats["jobs"].get("queued"):
+            break
+        await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    result = {
+        "concurrency": concurrency,
+        "flows": flows,
+        "throughput": round(flows / elapsed, 2),
+        "requests_per_second": round(sum(len(v) for v in latencies.values()) / elapsed, 2),
+        "statuses": dict(sorted(statuses.items())),
+    }
+    for endpoint, values in latencies.items():
+        values.sort()
+        for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            result[f"{endpoint}_{name}_ms"] = round(percentile(values, fraction) * 1000, 2)
+    lag = sorted(monitor.samples)
+    result["loop_lag_p99_ms"] = round(percentile(lag, 0.99) * 1000, 2)
+    result["loop_lag_max_ms"] = round((lag[-1] if lag else 0) * 1000, 2)
+    return result
+
+
+def print_results(results):
+    print(f"{'conc':>5} {'flows/s':>8} {'req/s':>8} {'intent p50/p95/p99 ms':>24} {'approve p50/p95/p99 ms':>25} {'lag p99/max ms':>15}")
+    for r in results:
+        intent = f"{r['intent_p50_ms']:.0f}/{r['intent_p95_ms']:.0f}/{r['intent_p99_ms']:.0f}"
+        approve = f"{r['approve_p50_ms']:.0f}/{r['approve_p95_ms']:.0f}/{r['approve_p99_ms']:.0f}"
+        lag = f"{r['loop_lag_p99_ms']:.1f}/{r['loop_lag_max_ms']:.1f}"
+        print(f"{r['concurrency']:>5} {r['throughput']:>8.1f} {r['requests_per_second']:>8.1f} {intent:>24} {approve:>25} {lag:>15}")
+    for r in results:
+        errors = {k: v for k, v in r["statuses"].items() if not k.endswith((" 200", " 202"))}
+        if errors:
+            print(f"  concurrency {r['concurrency']}: non-2xx responses {errors}")
+
+
+def check(results, baseline: dict, tolerance: float) -> list:
+    """
+    Compare results with a saved baseline; returns regression messages
+    """
+    regressions = []
+    for r in results:
+        base = baseline.get(str(r["concurrency"]))
+        if not base:
+            continue
+        if r["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"concurrency {r['concurrency']}: throughput {r['throughput']} < baseline {base['throughput']}")
+        for key, value in r.items():
+            if not key.endswith("_ms") or key not in base:
+                continue
+            limit = max(base[key] * (1 + tolerance), base[key] + NOISE_FLOOR_MS)
+            if value > limit:
+                regressions.append(f"concurrency {r['concurrency']}: {key} {value} > baseline {base[key]}")
+    return regressions
+
+
+async def run(args) -> int:
+    import httpx
+    import app.database as database
+    from app.main import app
+    from app.services.circle_wrapper import get_circle_wrapper
+    from app.services.intent_processor import get_intent_processor
+    from app.services.policy_cache import get_policy_cache
+    from benchmarks.fake_circle import create_app
+    from benchmarks.fakes import FakeGeminiModel, FakeRepository
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+
+    repository = FakeRepository(args.db_latency_ms, args.db_latency_ms / 2, args.db_error_rate)
+    database.repository = repository
+    gemini = FakeGeminiModel(args.llm_latency_ms, args.llm_latency_ms / 3, args.llm_error_rate)
+    get_intent_processor().model = gemini
+    fake_circle = create_app(args.circle_latency_ms, args.circle_latency_ms / 3, args.circle_error_rate, confirm_after=1.0)
+    get_circle_wrapper()._transport = httpx.ASGITransport(app=fake_circle)
+
+    await repository.insert_policy({
+        'max_tx_amount': 1000,
+        'daily_budget': 1e12,
+        'monthly_budget': 1e12,
+        'allow_list': VENDORS,
+        'block_list': ['Shady Co']
+    })
+    get_policy_cache().invalidate()
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120) as client:
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                results.append(await run_level(client, concurrency, args, rng))
+
+    print_results(results)
+    print(f"fakes: db {repository.calls} calls ({repository.errors} failed), "
+          f"gemini {gemini.calls} calls ({gemini.errors} failed), "
+          f"circle {fake_circle.state.stats['requests']} requests ({fake_circle.state.stats['errors']} failed)")
+
+    baseline_path = Path(args.baseline)
+    scenario = args.scenario
+    if args.save_baseline:
+        saved = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        saved[scenario] = {str(r["concurrency"]): {k: v for k, v in r.items() if k != "statuses"} for r in results}
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(saved, indent=2, sort_keys=True) + "\n")
+        print(f"saved baseline '{scenario}' to {baseline_path}")
+
+    if args.check:
+        if not baseline_path.exists() or scenario not in json.loads(baseline_path.read_text()):
+            print(f"FAIL: no baseline '{scenario}' in {baseline_path}; run with --save-baseline first")
+            return 1
+        regressions = check(results, json.loads(baseline_path.read_text())[scenario], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print(f"OK: within {args.tolerance:.0%} of baseline '{scenario}'")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test with in-process fakes")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Comma-separated virtual user counts, run in turn")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--approve-ratio", type=float, default=0.7, help="Share of pending activities approved")
+    parser.add_argument("--llm-share", type=float, default=0.3, help="Share of queries too vague for the rule parser")
+    parser.add_argument("--wait", action="store_true", help="Approve with wait=true, timing the transfer too")
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--db-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--circle-latency-ms", type=float, default=80)
+    parser.add_argument("--circle-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scenario", default="default", help="Baseline entry to save or check")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    use_dummy_settings(
+        CIRCLE_MOCK="false",
+        CIRCLE_BASE_URL="http://fake-circle",
+        CONFIRMATION_POLL_INTERVAL="1",
+        CONFIRMATION_BACKOFF_BASE="1",
+        INTENT_CACHE_BACKEND="memory",
+        POLICY_CACHE_INVALIDATION_FILE=""
+    )
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Concurrent approval stress test
+
+Seeds a fresh tenant with its own policy and a set of pending activities,
+then fires every approval several times in parallel through the app and
+checks that:
+
+- no activity produced more than one transaction,
+- executed spend never exceeds the daily or monthly budget,
+- the tenant's spend windows and policy mirror equal the executed spend.
+
+It writes policies, activities and ledger entries, so run it only against
+a disposable database (SUPABASE_URL / SUPABASE_SERVICE_KEY in the environment):
+
+    python -m benchmarks.stress_approve --activities 100 --duplicates 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+
+
+async def run(args) -> bool:
+    import httpx
+    from app.main import app
+    from app.database import get_repository
+    from app.services.policy_cache import get_policy_cache
+
+    repository = get_repository()
+    budget = args.amount * args.fit
+    # A new tenant starts with empty spend windows
+    user_id = str(uuid.uuid4())
+
+    # 1. Fresh policy that only fits `fit` of the activities
+    policy = await repository.insert_policy({
+        'max_tx_amount': args.amount,
+        'daily_budget': budget,
+        'monthly_budget': budget,
+        'allow_list': ['Stress Vendor'],
+        'block_list': []
+    }, user_id)
+    get_policy_cache().invalidate(user_id)
+
+    # 2. Pending activities to approve
+    activities = await repository.insert_activities([
+        {
+            'user_id': user_id,
+            'user_query': f'stress test {i}',
+            'structured_intent': {
+                'amount': args.amount,
+                'currency': 'USDC',
+                'recipient': f'0xstress{i:04d}',
+                'recipientName': 'Stress Vendor'
+            },
+            'status': 'pending_approval',
+            'policy_checks': []
+        }
+        for i in range(args.activities)
+    ])
+    activity_ids = [a['id'] for a in activities]
+
+    # 3. Every approval fired `duplicates` times, all at once, in random order
+    requests = activity_ids * args.duplicates
+    random.shuffle(requests)
+    started = time.monotonic()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://stress', timeout=120) as client:
+        responses = await asyncio.gather(*(client.post(
+            f'/api/approve/{activity_id}',
+            params={'wait': 'true'},
+            headers={'X-User-Id': user_id}
+        ) for activity_id in requests))
+    elapsed = time.monotonic() - started
+
+    # 4. Verify
+    tx_response = await repository.table('transactions').select('activity_id, amount').in_('activity_id', activity_ids).execute()
+    transactions = tx_response.data
+    current = await repository.get_current_policy(user_id)
+    recorded_spent = float(current['current_monthly_spent'])
+    recorded_daily = float(current['current_daily_spent'])
+    policy_response = await repository.table('policies').select('current_monthly_spent').eq('id', policy['id']).execute()
+    mirrored_spent = float(policy_response.data[0]['current_monthly_spent'])
+
+    per_activity = Counter(tx['activity_id'] for tx in transactions)
+    executed_spent = sum(float(tx['amount']) for tx in transactions)
+    statuses = Counter(r.status_code for r in responses)
+
+    print(f"approvals sent:        {len(requests)} in {elapsed:.2f}s")
+    print(f"response codes:        {dict(sorted(statuses.items()))}")
+    print(f"transactions:          {len(transactions)} (budget fits {args.fit})")
+    print(f"executed spend:        {executed_spent:.2f} / budget {budget:.2f}")
+    print(f"recorded spend:        {recorded_spent:.2f} month, {recorded_daily:.2f} day, {mirrored_spent:.2f} on policy")
+
+    failures = []
+    doubled = [a for a, n in per_activity.items() if n > 1]
+    if doubled:
+        failures.append(f"{len(doubled)} activities executed more than once")
+    if executed_spent > budget:
+        failures.append("executed spend exceeds the monthly budget")
+    if any(abs(spent - executed_spent) > 1e-6 for spent in (recorded_spent, recorded_daily, mirrored_spent)):
+        failures.append("ledger spend drifted from executed transactions")
+    if statuses.get(200, 0) != len(transactions):
+        failures.append("successful responses do not match transactions written")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: no double execution, no overspend")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent approval stress test")
+    parser.add_argument("--activities", type=int, default=100)
+    parser.add_argument("--duplicates", type=int, default=4, help="Parallel approvals fired per activity")
+    parser.add_argument("--amount", type=float, default=10.0)
+    parser.add_argument("--fit", type=int, default=60, help="How many activities the budget can pay for")
+    args = parser.parse_args()
+
+    # The harness is the proxy here: it names the tenant in X-User-Id itself
+    os.environ.setdefault("TRUST_USER_ID_HEADER", "true")
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
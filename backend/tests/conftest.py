@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks import use_dummy_settings
+
+use_dummy_settings(
+    INTENT_CACHE_BACKEND="memory",
+    POLICY_CACHE_INVALIDATION_FILE="",
+    CIRCLE_MOCK="true",
+    CIRCLE_MOCK_LATENCY="0",
+)
+
+
+@pytest.fixture
+def repository():
+    """
+    In-memory stand-in for the Supabase repository, swapped in for one test
+    """
+    import app.database as database
+    from benchmarks.fakes import FakeRepository
+
+    previous = database.repository
+    database.repository = FakeRepository(0, 0)
+    yield database.repository
+    database.repository = previous
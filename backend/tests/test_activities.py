@@ -0,0 +1,31 @@
+import base64
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers.activities import decode_cursor, encode_cursor
+
+
+def cursor(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def test_cursor_round_trips():
+    activity = {"created_at": "2026-10-18T12:00:00.123456+00:00", "id": str(uuid.uuid4())}
+
+    assert decode_cursor(encode_cursor(activity)) == (activity["created_at"], activity["id"])
+
+
+@pytest.mark.parametrize("raw", [
+    f"2026-10-18T12:00:00+00:00|{uuid.uuid4()},user_id.neq.null",
+    f'2026-10-18T12:00:00+00:00",id.gt.0|{uuid.uuid4()}',
+    "2026-10-18T12:00:00+00:00|not-a-uuid",
+    "yesterday|00000000-0000-0000-0000-000000000000",
+    "no separator",
+])
+def test_cursor_with_extra_filter_terms_is_rejected(raw):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor(raw))
+
+    assert error.value.status_code == 400
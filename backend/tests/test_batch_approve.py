@@ -0,0 +1,59 @@
+import asyncio
+import uuid
+
+import httpx
+
+from app.config import get_settings
+
+
+async def approve(repository, user_id: str, policy: dict, intents: list) -> tuple:
+    from app.main import app
+
+    await repository.insert_policy({'max_tx_amount': 100, 'monthly_budget': 100, 'daily_budget': 100, **policy}, user_id)
+    rows = await repository.insert_activities([
+        {'user_id': user_id, 'user_query': 'pay', 'structured_intent': {'recipient': '0xabc', **intent}, 'status': 'pending_approval'}
+        for intent in intents
+    ])
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        response = await client.post(
+            '/api/approve:batch?wait=true',
+            json={'activity_ids': [row['id'] for row in rows]},
+            headers={'X-User-Id': user_id}
+        )
+    assert response.status_code == 200
+    return response.json()['results'], repository._spend_window(user_id)
+
+
+def test_flagged_items_reserve_nothing_for_the_rest(repository, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'trust_user_id_header', True)
+
+    async def scenario():
+        # The blocked $60 must not count against the budget, so $50 and $40
+        # fit and the batch only runs over it at the last item
+        return await approve(repository, str(uuid.uuid4()), {'block_list': ['Blocked Co']}, [
+            {'amount': 60, 'recipientName': 'Blocked Co'},
+            {'amount': 50, 'recipientName': 'Acme'},
+            {'amount': 40, 'recipientName': 'Acme'},
+            {'amount': 20, 'recipientName': 'Acme'},
+        ])
+
+    results, spend = asyncio.run(scenario())
+    assert [result['outcome'] for result in results] == ['flagged', 'completed', 'completed', 'flagged']
+    assert 'block list' in results[0]['detail']
+    assert 'monthly limit' in results[3]['detail']
+    assert spend['current_monthly_spent'] == 90
+    assert spend['current_daily_transactions'] == 2
+
+
+def test_velocity_limit_is_enforced_by_the_claim(repository, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'trust_user_id_header', True)
+
+    async def scenario():
+        return await approve(repository, str(uuid.uuid4()), {'rules': [{'type': 'velocity', 'max_transactions': 2}]}, [
+            {'amount': 10, 'recipientName': 'Acme'} for _ in range(3)
+        ])
+
+    results, spend = asyncio.run(scenario())
+    assert [result['outcome'] for result in results] == ['completed', 'completed', 'flagged']
+    assert '2 transactions per day' in results[2]['detail']
+    assert spend['current_daily_transactions'] == 2
@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+
+from app.services.circle_wrapper import CircleWrapper
+
+
+def opened_breaker_wrapper(handler) -> CircleWrapper:
+    wrapper = CircleWrapper(transport=httpx.MockTransport(handler))
+    wrapper.mock = False
+    wrapper.max_retries = 0
+    # Opened long enough ago that the next call is the half-open probe
+    wrapper.breaker.failures = wrapper.breaker.failure_threshold
+    wrapper.breaker.opened_at = 0.0
+    return wrapper
+
+
+def test_cancelled_probe_does_not_leave_the_breaker_open():
+    slow = True
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if slow:
+            await asyncio.sleep(5)
+        return httpx.Response(200, json={"data": {"id": "transfer-1", "status": "complete", "transactionHash": "0xabc"}})
+
+    async def scenario():
+        nonlocal slow
+        wrapper = opened_breaker_wrapper(handler)
+        assert wrapper.breaker.state == 'half_open'
+
+        # The probe outlives the caller's timeout and is cancelled
+        result = await wrapper.transfer_with_timeout(10, '0xabc', timeout=0.05, idempotency_key='probe')
+        assert result.get('timeout')
+        assert not wrapper.breaker.probing
+
+        slow = False
+        result = await wrapper.transfer_with_timeout(10, '0xabc', timeout=1, idempotency_key='next')
+        assert result['status'] == 'confirmed'
+        assert wrapper.breaker.state == 'closed'
+        await wrapper.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_probe_failing_with_an_unexpected_error_lets_the_next_call_probe():
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ValueError("unexpected")
+        return httpx.Response(200, json={"data": {"id": "transfer-1", "status": "complete"}})
+
+    async def scenario():
+        wrapper = opened_breaker_wrapper(handler)
+        try:
+            await wrapper.create_transfer(10, '0xabc', 'probe')
+        except ValueError:
+            pass
+        assert not wrapper.breaker.probing
+
+        assert (await wrapper.create_transfer(10, '0xabc', 'next'))['status'] == 'confirmed'
+        assert wrapper.breaker.state == 'closed'
+        await wrapper.aclose()
+
+    asyncio.run(scenario())
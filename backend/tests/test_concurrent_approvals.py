@@ -0,0 +1,119 @@
+"""
+Concurrent approvals against a real database
+
+Runs claim_activity, claim_activities, settle_activities, reconcile_spend
+and the spend-ledger triggers in schema.sql through the repository. It
+writes a fresh tenant's policy, activities and ledger entries, so it only
+runs when TEST_SUPABASE_URL and TEST_SUPABASE_SERVICE_KEY point at a
+disposable database with the schema applied.
+"""
+import asyncio
+import os
+import random
+import uuid
+from collections import Counter
+
+import pytest
+
+from app.database import Repository
+
+TEST_URL = os.environ.get("TEST_SUPABASE_URL")
+TEST_KEY = os.environ.get("TEST_SUPABASE_SERVICE_KEY")
+
+pytestmark = pytest.mark.skipif(not (TEST_URL and TEST_KEY), reason="TEST_SUPABASE_URL / TEST_SUPABASE_SERVICE_KEY not set")
+
+AMOUNT = 10.0
+ACTIVITIES = 40
+FIT = 15
+DUPLICATES = 4
+
+
+async def seed(repository: Repository) -> tuple:
+    # A new tenant starts with empty spend windows
+    user_id = str(uuid.uuid4())
+    await repository.insert_policy({
+        'max_tx_amount': AMOUNT,
+        'daily_budget': AMOUNT * FIT,
+        'monthly_budget': AMOUNT * FIT,
+        'allow_list': ['Concurrency Vendor'],
+        'block_list': []
+    }, user_id)
+    activities = await repository.insert_activities([
+        {
+            'user_id': user_id,
+            'user_query': f'concurrency test {i}',
+            'structured_intent': {'amount': AMOUNT, 'currency': 'USDC', 'recipient': f'0xconc{i:04d}', 'recipientName': 'Concurrency Vendor'},
+            'status': 'pending_approval',
+            'policy_checks': []
+        }
+        for i in range(ACTIVITIES)
+    ])
+    return user_id, [activity['id'] for activity in activities]
+
+
+def test_concurrent_claims_never_exceed_the_budget():
+    async def scenario():
+        repository = Repository(TEST_URL, TEST_KEY)
+        try:
+            user_id, activity_ids = await seed(repository)
+
+            # Every activity claimed several times at once, alongside two overlapping batches
+            singles = activity_ids * DUPLICATES
+            random.shuffle(singles)
+            batches = [activity_ids[:ACTIVITIES // 2], activity_ids[ACTIVITIES // 4:]]
+            results = await asyncio.gather(
+                *(repository.claim_activity(activity_id, user_id) for activity_id in singles),
+                *(repository.claim_activities(batch, user_id) for batch in batches)
+            )
+
+            claims = Counter()
+            for result in results[:len(singles)]:
+                if result['outcome'] == 'claimed':
+                    claims[result['activity']['id']] += 1
+            for batch in results[len(singles):]:
+                for result in batch['results']:
+                    if result['outcome'] == 'claimed':
+                        claims[result['id']] += 1
+
+            assert claims and max(claims.values()) == 1
+            assert len(claims) == FIT
+            policy = await repository.get_current_policy(user_id)
+            assert float(policy['current_daily_spent']) == AMOUNT * FIT
+            assert float(policy['current_monthly_spent']) == AMOUNT * FIT
+            assert int(policy['current_daily_transactions']) == FIT
+
+            # Half the transfers go out, the rest fail and give their spend back
+            claimed = list(claims)
+            executed, failed = claimed[:FIT // 2], claimed[FIT // 2:]
+            await repository.insert_transactions([
+                {'activity_id': activity_id, 'tx_hash': f"0x{uuid.uuid4().hex}", 'amount': AMOUNT, 'recipient': '0xconc', 'status': 'pending_on_chain'}
+                for activity_id in executed
+            ])
+            settled = await repository.settle_activities(
+                [{'id': activity_id, 'status': 'executing', 'refund': 0} for activity_id in executed]
+                + [{'id': activity_id, 'status': 'failed', 'refund': AMOUNT} for activity_id in failed]
+            )
+            assert settled == FIT
+
+            spent = AMOUNT * len(executed)
+            policy = await repository.get_current_policy(user_id)
+            assert float(policy['current_daily_spent']) == spent
+            assert int(policy['current_daily_transactions']) == len(executed)
+
+            # Rebuilding the buckets from the ledger agrees with the triggers
+            await repository.reconcile_spend()
+            policy = await repository.get_current_policy(user_id)
+            assert float(policy['current_daily_spent']) == spent
+            assert float(policy['current_monthly_spent']) == spent
+            assert float(policy['current_monthly_spent']) <= float(policy['monthly_budget'])
+
+            # The freed budget is claimable again, still only up to the cap
+            remaining = [activity_id for activity_id in activity_ids if activity_id not in claims]
+            retries = await asyncio.gather(*(repository.claim_activity(activity_id, user_id) for activity_id in remaining * 2))
+            assert sum(result['outcome'] == 'claimed' for result in retries) == len(failed)
+            policy = await repository.get_current_policy(user_id)
+            assert float(policy['current_daily_spent']) == AMOUNT * FIT
+        finally:
+            await repository.aclose()
+
+    asyncio.run(scenario())
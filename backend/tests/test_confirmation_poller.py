@@ -0,0 +1,98 @@
+import asyncio
+import uuid
+
+from app.services.circle_wrapper import get_circle_wrapper
+from app.services.confirmation_poller import ConfirmationPoller
+
+AMOUNT = 25
+
+
+def new_poller(max_attempts: int = 5) -> ConfirmationPoller:
+    return ConfirmationPoller(interval=0, page_size=2, backoff_base=60, backoff_max=600, max_attempts=max_attempts, lease=60)
+
+
+async def pending_transfers(repository, count: int, transfer_id: bool = True) -> list:
+    user_id = str(uuid.uuid4())
+    await repository.insert_policy({'max_tx_amount': 1000, 'daily_budget': 1000, 'monthly_budget': 1000, 'allow_list': [], 'block_list': []}, user_id)
+    transactions = []
+    for i in range(count):
+        activity = await repository.insert_activity({'user_id': user_id, 'user_query': 'pay', 'structured_intent': {'amount': AMOUNT}, 'status': 'pending_approval'})
+        await repository.claim_activity(activity['id'], user_id)
+        await repository.update_activity(activity['id'], {'status': 'executing', 'locked': False})
+        transactions.append(await repository.insert_transaction({
+            'activity_id': activity['id'],
+            'tx_hash': f"0x{uuid.uuid4().hex}",
+            'transfer_id': str(uuid.uuid4()) if transfer_id else None,
+            'amount': AMOUNT,
+            'recipient': '0xabc',
+            'status': 'pending_on_chain'
+        }))
+    return transactions
+
+
+def still_pending(calls: list):
+    async def get_transfer_statuses(refs, **kwargs):
+        calls.extend(refs)
+        await asyncio.sleep(0.01)
+        return {ref: {"tx_hash": ref, "status": "pending_on_chain", "confirmations": 1} for ref in refs}
+    return get_transfer_statuses
+
+
+def test_pollers_on_several_workers_check_each_transfer_once(repository, monkeypatch):
+    calls = []
+    monkeypatch.setattr(get_circle_wrapper(), 'mock', False)
+    monkeypatch.setattr(get_circle_wrapper(), 'get_transfer_statuses', still_pending(calls))
+
+    async def scenario():
+        transactions = await pending_transfers(repository, 5)
+        checked = await asyncio.gather(*(new_poller().tick() for _ in range(3)))
+
+        assert sum(checked) == 5
+        assert sorted(calls) == sorted(tx['transfer_id'] for tx in transactions)
+
+    asyncio.run(scenario())
+
+
+def test_transfer_pending_past_max_attempts_needs_review(repository, monkeypatch):
+    monkeypatch.setattr(get_circle_wrapper(), 'mock', False)
+    monkeypatch.setattr(get_circle_wrapper(), 'get_transfer_statuses', still_pending([]))
+
+    async def scenario():
+        [transaction] = await pending_transfers(repository, 1)
+        poller = new_poller(max_attempts=3)
+        for _ in range(3):
+            # Due again without waiting out the backoff
+            repository.transactions[transaction['id']]['next_check_at'] = transaction['created_at']
+            await poller.tick()
+
+        assert repository.transactions[transaction['id']]['status'] == 'needs_review'
+        assert repository.activities[transaction['activity_id']]['status'] == 'needs_review'
+        await repository.reconcile_spend()
+        assert sum(entry['amount'] for entry in repository.ledger if entry['activity_id'] == transaction['activity_id']) == AMOUNT
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_transfer_without_circle_id_needs_review(repository, monkeypatch):
+    calls = []
+    monkeypatch.setattr(get_circle_wrapper(), 'mock', False)
+    monkeypatch.setattr(get_circle_wrapper(), 'get_transfer_statuses', still_pending(calls))
+
+    async def scenario():
+        [transaction] = await pending_transfers(repository, 1, transfer_id=False)
+        await new_poller().tick()
+
+        assert calls == []
+        assert repository.transactions[transaction['id']]['status'] == 'needs_review'
+
+    asyncio.run(scenario())
+
+
+def test_mock_transfers_confirm(repository):
+    async def scenario():
+        transactions = await pending_transfers(repository, 3, transfer_id=False)
+        assert await new_poller().tick() == 3
+
+        assert [repository.activities[tx['activity_id']]['status'] for tx in transactions] == ['executed'] * 3
+
+    asyncio.run(scenario())
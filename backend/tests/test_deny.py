@@ -0,0 +1,36 @@
+import asyncio
+import uuid
+
+import httpx
+
+from app.config import get_settings
+
+
+async def activity(repository, user_id: str, status: str = 'pending_approval') -> str:
+    row = await repository.insert_activity({'user_id': user_id, 'user_query': 'pay', 'structured_intent': {'amount': 10}, 'status': status})
+    return row['id']
+
+
+def test_deny_only_touches_the_callers_activity(repository, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'trust_user_id_header', True)
+    from app.main import app
+
+    async def scenario():
+        owner, other = str(uuid.uuid4()), str(uuid.uuid4())
+        pending = await activity(repository, owner)
+        executed = await activity(repository, owner, 'executed')
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+            response = await client.post(f'/api/deny/{pending}', headers={'X-User-Id': other})
+            assert response.status_code == 404
+            assert repository.activities[pending]['status'] == 'pending_approval'
+
+            response = await client.post(f'/api/deny/{executed}', headers={'X-User-Id': owner})
+            assert response.status_code == 400
+            assert repository.activities[executed]['status'] == 'executed'
+
+            response = await client.post(f'/api/deny/{pending}', headers={'X-User-Id': owner})
+            assert response.status_code == 200
+            assert repository.activities[pending]['status'] == 'rejected'
+
+    asyncio.run(scenario())
@@ -0,0 +1,67 @@
+import time
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from app.config import get_settings
+from app.dependencies import get_user_id
+
+SECRET = "test-jwt-secret"
+
+
+def token(sub: str, secret: str = SECRET, expires_in: int = 60) -> str:
+    return jwt.encode({"sub": sub, "aud": "authenticated", "exp": int(time.time()) + expires_in}, secret, algorithm="HS256")
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "supabase_jwt_secret", SECRET)
+    monkeypatch.setattr(settings, "trust_user_id_header", False)
+    monkeypatch.setattr(settings, "require_user_id", None)
+    return settings
+
+
+def rejected(**headers) -> int:
+    with pytest.raises(HTTPException) as error:
+        get_user_id(**headers)
+    return error.value.status_code
+
+
+def test_user_comes_from_a_verified_token(settings):
+    user_id = str(uuid.uuid4())
+
+    assert get_user_id(authorization=f"Bearer {token(user_id)}", x_user_id=None) == user_id
+
+
+@pytest.mark.parametrize("authorization", [
+    f"Bearer {token(str(uuid.uuid4()), secret='someone-else')}",
+    f"Bearer {token(str(uuid.uuid4()), expires_in=-60)}",
+    f"Bearer {token('not-a-uuid')}",
+    "Bearer garbage",
+    "Basic dXNlcjpwYXNz",
+])
+def test_invalid_token_is_rejected(settings, authorization):
+    assert rejected(authorization=authorization, x_user_id=None) == 401
+
+
+def test_user_id_header_is_not_trusted_by_default(settings):
+    assert rejected(authorization=None, x_user_id=str(uuid.uuid4())) == 401
+
+
+def test_user_id_header_is_taken_behind_a_trusted_proxy(settings, monkeypatch):
+    monkeypatch.setattr(settings, "trust_user_id_header", True)
+    user_id = str(uuid.uuid4())
+
+    assert get_user_id(authorization=None, x_user_id=user_id) == user_id
+    assert rejected(authorization=None, x_user_id="not-a-uuid") == 400
+
+
+def test_anonymous_requests_need_a_user_once_tokens_are_configured(settings, monkeypatch):
+    assert rejected(authorization=None, x_user_id=None) == 401
+
+    monkeypatch.setattr(settings, "supabase_jwt_secret", None)
+    assert get_user_id(authorization=None, x_user_id=None) is None
+    assert rejected(authorization=f"Bearer {token(str(uuid.uuid4()))}", x_user_id=None) == 401
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.llm_client import LLMClient, LLMTimeoutError
+
+
+def test_timed_out_call_keeps_its_slot_until_the_thread_returns():
+    client = LLMClient(max_workers=4, max_concurrency=1, timeout=0.05)
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(LLMTimeoutError):
+            await client.call(release.wait, 5)
+        # The first call is still running on its thread, so no second one starts
+        assert client.stats()["in_flight"] == 1
+        with pytest.raises(LLMTimeoutError, match="No LLM worker"):
+            await client.call(lambda: "second")
+
+        release.set()
+        assert await client.call(lambda: "third", timeout=1) == "third"
+        assert client.stats()["in_flight"] == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        client.shutdown()
+
+
+def test_abandoned_stream_keeps_its_slot_until_the_thread_returns():
+    client = LLMClient(max_workers=4, max_concurrency=1, timeout=0.05)
+    release = threading.Event()
+
+    def chunks():
+        yield "first"
+        release.wait(5)
+        yield "second"
+
+    async def scenario():
+        with pytest.raises(LLMTimeoutError):
+            async for _ in client.stream(chunks):
+                pass
+        assert client.stats()["in_flight"] == 1
+
+        release.set()
+        assert await client.call(lambda: "next", timeout=1) == "next"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        client.shutdown()
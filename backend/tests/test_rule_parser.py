@@ -0,0 +1,37 @@
+import pytest
+
+from app.services import rule_parser
+
+POLICY = {
+    "max_tx_amount": 1000,
+    "monthly_budget": 5000,
+    "allow_list": ["Stripe", "Circle", "Amazon"],
+    "block_list": [],
+}
+THRESHOLD = 0.85
+
+
+def test_confident_query_is_parsed():
+    parsed = rule_parser.parse("Send $1,250.50 to Stripe", POLICY)
+
+    assert parsed["amount"] == 1250.5
+    assert parsed["recipientName"] == "Stripe"
+    assert parsed["confidence"] >= THRESHOLD
+
+
+@pytest.mark.parametrize("query", ["send $100.999 to stripe", "pay stripe 12.345 usdc", "send $1,250.505 to amazon"])
+def test_amount_with_more_than_two_decimals_is_not_cut_short(query):
+    assert rule_parser.parse(query, POLICY) is None
+
+
+@pytest.mark.parametrize("query", [
+    "Don't send $50 to Stripe",
+    "do not pay amazon 20 usdc",
+    "Never transfer $100 to Circle",
+    "cancel the $50 payment to Stripe",
+    "dont send 30 usdc to Stripe",
+])
+def test_negated_request_is_left_to_gemini(query):
+    parsed = rule_parser.parse(query, POLICY)
+
+    assert parsed is None or parsed["confidence"] < THRESHOLD
@@ -0,0 +1,201 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from app.services.circle_wrapper import CircleAPIError, CircuitOpenError, get_circle_wrapper
+from app.services.transfer_queue import TransferQueue
+
+INTENT = {'amount': 40, 'currency': 'USDC', 'recipient': '0xabc', 'recipientName': 'Stripe'}
+
+
+def new_queue() -> TransferQueue:
+    return TransferQueue(workers=1, max_attempts=1, retry_backoff=0, retention=60, batch_concurrency=4)
+
+
+async def claimed_activities(repository, user_id: str, count: int) -> list:
+    await repository.insert_policy({'max_tx_amount': 1000, 'daily_budget': 1000, 'monthly_budget': 1000, 'allow_list': ['Stripe'], 'block_list': []}, user_id)
+    activity_ids = []
+    for _ in range(count):
+        activity = await repository.insert_activity({'user_id': user_id, 'user_query': 'pay', 'structured_intent': INTENT, 'status': 'pending_approval'})
+        claim = await repository.claim_activity(activity['id'], user_id)
+        assert claim['outcome'] == 'claimed'
+        activity_ids.append(activity['id'])
+    return activity_ids
+
+
+async def refuse(*args, **kwargs):
+    raise RuntimeError("rejected")
+
+
+def failing(error: Exception):
+    async def transfer_with_timeout(*args, **kwargs):
+        raise error
+    return transfer_with_timeout
+
+
+def reserved(repository, activity_id: str) -> float:
+    return sum(entry['amount'] for entry in repository.ledger if entry['activity_id'] == activity_id)
+
+
+def test_unrecorded_transfer_keeps_reservation_through_reconcile(repository):
+    async def scenario():
+        user_id = str(uuid.uuid4())
+        [activity_id] = await claimed_activities(repository, user_id, 1)
+        repository.insert_transaction = refuse
+
+        queue = new_queue()
+        await queue.start()
+        job = queue.enqueue(activity_id, user_id, INTENT, repository.policies[0]['id'], INTENT['amount'])
+        await asyncio.wait_for(job.done.wait(), 5)
+        await queue.stop()
+
+        assert job.state == 'failed'
+        assert repository.activities[activity_id]['status'] == 'needs_review'
+        await repository.reconcile_spend()
+        assert reserved(repository, activity_id) == INTENT['amount']
+        policy = await repository.get_current_policy(user_id)
+        assert policy['current_daily_spent'] == INTENT['amount']
+
+    asyncio.run(scenario())
+
+
+def test_unrecorded_batch_transfers_keep_reservations_through_reconcile(repository):
+    async def scenario():
+        user_id = str(uuid.uuid4())
+        activity_ids = await claimed_activities(repository, user_id, 2)
+        repository.insert_transaction = refuse
+        repository.insert_transactions = refuse
+
+        queue = new_queue()
+        jobs = queue.enqueue_batch(user_id, repository.policies[0]['id'], [(activity_id, INTENT, INTENT['amount']) for activity_id in activity_ids])
+        await asyncio.wait_for(asyncio.gather(*(job.done.wait() for job in jobs)), 5)
+
+        assert [repository.activities[activity_id]['status'] for activity_id in activity_ids] == ['needs_review'] * 2
+        await repository.reconcile_spend()
+        assert [reserved(repository, activity_id) for activity_id in activity_ids] == [INTENT['amount']] * 2
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("error", [
+    CircleAPIError("Circle rejected request: insufficient funds", status_code=400),
+    CircuitOpenError("Circle circuit breaker is open"),
+])
+def test_rejected_transfer_is_refunded(repository, monkeypatch, error):
+    monkeypatch.setattr(get_circle_wrapper(), 'transfer_with_timeout', failing(error))
+
+    async def scenario():
+        user_id = str(uuid.uuid4())
+        [activity_id] = await claimed_activities(repository, user_id, 1)
+
+        queue = new_queue()
+        await queue.start()
+        job = queue.enqueue(activity_id, user_id, INTENT, repository.policies[0]['id'], INTENT['amount'])
+        await asyncio.wait_for(job.done.wait(), 5)
+        await queue.stop()
+
+        assert repository.activities[activity_id]['status'] == 'failed'
+        assert reserved(repository, activity_id) == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("error", [
+    CircleAPIError("Circle request failed after 4 attempts: Circle returned 503", retryable=True),
+    httpx.ConnectError("connection reset"),
+])
+def test_transfer_that_may_have_gone_out_keeps_reservation(repository, monkeypatch, error):
+    monkeypatch.setattr(get_circle_wrapper(), 'transfer_with_timeout', failing(error))
+
+    async def scenario():
+        user_id = str(uuid.uuid4())
+        single_id, *batch_ids = await claimed_activities(repository, user_id, 3)
+        policy_id = repository.policies[0]['id']
+
+        queue = new_queue()
+        await queue.start()
+        jobs = [queue.enqueue(single_id, user_id, INTENT, policy_id, INTENT['amount'])]
+        jobs += queue.enqueue_batch(user_id, policy_id, [(activity_id, INTENT, INTENT['amount']) for activity_id in batch_ids])
+        await asyncio.wait_for(asyncio.gather(*(job.done.wait() for job in jobs)), 5)
+        await queue.stop()
+
+        for activity_id in [single_id, *batch_ids]:
+            assert repository.activities[activity_id]['status'] == 'needs_review'
+            assert not repository.activities[activity_id]['locked']
+        await repository.reconcile_spend()
+        assert [reserved(repository, activity_id) for activity_id in [single_id, *batch_ids]] == [INTENT['amount']] * 3
+
+    asyncio.run(scenario())
+
+
+def age_locks(repository, activity_ids: list, seconds: float):
+    locked_at = (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat()
+    for activity_id in activity_ids:
+        repository.activities[activity_id]['locked_at'] = locked_at
+
+
+def test_sweep_requeues_activities_left_locked(repository):
+    async def scenario():
+        user_id = str(uuid.uuid4())
+        stale_id, fresh_id = await claimed_activities(repository, user_id, 2)
+        # Claimed by a worker that stopped before its transfer ran
+        age_locks(repository, [stale_id], 1000)
+
+        queue = new_queue()
+        await queue.start()
+        assert await queue.sweep() == {"settled": 0, "requeued": 1}
+        await asyncio.wait_for(queue.get(stale_id).done.wait(), 5)
+        await queue.stop()
+
+        assert repository.activities[stale_id]['status'] in ('executing', 'executed')
+        assert [tx['activity_id'] for tx in repository.transactions.values()] == [stale_id]
+        assert not repository.activities[stale_id]['locked']
+        assert reserved(repository, stale_id) == INTENT['amount']
+        assert repository.activities[fresh_id]['locked']
+        assert queue.get(fresh_id) is None
+
+    asyncio.run(scenario())
+
+
+def test_sweep_leaves_jobs_still_waiting_in_a_queue(repository):
+    async def scenario():
+        user_id = str(uuid.uuid4())
+        [activity_id] = await claimed_activities(repository, user_id, 1)
+
+        # Queued on a worker whose pool has not picked it up for longer than stale_after
+        busy = new_queue()
+        job = busy.enqueue(activity_id, user_id, INTENT, repository.policies[0]['id'], INTENT['amount'])
+        age_locks(repository, [activity_id], 1000)
+
+        assert await busy.sweep() == {"settled": 0, "requeued": 0}
+        other = new_queue()
+        assert await other.sweep() == {"settled": 0, "requeued": 0}
+        assert other.get(activity_id) is None
+
+        await busy.start()
+        await asyncio.wait_for(job.done.wait(), 5)
+        await busy.stop()
+        assert [tx['activity_id'] for tx in repository.transactions.values()] == [activity_id]
+        assert not repository.activities[activity_id]['locked']
+
+    asyncio.run(scenario())
+
+
+def test_sweep_settles_activities_with_recorded_transfer(repository):
+    async def scenario():
+        user_id = str(uuid.uuid4())
+        [activity_id] = await claimed_activities(repository, user_id, 1)
+        await repository.insert_transaction({'activity_id': activity_id, 'tx_hash': '0xhash', 'amount': INTENT['amount'], 'recipient': INTENT['recipient'], 'status': 'pending_on_chain'})
+        age_locks(repository, [activity_id], 1000)
+
+        queue = new_queue()
+        assert await queue.sweep() == {"settled": 1, "requeued": 0}
+        assert repository.activities[activity_id]['status'] == 'executing'
+        assert not repository.activities[activity_id]['locked']
+        assert queue.get(activity_id) is None
+        assert len(repository.transactions) == 1
+
+    asyncio.run(scenario())
@@ -35,6 +35,13 @@ export default function ActivityTimeline() {
                 bgColor: 'rgba(237, 237, 206, 0.1)',
                 label: 'Blocked by Policy'
             };
+        } else if (status === 'needs_review') {
+            return {
+                icon: AlertTriangle,
+                color: '#EF4444',
+                bgColor: 'rgba(239, 68, 68, 0.1)',
+                label: 'Needs Review'
+            };
         } else {
             return {
                 icon: AlertTriangle,
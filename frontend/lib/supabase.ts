@@ -41,7 +41,7 @@ export type AgentActivity = {
         recipientName?: string;
     };
     ai_reasoning: string;
-    status: 'pending_approval' | 'authorized' | 'executing' | 'executed' | 'rejected' | 'flagged_by_policy' | 'failed';
+    status: 'pending_approval' | 'authorized' | 'executing' | 'executed' | 'rejected' | 'flagged_by_policy' | 'failed' | 'needs_review';
     policy_checks?: {
         rule: string;
         passed: boolean;
@@ -59,7 +59,7 @@ export type Transaction = {
     amount: number;
     currency: string;
     recipient: string;
-    status: 'pending' | 'pending_on_chain' | 'confirmed' | 'failed';
+    status: 'pending' | 'pending_on_chain' | 'confirmed' | 'failed' | 'needs_review';
     confirmations: number;
     created_at: string;
     confirmed_at?: string;
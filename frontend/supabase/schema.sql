@@ -12,6 +12,12 @@ CREATE TABLE IF NOT EXISTS policies (
     required_approval_threshold NUMERIC NOT NULL DEFAULT 500,
     allow_list TEXT[] DEFAULT ARRAY['Stripe', 'Circle', 'Amazon']::TEXT[],
     block_list TEXT[] DEFAULT ARRAY[]::TEXT[],
+    vendor_aliases JSONB NOT NULL DEFAULT '{}'::JSONB,
+    -- Declarative rules on top of the columns above, e.g. [{"type": "velocity", "max_transactions": 20}];
+    -- see app/services/policy_rules.py for the types
+    rules JSONB NOT NULL DEFAULT '[]'::JSONB,
+    version INTEGER NOT NULL DEFAULT 1,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -30,9 +36,11 @@ CREATE TABLE IF NOT EXISTS agent_activities (
         'executed',
         'rejected',
         'flagged_by_policy',
-        'failed'
+        'failed',
+        'needs_review'
     )) DEFAULT 'pending_approval',
     policy_checks JSONB,
+    policy_version INTEGER,
     locked BOOLEAN DEFAULT FALSE,
     locked_at TIMESTAMP WITH TIME ZONE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
@@ -44,6 +52,7 @@ CREATE TABLE IF NOT EXISTS transactions (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     activity_id UUID REFERENCES agent_activities(id) ON DELETE CASCADE,
     tx_hash TEXT UNIQUE,
+    transfer_id TEXT,
     explorer_url TEXT,
     amount NUMERIC NOT NULL,
     currency TEXT DEFAULT 'USDC',
@@ -52,18 +61,135 @@ CREATE TABLE IF NOT EXISTS transactions (
         'pending',
         'pending_on_chain',
         'confirmed',
-        'failed'
+        'failed',
+        'needs_review'
     )) DEFAULT 'pending',
     confirmations INTEGER DEFAULT 0,
+    check_attempts INTEGER NOT NULL DEFAULT 0,
+    next_check_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     confirmed_at TIMESTAMP WITH TIME ZONE
 );
 
+-- Spend ledger: one row per reservation (positive) or refund (negative), never updated.
+-- spent_at is the moment the amount counts toward; refunds carry their reservation's.
+CREATE TABLE IF NOT EXISTS spend_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID,
+    activity_id UUID REFERENCES agent_activities(id) ON DELETE SET NULL,
+    amount NUMERIC NOT NULL,
+    spent_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Daily and monthly spend per user (UTC), maintained from the ledger by trigger.
+-- user_key is the user_id, or the nil UUID for the default tenant, so lookups are primary-key probes.
+CREATE TABLE IF NOT EXISTS spend_buckets (
+    user_key UUID NOT NULL,
+    period TEXT NOT NULL CHECK (period IN ('day', 'month')),
+    bucket_start DATE NOT NULL,
+    spent NUMERIC NOT NULL DEFAULT 0,
+    -- Activities with spend still reserved in the bucket, for velocity limits
+    transactions BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_key, period, bucket_start)
+);
+
+-- Dashboard rollups per user (user_key as in spend_buckets), kept current by triggers on
+-- agent_activities and spend_ledger so /api/activities/stats never scans activities.
+CREATE TABLE IF NOT EXISTS activity_status_counts (
+    user_key UUID NOT NULL,
+    status TEXT NOT NULL,
+    activities BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_key, status)
+);
+
+-- requested sums the amounts asked for; spent is the net ledger spend
+CREATE TABLE IF NOT EXISTS activity_vendor_totals (
+    user_key UUID NOT NULL,
+    vendor_key TEXT NOT NULL,
+    vendor TEXT NOT NULL,
+    activities BIGINT NOT NULL DEFAULT 0,
+    requested NUMERIC NOT NULL DEFAULT 0,
+    spent NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_key, vendor_key)
+);
+
+-- Upgrade databases created from an earlier version of this file: CREATE TABLE IF NOT EXISTS
+-- leaves existing tables as they are, so columns added since are added here
+ALTER TABLE policies ADD COLUMN IF NOT EXISTS user_id UUID;
+ALTER TABLE policies ADD COLUMN IF NOT EXISTS vendor_aliases JSONB NOT NULL DEFAULT '{}'::JSONB;
+ALTER TABLE policies ADD COLUMN IF NOT EXISTS rules JSONB NOT NULL DEFAULT '[]'::JSONB;
+ALTER TABLE policies ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE policies ADD COLUMN IF NOT EXISTS is_active BOOLEAN NOT NULL DEFAULT TRUE;
+ALTER TABLE agent_activities ADD COLUMN IF NOT EXISTS user_id UUID;
+ALTER TABLE agent_activities ADD COLUMN IF NOT EXISTS policy_version INTEGER;
+ALTER TABLE agent_activities ADD COLUMN IF NOT EXISTS locked BOOLEAN DEFAULT FALSE;
+ALTER TABLE agent_activities ADD COLUMN IF NOT EXISTS locked_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS transfer_id TEXT;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS check_attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS next_check_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+-- Status lists that grew since, under the names Postgres gave the inline checks
+ALTER TABLE agent_activities DROP CONSTRAINT IF EXISTS agent_activities_status_check;
+ALTER TABLE agent_activities ADD CONSTRAINT agent_activities_status_check CHECK (status IN (
+    'pending_approval',
+    'authorized',
+    'executing',
+    'executed',
+    'rejected',
+    'flagged_by_policy',
+    'failed',
+    'needs_review'
+));
+ALTER TABLE transactions DROP CONSTRAINT IF EXISTS transactions_status_check;
+ALTER TABLE transactions ADD CONSTRAINT transactions_status_check CHECK (status IN (
+    'pending',
+    'pending_on_chain',
+    'confirmed',
+    'failed',
+    'needs_review'
+));
+
+-- Policies used to be edited in place, newest row first; every row gets is_active when the
+-- column is added, so keep only each user's newest one active before the unique index
+UPDATE policies p
+   SET is_active = FALSE
+ WHERE p.is_active
+   AND EXISTS (
+       SELECT 1 FROM policies n
+        WHERE n.user_id IS NOT DISTINCT FROM p.user_id AND n.is_active
+          AND (n.created_at, n.id) > (p.created_at, p.id)
+   );
+
 -- Create indexes
-CREATE INDEX IF NOT EXISTS idx_agent_activities_user_id ON agent_activities(user_id);
-CREATE INDEX IF NOT EXISTS idx_agent_activities_status ON agent_activities(status);
+-- One active policy per user, and one for the default tenant (NULL user_id). Two partial
+-- indexes rather than NULLS NOT DISTINCT, which needs Postgres 15
+CREATE UNIQUE INDEX IF NOT EXISTS idx_policies_active_user ON policies(user_id) WHERE is_active AND user_id IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_policies_active_default ON policies((user_id IS NULL)) WHERE is_active AND user_id IS NULL;
+CREATE INDEX IF NOT EXISTS idx_policies_user_id_created_at ON policies(user_id, created_at DESC);
+-- Keyset pagination on (created_at, id), alone or filtered by user/status. Lookups on
+-- user_id or status alone use the leading column of the user_id / status indexes, which
+-- replace the single-column ones earlier versions created
+DROP INDEX IF EXISTS idx_agent_activities_user_id;
+DROP INDEX IF EXISTS idx_agent_activities_status;
+CREATE INDEX IF NOT EXISTS idx_agent_activities_created_at_id ON agent_activities(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_agent_activities_user_id_created_at ON agent_activities(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_agent_activities_user_id_status_created_at ON agent_activities(user_id, status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_agent_activities_status_created_at ON agent_activities(status, created_at DESC, id DESC);
+-- Stale-lock sweep: only locked activities, oldest lock first
+CREATE INDEX IF NOT EXISTS idx_agent_activities_locked_at ON agent_activities(locked_at) WHERE locked;
 CREATE INDEX IF NOT EXISTS idx_transactions_activity_id ON transactions(activity_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_tx_hash ON transactions(tx_hash);
+CREATE INDEX IF NOT EXISTS idx_spend_ledger_activity_id ON spend_ledger(activity_id);
+CREATE INDEX IF NOT EXISTS idx_spend_ledger_spent_at ON spend_ledger(spent_at);
+-- Top vendors by spend
+CREATE INDEX IF NOT EXISTS idx_activity_vendor_totals_user_spent ON activity_vendor_totals(user_key, spent DESC, requested DESC);
+-- Confirmation poller: only in-flight transfers, in due order
+CREATE INDEX IF NOT EXISTS idx_transactions_pending_due ON transactions(next_check_at, created_at, id)
+    WHERE status = 'pending_on_chain';
 
 -- Updated at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -75,28 +201,821 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- Apply trigger to policies
+DROP TRIGGER IF EXISTS update_policies_updated_at ON policies;
 CREATE TRIGGER update_policies_updated_at
     BEFORE UPDATE ON policies
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Bump policies.version when the rules change (spend updates keep the version)
+CREATE OR REPLACE FUNCTION bump_policy_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (NEW.max_tx_amount, NEW.daily_budget, NEW.monthly_budget, NEW.required_approval_threshold, NEW.allow_list, NEW.block_list, NEW.vendor_aliases, NEW.rules)
+        IS DISTINCT FROM
+       (OLD.max_tx_amount, OLD.daily_budget, OLD.monthly_budget, OLD.required_approval_threshold, OLD.allow_list, OLD.block_list, OLD.vendor_aliases, OLD.rules)
+    THEN
+        NEW.version = OLD.version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_policies_version ON policies;
+CREATE TRIGGER bump_policies_version
+    BEFORE UPDATE ON policies
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_policy_version();
+
 -- Apply trigger to agent_activities
+DROP TRIGGER IF EXISTS update_agent_activities_updated_at ON agent_activities;
 CREATE TRIGGER update_agent_activities_updated_at
     BEFORE UPDATE ON agent_activities
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Active policy of a user (NULL for the default tenant), via idx_policies_active_user or idx_policies_active_default.
+-- Two branches so each is a plain index probe; IS NOT DISTINCT FROM is not indexable.
+CREATE OR REPLACE FUNCTION active_policy_id(p_user_id UUID)
+RETURNS UUID AS $$
+    SELECT id FROM policies WHERE user_id = p_user_id AND is_active
+    UNION ALL
+    SELECT id FROM policies WHERE p_user_id IS NULL AND user_id IS NULL AND is_active
+    LIMIT 1;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION tenant_key(p_user_id UUID)
+RETURNS UUID AS $$
+    SELECT COALESCE(p_user_id, '00000000-0000-0000-0000-000000000000'::UUID);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Spend of a user in the day and month containing p_at: two primary-key lookups,
+-- however much history the ledger holds
+CREATE OR REPLACE FUNCTION spend_window(p_user_id UUID, p_at TIMESTAMPTZ DEFAULT NOW())
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'current_daily_spent', COALESCE((
+            SELECT spent FROM spend_buckets
+             WHERE user_key = tenant_key(p_user_id) AND period = 'day'
+               AND bucket_start = (p_at AT TIME ZONE 'UTC')::DATE
+        ), 0),
+        'current_monthly_spent', COALESCE((
+            SELECT spent FROM spend_buckets
+             WHERE user_key = tenant_key(p_user_id) AND period = 'month'
+               AND bucket_start = date_trunc('month', p_at AT TIME ZONE 'UTC')::DATE
+        ), 0),
+        'current_daily_transactions', COALESCE((
+            SELECT transactions FROM spend_buckets
+             WHERE user_key = tenant_key(p_user_id) AND period = 'day'
+               AND bucket_start = (p_at AT TIME ZONE 'UTC')::DATE
+        ), 0)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- The user's active policy with its current spend windows
+CREATE OR REPLACE FUNCTION current_policy(p_user_id UUID DEFAULT NULL)
+RETURNS JSONB AS $$
+    SELECT to_jsonb(p) || spend_window(p.user_id)
+      FROM policies p
+     WHERE p.id = active_policy_id(p_user_id);
+$$ LANGUAGE sql STABLE;
+
+-- Roll each ledger row into its day and month buckets and its vendor's total.
+-- An activity counts as one transaction in its buckets while any of its spend is reserved.
+-- policies.current_monthly_spent mirrors the current month for readers of the policies table.
+CREATE OR REPLACE FUNCTION apply_spend_entry()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_net NUMERIC;
+    v_transactions INTEGER := 0;
+BEGIN
+    IF NEW.activity_id IS NOT NULL THEN
+        SELECT SUM(amount) INTO v_net FROM spend_ledger WHERE activity_id = NEW.activity_id;
+        v_transactions := CASE
+            WHEN v_net > 0 AND v_net - NEW.amount <= 0 THEN 1
+            WHEN v_net <= 0 AND v_net - NEW.amount > 0 THEN -1
+            ELSE 0
+        END;
+    END IF;
+
+    INSERT INTO spend_buckets (user_key, period, bucket_start, spent, transactions)
+    VALUES
+        (tenant_key(NEW.user_id), 'day', (NEW.spent_at AT TIME ZONE 'UTC')::DATE, NEW.amount, v_transactions),
+        (tenant_key(NEW.user_id), 'month', date_trunc('month', NEW.spent_at AT TIME ZONE 'UTC')::DATE, NEW.amount, v_transactions)
+    ON CONFLICT (user_key, period, bucket_start)
+    DO UPDATE SET spent = spend_buckets.spent + EXCLUDED.spent,
+                  transactions = spend_buckets.transactions + EXCLUDED.transactions,
+                  updated_at = NOW();
+
+    UPDATE activity_vendor_totals v
+       SET spent = v.spent + NEW.amount, updated_at = NOW()
+      FROM agent_activities a
+     WHERE a.id = NEW.activity_id
+       AND v.user_key = tenant_key(a.user_id)
+       AND v.vendor_key = lower(btrim(a.structured_intent->>'recipientName'));
+
+    UPDATE policies
+       SET current_monthly_spent = (spend_window(NEW.user_id)->>'current_monthly_spent')::NUMERIC
+     WHERE id = active_policy_id(NEW.user_id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS spend_ledger_buckets ON spend_ledger;
+CREATE TRIGGER spend_ledger_buckets
+    AFTER INSERT ON spend_ledger
+    FOR EACH ROW
+    EXECUTE FUNCTION apply_spend_entry();
+
+-- Refund what is still reserved for an activity, at most p_amount, into the
+-- window it was reserved in. Refunding twice is a no-op.
+CREATE OR REPLACE FUNCTION refund_spend(p_activity_id UUID, p_amount NUMERIC)
+RETURNS VOID AS $$
+    INSERT INTO spend_ledger (user_id, activity_id, amount, spent_at)
+    SELECT user_id, activity_id, -LEAST(p_amount, SUM(amount)), MIN(spent_at) FILTER (WHERE amount > 0)
+      FROM spend_ledger
+     WHERE activity_id = p_activity_id
+     GROUP BY user_id, activity_id
+    HAVING SUM(amount) > 0;
+$$ LANGUAGE sql;
+
+-- The tightest velocity rule in a policy's `rules`, or NULL without one
+CREATE OR REPLACE FUNCTION velocity_limit(p_rules JSONB)
+RETURNS INTEGER AS $$
+    SELECT MIN(trunc((r->>'max_transactions')::NUMERIC))::INTEGER
+      FROM jsonb_array_elements(COALESCE(p_rules, '[]'::JSONB)) AS r
+     WHERE r->>'type' = 'velocity';
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Atomically claim an activity for execution and reserve its spend.
+-- The conditional UPDATE takes the lock only if nobody holds it, and the
+-- policy row is locked while the budget is checked and the spend reserved,
+-- so concurrent approvals can neither double-execute nor overspend.
+-- The spend is checked against the daily and monthly windows and the
+-- velocity limit of the activity's owner and reserved as a ledger entry;
+-- activities of other users than p_user_id are reported as not found.
+DROP FUNCTION IF EXISTS claim_activity(UUID);
+CREATE OR REPLACE FUNCTION claim_activity(p_activity_id UUID, p_user_id UUID DEFAULT NULL)
+RETURNS JSONB AS $$
+DECLARE
+    v_activity agent_activities%ROWTYPE;
+    v_policy policies%ROWTYPE;
+    v_snapshot JSONB;
+    v_amount NUMERIC;
+BEGIN
+    UPDATE agent_activities
+       SET locked = TRUE, locked_at = NOW(), status = 'executing'
+     WHERE id = p_activity_id
+       AND user_id IS NOT DISTINCT FROM p_user_id
+       AND NOT COALESCE(locked, FALSE)
+       AND status IN ('pending_approval', 'flagged_by_policy')
+    RETURNING * INTO v_activity;
+
+    IF NOT FOUND THEN
+        SELECT * INTO v_activity FROM agent_activities
+         WHERE id = p_activity_id AND user_id IS NOT DISTINCT FROM p_user_id;
+        IF NOT FOUND THEN
+            RETURN jsonb_build_object('outcome', 'not_found');
+        ELSIF COALESCE(v_activity.locked, FALSE) THEN
+            RETURN jsonb_build_object('outcome', 'locked', 'activity', to_jsonb(v_activity));
+        END IF;
+        RETURN jsonb_build_object('outcome', 'invalid_status', 'activity', to_jsonb(v_activity));
+    END IF;
+
+    v_amount := COALESCE((v_activity.structured_intent->>'amount')::NUMERIC, 0);
+
+    SELECT * INTO v_policy FROM policies WHERE id = active_policy_id(v_activity.user_id) FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('outcome', 'claimed', 'activity', to_jsonb(v_activity), 'policy', NULL, 'amount', v_amount);
+    END IF;
+
+    v_snapshot := to_jsonb(v_policy) || spend_window(v_activity.user_id);
+
+    IF v_amount > v_policy.max_tx_amount
+       OR (v_snapshot->>'current_monthly_spent')::NUMERIC + v_amount > v_policy.monthly_budget
+       OR (v_snapshot->>'current_daily_spent')::NUMERIC + v_amount > v_policy.daily_budget
+       OR (v_snapshot->>'current_daily_transactions')::INTEGER >= velocity_limit(v_policy.rules) THEN
+        UPDATE agent_activities
+           SET status = 'flagged_by_policy', locked = FALSE
+         WHERE id = p_activity_id
+        RETURNING * INTO v_activity;
+        RETURN jsonb_build_object('outcome', 'over_budget', 'activity', to_jsonb(v_activity), 'policy', v_snapshot, 'amount', v_amount);
+    END IF;
+
+    IF v_amount > 0 THEN
+        INSERT INTO spend_ledger (user_id, activity_id, amount)
+        VALUES (v_activity.user_id, p_activity_id, v_amount);
+    END IF;
+
+    RETURN jsonb_build_object('outcome', 'claimed', 'activity', to_jsonb(v_activity), 'policy', v_snapshot, 'amount', v_amount);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Unlock a claimed activity with its final status and refund its reservation
+CREATE OR REPLACE FUNCTION release_activity(p_activity_id UUID, p_status TEXT, p_policy_id UUID, p_refund NUMERIC)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE agent_activities
+       SET status = p_status, locked = FALSE
+     WHERE id = p_activity_id;
+
+    IF p_policy_id IS NOT NULL AND p_refund > 0 THEN
+        PERFORM refund_spend(p_activity_id, p_refund);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Claim a batch of one user's activities for execution in one call.
+-- All claimable activities are locked by a single UPDATE, then the policy
+-- row, in the same order as claim_activity so single and batch claims
+-- cannot deadlock. p_rejected are the ids the caller's checks of the
+-- rules SQL cannot evaluate (vendor lists, time windows, vendor caps)
+-- already failed: they are flagged without reserving anything. The rest
+-- are checked in request order, each against the spend window and the
+-- velocity limit plus what the ones before it reserved; those that no
+-- longer fit are flagged and unlocked, the rest reserved with one
+-- multi-row ledger insert.
+-- Returns {"policy": snapshot before the batch, "results": [{"id",
+-- "outcome", "activity", "amount"}]} in request order, with the outcomes
+-- of claim_activity plus "rejected".
+DROP FUNCTION IF EXISTS claim_activities(UUID[], UUID);
+CREATE OR REPLACE FUNCTION claim_activities(p_activity_ids UUID[], p_user_id UUID DEFAULT NULL, p_rejected UUID[] DEFAULT '{}')
+RETURNS JSONB AS $$
+DECLARE
+    v_claimed JSONB;
+    v_activity JSONB;
+    v_policy policies%ROWTYPE;
+    v_snapshot JSONB;
+    v_monthly NUMERIC;
+    v_daily NUMERIC;
+    v_transactions INTEGER;
+    v_max_transactions INTEGER;
+    v_amount NUMERIC;
+    v_results JSONB := '{}'::JSONB;
+    v_flagged UUID[] := '{}';
+    v_reserved_ids UUID[] := '{}';
+    v_reserved_amounts NUMERIC[] := '{}';
+BEGIN
+    -- Row locks in id order, so overlapping batches queue instead of deadlocking
+    PERFORM 1 FROM agent_activities
+      WHERE id = ANY(p_activity_ids) AND user_id IS NOT DISTINCT FROM p_user_id
+      ORDER BY id
+        FOR UPDATE;
+
+    WITH requested AS (
+        SELECT id, ord FROM unnest(p_activity_ids) WITH ORDINALITY AS r(id, ord)
+    ), claimed AS (
+        UPDATE agent_activities a
+           SET locked = TRUE, locked_at = NOW(), status = 'executing'
+          FROM requested r
+         WHERE a.id = r.id
+           AND a.user_id IS NOT DISTINCT FROM p_user_id
+           AND NOT COALESCE(a.locked, FALSE)
+           AND a.status IN ('pending_approval', 'flagged_by_policy')
+        RETURNING a.*, r.ord
+    )
+    SELECT COALESCE(jsonb_agg(to_jsonb(c) ORDER BY c.ord), '[]'::JSONB) INTO v_claimed FROM claimed c;
+
+    SELECT * INTO v_policy FROM policies WHERE id = active_policy_id(p_user_id) FOR UPDATE;
+    IF FOUND THEN
+        v_snapshot := to_jsonb(v_policy) || spend_window(p_user_id);
+        v_monthly := (v_snapshot->>'current_monthly_spent')::NUMERIC;
+        v_daily := (v_snapshot->>'current_daily_spent')::NUMERIC;
+        v_transactions := (v_snapshot->>'current_daily_transactions')::INTEGER;
+        v_max_transactions := velocity_limit(v_policy.rules);
+    END IF;
+
+    FOR v_activity IN SELECT value - 'ord' FROM jsonb_array_elements(v_claimed) LOOP
+        v_amount := COALESCE((v_activity->'structured_intent'->>'amount')::NUMERIC, 0);
+
+        IF (v_activity->>'id')::UUID = ANY(p_rejected) OR (v_snapshot IS NOT NULL AND (
+               v_amount > v_policy.max_tx_amount
+            OR v_monthly + v_amount > v_policy.monthly_budget
+            OR v_daily + v_amount > v_policy.daily_budget
+            OR v_transactions >= v_max_transactions)) THEN
+            v_flagged := v_flagged || (v_activity->>'id')::UUID;
+            v_results := v_results || jsonb_build_object(v_activity->>'id', jsonb_build_object(
+                'outcome', CASE WHEN (v_activity->>'id')::UUID = ANY(p_rejected) THEN 'rejected' ELSE 'over_budget' END,
+                'activity', v_activity || '{"status": "flagged_by_policy", "locked": false}'::JSONB,
+                'amount', v_amount));
+            CONTINUE;
+        END IF;
+
+        IF v_snapshot IS NOT NULL AND v_amount > 0 THEN
+            v_monthly := v_monthly + v_amount;
+            v_daily := v_daily + v_amount;
+            v_transactions := v_transactions + 1;
+            v_reserved_ids := v_reserved_ids || (v_activity->>'id')::UUID;
+            v_reserved_amounts := v_reserved_amounts || v_amount;
+        END IF;
+        v_results := v_results || jsonb_build_object(v_activity->>'id', jsonb_build_object(
+            'outcome', 'claimed', 'activity', v_activity, 'amount', v_amount));
+    END LOOP;
+
+    IF cardinality(v_flagged) > 0 THEN
+        UPDATE agent_activities
+           SET status = 'flagged_by_policy', locked = FALSE
+         WHERE id = ANY(v_flagged);
+    END IF;
+
+    INSERT INTO spend_ledger (user_id, activity_id, amount)
+    SELECT p_user_id, r.id, r.amount
+      FROM unnest(v_reserved_ids, v_reserved_amounts) AS r(id, amount);
+
+    -- Whatever was not claimed: missing, held by another approval or already decided
+    SELECT v_results || COALESCE(jsonb_object_agg(r.id, CASE
+               WHEN a.id IS NULL THEN jsonb_build_object('outcome', 'not_found')
+               WHEN COALESCE(a.locked, FALSE) THEN jsonb_build_object('outcome', 'locked', 'activity', to_jsonb(a))
+               ELSE jsonb_build_object('outcome', 'invalid_status', 'activity', to_jsonb(a))
+           END), '{}'::JSONB)
+      INTO v_results
+      FROM unnest(p_activity_ids) AS r(id)
+      LEFT JOIN agent_activities a ON a.id = r.id AND a.user_id IS NOT DISTINCT FROM p_user_id
+     WHERE NOT v_results ? r.id::TEXT;
+
+    RETURN jsonb_build_object('policy', v_snapshot, 'results', (
+        SELECT COALESCE(jsonb_agg(v_results->(r.id::TEXT) || jsonb_build_object('id', r.id) ORDER BY r.ord), '[]'::JSONB)
+          FROM unnest(p_activity_ids) WITH ORDINALITY AS r(id, ord)
+    ));
+END;
+$$ LANGUAGE plpgsql;
+
+-- Unlock many claimed activities with their final status in one statement
+-- p_updates: [{"id", "status", "refund"}]; up to "refund" of each activity's
+-- reservation goes back to the window it was reserved in.
+CREATE OR REPLACE FUNCTION settle_activities(p_updates JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    WITH updates AS (
+        SELECT * FROM jsonb_to_recordset(p_updates) AS u(id UUID, status TEXT, refund NUMERIC)
+    ), settled AS (
+        UPDATE agent_activities a
+           SET status = u.status, locked = FALSE
+          FROM updates u
+         WHERE a.id = u.id
+        RETURNING a.id
+    ), refunds AS (
+        INSERT INTO spend_ledger (user_id, activity_id, amount, spent_at)
+        SELECT l.user_id, l.activity_id, -LEAST(MIN(u.refund), SUM(l.amount)), MIN(l.spent_at) FILTER (WHERE l.amount > 0)
+          FROM updates u
+          JOIN spend_ledger l ON l.activity_id = u.id
+         WHERE u.refund > 0
+         GROUP BY l.user_id, l.activity_id
+        HAVING SUM(l.amount) > 0
+        RETURNING id
+    )
+    SELECT COUNT(*) INTO v_count FROM settled;
+
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reject one user's activities that are awaiting a decision, in one statement.
+-- Returns [{"id", "outcome", "status"}] in request order; outcome is
+-- 'rejected', 'not_found', 'locked' or 'invalid_status'.
+CREATE OR REPLACE FUNCTION deny_activities(p_activity_ids UUID[], p_user_id UUID DEFAULT NULL)
+RETURNS JSONB AS $$
+    WITH denied AS (
+        UPDATE agent_activities
+           SET status = 'rejected'
+         WHERE id = ANY(p_activity_ids)
+           AND user_id IS NOT DISTINCT FROM p_user_id
+           AND NOT COALESCE(locked, FALSE)
+           AND status IN ('pending_approval', 'flagged_by_policy')
+        RETURNING id
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+               'id', r.id,
+               'outcome', CASE
+                   WHEN d.id IS NOT NULL THEN 'rejected'
+                   WHEN a.id IS NULL THEN 'not_found'
+                   WHEN COALESCE(a.locked, FALSE) THEN 'locked'
+                   ELSE 'invalid_status'
+               END,
+               'status', CASE WHEN d.id IS NOT NULL THEN 'rejected' ELSE a.status END
+           ) ORDER BY r.ord), '[]'::JSONB)
+      FROM unnest(p_activity_ids) WITH ORDINALITY AS r(id, ord)
+      LEFT JOIN denied d ON d.id = r.id
+      LEFT JOIN agent_activities a ON a.id = r.id AND a.user_id IS NOT DISTINCT FROM p_user_id;
+$$ LANGUAGE sql;
+
+-- Take over activities left locked by a worker that stopped mid-transfer.
+-- Activities locked for longer than p_stale_seconds are row-locked with SKIP
+-- LOCKED, so sweeps running on several workers take different rows. Those
+-- whose transaction was recorded get the status it implies and are
+-- unlocked; the others have locked_at renewed, leasing them to the caller,
+-- which retries the transfer under the activity's idempotency key.
+-- Returns {"settled": [{"id", "user_id", "status"}], "requeued": [{"id",
+-- "user_id", "structured_intent", "policy_id", "amount"}]}, where amount is
+-- the spend still reserved for the activity.
+CREATE OR REPLACE FUNCTION recover_stale_activities(p_stale_seconds NUMERIC, p_limit INTEGER DEFAULT 100)
+RETURNS JSONB AS $$
+DECLARE
+    v_ids UUID[];
+    v_settled JSONB;
+    v_requeued JSONB;
+BEGIN
+    SELECT array_agg(id) INTO v_ids FROM (
+        SELECT id FROM agent_activities
+         WHERE locked AND locked_at < NOW() - make_interval(secs => p_stale_seconds)
+         ORDER BY locked_at
+         LIMIT p_limit
+           FOR UPDATE SKIP LOCKED
+    ) stale;
+
+    IF v_ids IS NULL THEN
+        RETURN jsonb_build_object('settled', '[]'::JSONB, 'requeued', '[]'::JSONB);
+    END IF;
+
+    WITH recorded AS (
+        SELECT activity_id, bool_or(status = 'confirmed') AS confirmed
+          FROM transactions
+         WHERE activity_id = ANY(v_ids) AND status <> 'failed'
+         GROUP BY activity_id
+    ), settled AS (
+        UPDATE agent_activities a
+           SET status = CASE WHEN r.confirmed THEN 'executed' ELSE 'executing' END, locked = FALSE
+          FROM recorded r
+         WHERE a.id = r.activity_id
+        RETURNING a.id, a.user_id, a.status
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object('id', id, 'user_id', user_id, 'status', status)), '[]'::JSONB)
+      INTO v_settled
+      FROM settled;
+
+    WITH requeued AS (
+        UPDATE agent_activities
+           SET locked_at = NOW()
+         WHERE id = ANY(v_ids) AND locked
+        RETURNING id, user_id, structured_intent
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+               'id', q.id,
+               'user_id', q.user_id,
+               'structured_intent', q.structured_intent,
+               'policy_id', p.id,
+               'amount', COALESCE((SELECT SUM(l.amount) FROM spend_ledger l WHERE l.activity_id = q.id), 0)
+           )), '[]'::JSONB)
+      INTO v_requeued
+      FROM requeued q
+      LEFT JOIN policies p ON p.user_id IS NOT DISTINCT FROM q.user_id AND p.is_active;
+
+    RETURN jsonb_build_object('settled', v_settled, 'requeued', v_requeued);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keep the activities a transfer worker still holds from looking stale to
+-- recover_stale_activities, however long they wait in its queue. Returns the
+-- number of locks renewed.
+CREATE OR REPLACE FUNCTION renew_activity_locks(p_activity_ids UUID[])
+RETURNS INTEGER AS $$
+    WITH renewed AS (
+        UPDATE agent_activities
+           SET locked_at = NOW()
+         WHERE id = ANY(p_activity_ids) AND locked
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM renewed;
+$$ LANGUAGE sql;
+
+-- Lease a page of pending on-chain transactions due for a status check.
+-- Rows are taken with SKIP LOCKED and their next_check_at pushed out by
+-- p_lease_seconds, so pollers on other workers skip them until this one
+-- writes its results back (or the lease runs out if it never does).
+-- Returns [{"id", "activity_id", "tx_hash", "transfer_id", "check_attempts",
+-- "created_at", "activity": {"user_id"}}], oldest due first.
+CREATE OR REPLACE FUNCTION claim_pending_transactions(p_limit INTEGER DEFAULT 500, p_lease_seconds NUMERIC DEFAULT 60)
+RETURNS JSONB AS $$
+    WITH due AS (
+        SELECT id FROM transactions
+         WHERE status = 'pending_on_chain' AND next_check_at <= NOW()
+         ORDER BY next_check_at, created_at, id
+         LIMIT p_limit
+           FOR UPDATE SKIP LOCKED
+    ), leased AS (
+        UPDATE transactions t
+           SET next_check_at = NOW() + make_interval(secs => p_lease_seconds)
+          FROM due
+         WHERE t.id = due.id
+        RETURNING t.id, t.activity_id, t.tx_hash, t.transfer_id, t.check_attempts, t.created_at
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+               'id', l.id,
+               'activity_id', l.activity_id,
+               'tx_hash', l.tx_hash,
+               'transfer_id', l.transfer_id,
+               'check_attempts', l.check_attempts,
+               'created_at', l.created_at,
+               'activity', jsonb_build_object('user_id', a.user_id)
+           ) ORDER BY l.created_at, l.id), '[]'::JSONB)
+      FROM leased l
+      LEFT JOIN agent_activities a ON a.id = l.activity_id;
+$$ LANGUAGE sql;
+
+-- Apply a page of confirmation-poller results in one statement
+-- p_updates: [{"id", "status", "confirmations", "tx_hash", "next_check_in_seconds"}]
+-- Confirmed transfers move their activity to 'executed'; failed ones fail it
+-- and refund what is still reserved for them in the spend ledger. Transfers
+-- the poller gave up on move, with their activity, to 'needs_review' and
+-- keep their reservation.
+CREATE OR REPLACE FUNCTION apply_transaction_updates(p_updates JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    WITH updates AS (
+        SELECT * FROM jsonb_to_recordset(p_updates)
+            AS u(id UUID, status TEXT, confirmations INTEGER, tx_hash TEXT, next_check_in_seconds NUMERIC)
+    ), changed AS (
+        UPDATE transactions t
+           SET status = COALESCE(u.status, t.status),
+               confirmations = COALESCE(u.confirmations, t.confirmations),
+               tx_hash = COALESCE(u.tx_hash, t.tx_hash),
+               confirmed_at = CASE WHEN u.status = 'confirmed' THEN NOW() ELSE t.confirmed_at END,
+               check_attempts = t.check_attempts + 1,
+               next_check_at = NOW() + make_interval(secs => COALESCE(u.next_check_in_seconds, 0))
+          FROM updates u
+         WHERE t.id = u.id AND t.status = 'pending_on_chain'
+        RETURNING t.activity_id, t.status, t.amount
+    ), activities AS (
+        UPDATE agent_activities a
+           SET status = CASE c.status WHEN 'confirmed' THEN 'executed' ELSE c.status END
+          FROM changed c
+         WHERE a.id = c.activity_id AND c.status IN ('confirmed', 'failed', 'needs_review')
+        RETURNING a.id
+    ), refunds AS (
+        INSERT INTO spend_ledger (user_id, activity_id, amount, spent_at)
+        SELECT l.user_id, l.activity_id, -SUM(l.amount), MIN(l.spent_at) FILTER (WHERE l.amount > 0)
+          FROM changed c
+          JOIN spend_ledger l ON l.activity_id = c.activity_id
+         WHERE c.status = 'failed'
+         GROUP BY l.user_id, l.activity_id
+        HAVING SUM(l.amount) > 0
+        RETURNING id
+    )
+    SELECT COUNT(*) INTO v_count FROM changed;
+
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Bring the ledger in line with transactions and rebuild the buckets from it,
+-- for every month from the one containing p_since. Adds the reservation of
+-- live transfers the ledger never saw, releases reservations of activities
+-- that ended without one, then re-aggregates the day and month buckets and
+-- refreshes policies.current_monthly_spent (which also rolls it over at
+-- month start). Concurrent claims keep working: their bucket upserts wait
+-- for the rebuild and land on top of it.
+CREATE OR REPLACE FUNCTION reconcile_spend(p_since TIMESTAMPTZ DEFAULT NULL)
+RETURNS JSONB AS $$
+DECLARE
+    v_since TIMESTAMPTZ;
+    v_reserved INTEGER;
+    v_released INTEGER;
+    v_buckets INTEGER;
+    v_policies INTEGER;
+BEGIN
+    -- One reconcile at a time across workers
+    PERFORM pg_advisory_xact_lock(hashtext('reconcile_spend'));
+
+    v_since := date_trunc('month', COALESCE(p_since, NOW() - INTERVAL '1 month') AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+
+    WITH inserted AS (
+        INSERT INTO spend_ledger (user_id, activity_id, amount, spent_at)
+        SELECT a.user_id, t.activity_id, SUM(t.amount), MIN(t.created_at)
+          FROM transactions t
+          JOIN agent_activities a ON a.id = t.activity_id
+         WHERE t.status <> 'failed' AND t.created_at >= v_since
+           AND NOT EXISTS (SELECT 1 FROM spend_ledger l WHERE l.activity_id = t.activity_id)
+         GROUP BY a.user_id, t.activity_id
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO v_reserved FROM inserted;
+
+    WITH inserted AS (
+        INSERT INTO spend_ledger (user_id, activity_id, amount, spent_at)
+        SELECT l.user_id, l.activity_id, -SUM(l.amount), MIN(l.spent_at) FILTER (WHERE l.amount > 0)
+          FROM spend_ledger l
+          JOIN agent_activities a ON a.id = l.activity_id
+         WHERE l.spent_at >= v_since
+           -- needs_review activities moved money without a transaction row; they keep it
+           AND a.status IN ('pending_approval', 'flagged_by_policy', 'rejected', 'failed')
+           AND NOT COALESCE(a.locked, FALSE)
+           AND NOT EXISTS (SELECT 1 FROM transactions t WHERE t.activity_id = l.activity_id AND t.status <> 'failed')
+         GROUP BY l.user_id, l.activity_id
+        HAVING SUM(l.amount) > 0
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO v_released FROM inserted;
+
+    DELETE FROM spend_buckets WHERE bucket_start >= (v_since AT TIME ZONE 'UTC')::DATE;
+    WITH activity_days AS (
+        SELECT tenant_key(user_id) AS user_key, activity_id, (spent_at AT TIME ZONE 'UTC')::DATE AS day, SUM(amount) AS net
+          FROM spend_ledger WHERE spent_at >= v_since
+         GROUP BY 1, 2, 3
+    )
+    INSERT INTO spend_buckets (user_key, period, bucket_start, spent, transactions)
+    SELECT user_key, 'day', day, SUM(net), COUNT(*) FILTER (WHERE activity_id IS NOT NULL AND net > 0)
+      FROM activity_days
+     GROUP BY 1, 3
+    UNION ALL
+    SELECT user_key, 'month', date_trunc('month', day)::DATE, SUM(net), COUNT(*) FILTER (WHERE activity_id IS NOT NULL AND net > 0)
+      FROM activity_days
+     GROUP BY 1, 3;
+    GET DIAGNOSTICS v_buckets = ROW_COUNT;
+
+    UPDATE policies p
+       SET current_monthly_spent = w.spent
+      FROM (
+        SELECT id, (spend_window(user_id)->>'current_monthly_spent')::NUMERIC AS spent
+          FROM policies WHERE is_active
+      ) w
+     WHERE p.id = w.id AND p.current_monthly_spent IS DISTINCT FROM w.spent;
+    GET DIAGNOSTICS v_policies = ROW_COUNT;
+
+    RETURN jsonb_build_object(
+        'since', v_since,
+        'reserved', v_reserved,
+        'released', v_released,
+        'buckets', v_buckets,
+        'policies', v_policies
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Fold activity row versions into the dashboard rollups
+-- p_rows: activity rows as JSON, each with a "sign": 1 when added, -1 when removed
+CREATE OR REPLACE FUNCTION apply_activity_rollup(p_rows JSONB)
+RETURNS VOID AS $$
+    WITH changes AS (
+        SELECT tenant_key(r.user_id) AS user_key,
+               r.status,
+               r.sign,
+               btrim(r.structured_intent->>'recipientName') AS vendor,
+               COALESCE((r.structured_intent->>'amount')::NUMERIC, 0) AS amount
+          FROM jsonb_to_recordset(p_rows) AS r(user_id UUID, status TEXT, structured_intent JSONB, sign INTEGER)
+    ), statuses AS (
+        INSERT INTO activity_status_counts (user_key, status, activities)
+        SELECT user_key, status, SUM(sign)
+          FROM changes
+         WHERE status IS NOT NULL
+         GROUP BY user_key, status
+        HAVING SUM(sign) <> 0
+        ON CONFLICT (user_key, status)
+        DO UPDATE SET activities = activity_status_counts.activities + EXCLUDED.activities, updated_at = NOW()
+    )
+    INSERT INTO activity_vendor_totals (user_key, vendor_key, vendor, activities, requested)
+    SELECT user_key, lower(vendor), MIN(vendor), SUM(sign), SUM(sign * amount)
+      FROM changes
+     WHERE vendor <> ''
+     GROUP BY user_key, lower(vendor)
+    HAVING SUM(sign) <> 0 OR SUM(sign * amount) <> 0
+    ON CONFLICT (user_key, vendor_key)
+    DO UPDATE SET activities = activity_vendor_totals.activities + EXCLUDED.activities,
+                  requested = activity_vendor_totals.requested + EXCLUDED.requested,
+                  updated_at = NOW();
+$$ LANGUAGE sql;
+
+-- Statement-level, so a bulk insert or update costs one rollup write per user and status
+CREATE OR REPLACE FUNCTION rollup_activities()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM apply_activity_rollup((SELECT jsonb_agg(to_jsonb(n) || '{"sign": 1}') FROM new_rows n));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM apply_activity_rollup((SELECT jsonb_agg(to_jsonb(o) || '{"sign": -1}') FROM old_rows o));
+    ELSE
+        -- Only rows whose status, intent or owner changed move between rollups
+        PERFORM apply_activity_rollup((
+            SELECT jsonb_agg(version)
+              FROM new_rows n
+              JOIN old_rows o ON o.id = n.id
+             CROSS JOIN LATERAL (VALUES (to_jsonb(n) || '{"sign": 1}'), (to_jsonb(o) || '{"sign": -1}')) AS v(version)
+             WHERE (n.status, n.structured_intent, n.user_id) IS DISTINCT FROM (o.status, o.structured_intent, o.user_id)
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS agent_activities_rollup_insert ON agent_activities;
+CREATE TRIGGER agent_activities_rollup_insert
+    AFTER INSERT ON agent_activities
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION rollup_activities();
+
+DROP TRIGGER IF EXISTS agent_activities_rollup_update ON agent_activities;
+CREATE TRIGGER agent_activities_rollup_update
+    AFTER UPDATE ON agent_activities
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION rollup_activities();
+
+DROP TRIGGER IF EXISTS agent_activities_rollup_delete ON agent_activities;
+CREATE TRIGGER agent_activities_rollup_delete
+    AFTER DELETE ON agent_activities
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION rollup_activities();
+
+-- Recompute the dashboard rollups from agent_activities and spend_ledger. The
+-- triggers keep them current; this backfills existing rows and repairs drift.
+CREATE OR REPLACE FUNCTION rebuild_activity_stats()
+RETURNS VOID AS $$
+BEGIN
+    -- Writers wait until the rebuild commits, then add their changes on top
+    LOCK TABLE activity_status_counts, activity_vendor_totals IN EXCLUSIVE MODE;
+
+    DELETE FROM activity_status_counts;
+    INSERT INTO activity_status_counts (user_key, status, activities)
+    SELECT tenant_key(user_id), status, COUNT(*)
+      FROM agent_activities
+     WHERE status IS NOT NULL
+     GROUP BY 1, 2;
+
+    DELETE FROM activity_vendor_totals;
+    INSERT INTO activity_vendor_totals (user_key, vendor_key, vendor, activities, requested, spent)
+    SELECT tenant_key(a.user_id),
+           lower(btrim(a.structured_intent->>'recipientName')),
+           MIN(btrim(a.structured_intent->>'recipientName')),
+           COUNT(*),
+           SUM(COALESCE((a.structured_intent->>'amount')::NUMERIC, 0)),
+           COALESCE(SUM(l.spent), 0)
+      FROM agent_activities a
+      LEFT JOIN (
+        SELECT activity_id, SUM(amount) AS spent FROM spend_ledger GROUP BY activity_id
+      ) l ON l.activity_id = a.id
+     WHERE btrim(a.structured_intent->>'recipientName') <> ''
+     GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Dashboard aggregates of a user in one call: activities by status, spend per day
+-- over the last p_days days, the current spend windows and the top p_vendors vendors
+-- by spend. Every part is a primary-key or index range read of a rollup, so the cost
+-- and the payload stay the same however many activities there are.
+CREATE OR REPLACE FUNCTION activity_stats(p_user_id UUID DEFAULT NULL, p_days INTEGER DEFAULT 30, p_vendors INTEGER DEFAULT 10)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'by_status', COALESCE((
+            SELECT jsonb_object_agg(status, activities)
+              FROM activity_status_counts
+             WHERE user_key = tenant_key(p_user_id) AND activities <> 0
+        ), '{}'::JSONB),
+        'daily_spend', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('day', bucket_start, 'spent', spent) ORDER BY bucket_start)
+              FROM spend_buckets
+             WHERE user_key = tenant_key(p_user_id) AND period = 'day'
+               AND bucket_start > (NOW() AT TIME ZONE 'UTC')::DATE - p_days
+        ), '[]'::JSONB),
+        'spend', spend_window(p_user_id),
+        'vendors', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                       'vendor', vendor, 'activities', activities, 'requested', requested, 'spent', spent
+                   ) ORDER BY spent DESC, requested DESC)
+              FROM (
+                SELECT vendor, activities, requested, spent
+                  FROM activity_vendor_totals
+                 WHERE user_key = tenant_key(p_user_id) AND activities > 0
+                 ORDER BY spent DESC, requested DESC
+                 LIMIT p_vendors
+              ) top
+        ), '[]'::JSONB)
+    );
+$$ LANGUAGE sql STABLE;
+
 -- Insert default policy
 INSERT INTO policies (max_tx_amount, daily_budget, monthly_budget, required_approval_threshold)
 VALUES (1000, 5000, 5000, 500)
 ON CONFLICT DO NOTHING;
 
+-- Backfill the dashboard rollups for activities recorded before they existed
+SELECT rebuild_activity_stats();
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE policies ENABLE ROW LEVEL SECURITY;
 ALTER TABLE agent_activities ENABLE ROW LEVEL SECURITY;
 ALTER TABLE transactions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE spend_ledger ENABLE ROW LEVEL SECURITY;
+ALTER TABLE spend_buckets ENABLE ROW LEVEL SECURITY;
+ALTER TABLE activity_status_counts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE activity_vendor_totals ENABLE ROW LEVEL SECURITY;
 
 -- Create policies (allow all for now, refine later with auth)
+DROP POLICY IF EXISTS "Enable all for policies" ON policies;
 CREATE POLICY "Enable all for policies" ON policies FOR ALL USING (true);
+DROP POLICY IF EXISTS "Enable all for agent_activities" ON agent_activities;
 CREATE POLICY "Enable all for agent_activities" ON agent_activities FOR ALL USING (true);
+DROP POLICY IF EXISTS "Enable all for transactions" ON transactions;
 CREATE POLICY "Enable all for transactions" ON transactions FOR ALL USING (true);
+DROP POLICY IF EXISTS "Enable all for spend_ledger" ON spend_ledger;
+CREATE POLICY "Enable all for spend_ledger" ON spend_ledger FOR ALL USING (true);
+DROP POLICY IF EXISTS "Enable all for spend_buckets" ON spend_buckets;
+CREATE POLICY "Enable all for spend_buckets" ON spend_buckets FOR ALL USING (true);
+DROP POLICY IF EXISTS "Enable all for activity_status_counts" ON activity_status_counts;
+CREATE POLICY "Enable all for activity_status_counts" ON activity_status_counts FOR ALL USING (true);
+DROP POLICY IF EXISTS "Enable all for activity_vendor_totals" ON activity_vendor_totals;
+CREATE POLICY "Enable all for activity_vendor_totals" ON activity_vendor_totals FOR ALL USING (true);